@@ -0,0 +1,118 @@
+"""
+Cache odpovědí čtecích endpointů (detail a seznam projektů, postup projektu, dashboard).
+
+Záznamy se nemažou jednotlivě: klíč obsahuje verzi oblasti ("projects", "project:<id>")
+a zápis oblast zneplatní novou náhodnou verzí, staré záznamy pak jen vyprší.
+Úložiště je v paměti procesu (LRU), s RESPONSE_CACHE_URL=redis://... sdílené přes Redis,
+takže zneplatnění platí pro všechny workery.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL")
+# Doba platnosti záznamu (s), 0 = cache vypnutá. Bez Redisu má každý worker vlastní cache a zápis
+# zneplatní jen tu svou, ostatní workery mohou vracet zastaralá data až do vypršení; výchozí
+# platnost je proto krátká a dlouhá jen se sdíleným úložištěm
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300" if RESPONSE_CACHE_URL else "5"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+
+class LRUCacheStore:
+    """Úložiště v paměti procesu s omezeným počtem záznamů"""
+    # Volání neblokují, async endpointy je mohou volat přímo
+    blocking = False
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None, only_new: bool = False) -> bytes:
+        """Uloží hodnotu; s only_new jen pokud klíč neexistuje. Vrací platnou hodnotu."""
+        with self._lock:
+            if only_new and key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][1]
+            self._entries[key] = (time.monotonic() + ttl if ttl else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return value
+
+class RedisCacheStore:
+    """Sdílené úložiště v Redisu (nebo kompatibilním serveru)"""
+    blocking = True
+
+    def __init__(self, url: str):
+        # Volitelná závislost, potřeba jen s RESPONSE_CACHE_URL
+        import redis
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._redis.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None, only_new: bool = False) -> bytes:
+        if self._redis.set(key, value, ex=ttl or None, nx=only_new) or not only_new:
+            return value
+        return self._redis.get(key) or value
+
+def create_cache_store():
+    if RESPONSE_CACHE_URL:
+        return RedisCacheStore(RESPONSE_CACHE_URL)
+    return LRUCacheStore(RESPONSE_CACHE_SIZE)
+
+class ResponseCache:
+    def __init__(self, store, ttl: int = RESPONSE_CACHE_TTL):
+        self.store = store
+        self.ttl = ttl
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _version(self, scope: str) -> str:
+        # Chybějící verze (nový proces, vypadlý klíč) se založí náhodná, staré záznamy tím nikdy neožijí
+        return self.store.set(f"version:{scope}", uuid.uuid4().hex.encode(), only_new=True).decode()
+
+    def key(self, name: str, scopes: Iterable[str], params: Dict[str, Any]) -> str:
+        versions = ",".join(f"{scope}={self._version(scope)}" for scope in scopes)
+        return f"response:{name}:{json.dumps(params, sort_keys=True, default=str)}:{versions}"
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        value = self.store.get(key)
+        if value is None:
+            return None
+        entry = json.loads(value)
+        return entry["body"].encode(), entry["headers"]
+
+    def set(self, key: str, body: bytes, headers: Dict[str, str]):
+        self.store.set(key, json.dumps({"body": body.decode(), "headers": headers}).encode(), ttl=self.ttl)
+
+    def invalidate(self, *scopes: str):
+        for scope in scopes:
+            self.store.set(f"version:{scope}", uuid.uuid4().hex.encode())
+
+    def invalidate_project(self, project_id: Optional[int]):
+        """Po zápisu do projektu (projekt, dokumenty, logy) neplatí jeho detail ani souhrnné seznamy"""
+        if project_id is None:
+            self.invalidate("projects")
+        else:
+            self.invalidate("projects", f"project:{project_id}")
+
+response_cache = ResponseCache(create_cache_store())
@@ -0,0 +1,117 @@
+"""
+Feed změn pro inkrementální obnovu klientů (GET /changes?since=<kurzor>).
+
+Projekty, dokumenty a progress logy nesou sloupec version. Každá transakce, která některý
+z nich vloží, změní nebo smaže, dostane jednu novou verzi z řádku change_counter. Zámek
+tohoto řádku drží transakce do commitu, takže verze přibývají v pořadí commitů a klient
+s kurzorem nepřeskočí změnu, která se potvrdila později. Smazané řádky zastupují
+záznamy v tabulce tombstones. Transakce, které zamykají i jiné řádky (souhrn
+project_progress), berou zámek change_counter jako první.
+
+ORM zápisy verzuje posluchač before_flush, hromadné INSERTy přes Core (crud.sync_batch)
+si verzi doplňují samy přes current_version.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import event, literal, select, tuple_, union_all, update
+from sqlalchemy.orm import Session
+from . import models
+
+# Druhy změn v pořadí, ve kterém se řadí uvnitř jedné verze
+CHANGE_KINDS = (
+    ("projects", models.Project),
+    ("documents", models.Document),
+    ("progress_logs", models.ProgressLog),
+    ("deleted", models.Tombstone),
+)
+TOMBSTONE_ENTITIES = {
+    models.Project: "project",
+    models.Document: "document",
+    models.ProgressLog: "progress_log",
+}
+VERSIONED_MODELS = tuple(TOMBSTONE_ENTITIES)
+
+def current_version(db: Session) -> int:
+    """Verze změn aktuální transakce, při prvním volání se přidělí další číslo z change_counter"""
+    version = db.info.get("change_version")
+    if version is None:
+        counter = models.ChangeCounter.__table__
+        db.execute(update(counter).where(counter.c.id == 1).values(value=counter.c.value + 1))
+        version = db.execute(select(counter.c.value).where(counter.c.id == 1)).scalar_one()
+        db.info["change_version"] = version
+    return version
+
+@event.listens_for(Session, "before_flush")
+def _stamp_versions(session: Session, flush_context, instances):
+    changed = [obj for obj in session.new if isinstance(obj, VERSIONED_MODELS)]
+    changed += [
+        obj for obj in session.dirty
+        if isinstance(obj, VERSIONED_MODELS) and session.is_modified(obj, include_collections=False)
+    ]
+    deleted = [obj for obj in session.deleted if isinstance(obj, VERSIONED_MODELS)]
+    if not changed and not deleted:
+        return
+    version = current_version(session)
+    for obj in changed:
+        obj.version = version
+    for obj in deleted:
+        if isinstance(obj, models.Project):
+            # Flush smazaného projektu odpojí jeho dokumenty a logy (project_id = NULL), i to je změna
+            for child in obj.documents + obj.progress_logs:
+                child.version = version
+        session.add(models.Tombstone(
+            entity=TOMBSTONE_ENTITIES[type(obj)],
+            entity_id=obj.id,
+            project_id=obj.id if isinstance(obj, models.Project) else obj.project_id,
+            version=version,
+            deleted_at=datetime.utcnow(),
+        ))
+
+@event.listens_for(Session, "after_transaction_end")
+def _reset_version(session: Session, transaction):
+    if transaction.parent is None:
+        session.info.pop("change_version", None)
+
+def _changed_keys(kind: int, model, since: list, project_id: Optional[int], limit: int):
+    """Klíče (version, kind, id) jednoho druhu za kurzorem, čtené přes index (version, id)"""
+    version, since_kind, since_id = since
+    if kind > since_kind:
+        after = model.version >= version
+    elif kind == since_kind:
+        after = tuple_(model.version, model.id) > tuple_(version, since_id)
+    else:
+        after = model.version > version
+    query = select(model.version.label("version"), literal(kind).label("kind"), model.id.label("id")).where(after)
+    if project_id is not None:
+        query = query.where((model.id if model is models.Project else model.project_id) == project_id)
+    return select(query.order_by(model.version, model.id).limit(limit).subquery())
+
+def get_changes(db: Session, since: Optional[list] = None, project_id: Optional[int] = None,
+                limit: int = 500) -> Dict[str, Any]:
+    """
+    Řádky změněné po kurzoru `since` ([version, kind, id] z předchozí odpovědi) seřazené podle verze.
+    Bez kurzoru vrací aktuální stav všech řádků (bez záznamů o smazání).
+    """
+    kinds = CHANGE_KINDS if since is not None else CHANGE_KINDS[:-1]
+    since = since if since is not None else [0, -1, 0]
+    keys = union_all(*(
+        _changed_keys(kind, model, since, project_id, limit + 1) for kind, (_, model) in enumerate(kinds)
+    )).subquery()
+    rows = db.execute(select(keys).order_by(keys.c.version, keys.c.kind, keys.c.id).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    changes: Dict[str, List[Any]] = {name: [] for name, _ in CHANGE_KINDS}
+    for kind, (name, model) in enumerate(kinds):
+        ids = [row.id for row in rows if row.kind == kind]
+        if ids:
+            changes[name] = db.query(model).filter(model.id.in_(ids)).order_by(model.version, model.id).all()
+    if rows:
+        cursor = list(rows[-1])
+    elif kinds is CHANGE_KINDS:
+        cursor = since
+    else:
+        # Prázdný stav: kurzor za poslední potvrzenou verzí, starší záznamy o smazání klienta nezajímají
+        counter = models.ChangeCounter.__table__
+        cursor = [db.execute(select(counter.c.value).where(counter.c.id == 1)).scalar_one(), len(CHANGE_KINDS), 0]
+    return {**changes, "cursor": cursor, "has_more": has_more}
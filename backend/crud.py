@@ -1,10 +1,33 @@
-from sqlalchemy.orm import Session
-from . import models, schemas
+from sqlalchemy import func, case, insert, tuple_, Date, event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from fastapi.encoders import jsonable_encoder
+from . import models, schemas, ocr, anomaly, storage, search, changes
+from . import measurements as measurement_index
 from passlib.context import CryptContext
+from minio import Minio
+from io import BytesIO, StringIO
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import date, datetime
+import base64
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, Any, List, Optional, Iterable, Iterator, BinaryIO
 
 # --- Hesla a uživatelé ---
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt uvolňuje GIL, ověřování hesel proto běží ve vlastním poolu vláken
+# (nával přihlášení nezablokuje event loop ani sdílený threadpool ostatních endpointů)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -26,37 +49,122 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.commit()
     db.refresh(db_user)
     return db_user
-from minio import Minio
-import pytesseract
-from PIL import Image
-from io import BytesIO
-import spacy
-import pdfplumber
-import openpyxl
-from datetime import datetime
-import re
-from typing import Dict, Any, List, Optional
 
-# Načtení rozšířeného modelu spaCy
-try:
-    nlp = spacy.load("cs_core_news_lg")
-except OSError:
-    # Pokud model není nainstalován, stáhneme ho
-    spacy.cli.download("cs_core_news_lg")
-    nlp = spacy.load("cs_core_news_lg")
+# --- Cache přihlášených uživatelů ---
+# Ověření JWT nemusí při každém požadavku číst uživatele z databáze
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+
+class UserCache:
+    """LRU cache uživatelů podle username, záznam platí USER_CACHE_TTL sekund (0 = cache vypnutá)"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username: str) -> Optional[schemas.CurrentUser]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires < time.monotonic():
+                del self._entries[username]
+                return None
+            self._entries.move_to_end(username)
+            return user
+
+    def put(self, user: schemas.CurrentUser):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user.username] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user.username)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: Optional[str] = None):
+        """Zahodí záznam uživatele, bez username celou cache"""
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(username, None)
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+def load_current_user(db: Session, username: str) -> Optional[schemas.CurrentUser]:
+    """Načte uživatele z databáze a uloží ho do cache"""
+    db_user = get_user_by_username(db, username)
+    if db_user is None:
+        return None
+    user = schemas.CurrentUser.from_orm(db_user)
+    user_cache.put(user)
+    return user
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    # Změna role, přejmenování nebo smazání účtu se projeví hned (v rámci procesu)
+    user_cache.invalidate(target.username)
+    for previous in inspect(target).attrs.username.history.deleted or ():
+        user_cache.invalidate(previous)
+
+# --- Líné načítání těžkých závislostí (spaCy, OCR, OpenCV) ---
+# Model a knihovny se načítají až při prvním použití, čistě CRUD proces je nenačte vůbec.
+SPACY_MODEL = os.getenv("SPACY_MODEL", "cs_core_news_lg")
+
+# Komponenty pipeline, které extrakce nepoužívá (entity potřebují ner, věty a fráze parser)
+UNUSED_NLP_COMPONENTS = ("lemmatizer", "trainable_lemmatizer", "textcat", "textcat_multilabel", "entity_linker")
+
+_nlp = None
+_nlp_lock = threading.Lock()
+
+def get_nlp():
+    """Vrátí sdílený model spaCy, při prvním volání ho načte"""
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                import spacy
+                try:
+                    nlp = spacy.load(SPACY_MODEL)
+                except OSError:
+                    # Pokud model není nainstalován, stáhneme ho
+                    spacy.cli.download(SPACY_MODEL)
+                    nlp = spacy.load(SPACY_MODEL)
+                for component in UNUSED_NLP_COMPONENTS:
+                    if component in nlp.pipe_names:
+                        nlp.disable_pipe(component)
+                _nlp = nlp
+    return _nlp
+
+def is_nlp_loaded() -> bool:
+    return _nlp is not None
+
+def preload_heavy_dependencies():
+    """Zahřátí: načte model spaCy a knihovny pro OCR/CV, aby na ně nečekal první požadavek"""
+    import pytesseract, pdfplumber, openpyxl, cv2  # noqa: F401
+    get_nlp()("Zahřívací věta pro načtení modelu.")
+
+# Předkompilované regulární výrazy pro extrakci
+DATE_PATTERNS = [
+    re.compile(r'\d{1,2}\.\s*\d{1,2}\.\s*\d{4}'),
+    re.compile(r'\d{4}-\d{1,2}-\d{1,2}'),
+]
+# Jednotka rozhoduje o typu měření (viz measurements.MEASUREMENT_UNITS); za jednotkou nesmí
+# pokračovat slovo ani další jednotka, jinak by "10 měsíců" bylo 10 m a "5 kg/m²" i 5 kg
+MEASUREMENT_PATTERN = re.compile(r'(\d+(?:,\d+)?)\s*(kg/m²|kg/m2|t/m²|t/m2|mm|cm|m|kg|t)(?![²\w/])')
+# Klíčová slova pro identifikaci milníků
+MILESTONE_KEYWORDS = ('milník', 'fáze', 'etapa', 'deadline', 'termín')
 
 def extract_dates(text: str) -> List[datetime]:
-    """Extrahuje data z textu pomocí regulárních výrazů a spaCy"""
+    """Extrahuje data z textu pomocí regulárních výrazů"""
     dates = []
-    # Regex pro různé formáty dat
-    date_patterns = [
-        r'\d{1,2}\.\s*\d{1,2}\.\s*\d{4}',
-        r'\d{4}-\d{1,2}-\d{1,2}',
-    ]
-    
-    for pattern in date_patterns:
-        matches = re.finditer(pattern, text)
-        for match in matches:
+    for pattern in DATE_PATTERNS:
+        for match in pattern.finditer(text):
             try:
                 date_str = match.group()
                 if '.' in date_str:
@@ -70,40 +178,20 @@ def extract_dates(text: str) -> List[datetime]:
     return dates
 
 def extract_measurements(text: str) -> List[Dict[str, Any]]:
-    """Extrahuje rozměry a další měřitelné hodnoty z textu"""
+    """Extrahuje rozměry a další měřitelné hodnoty z textu (pouze regex, bez spaCy)"""
     measurements = []
-    doc = nlp(text)
-    
-    # Hledání číselných hodnot s jednotkami
-    measurement_patterns = [
-        (r'(\d+(?:,\d+)?)\s*(mm|cm|m|kg|t)', 'dimension'),
-        (r'(\d+(?:,\d+)?)\s*(kg/m²|t/m²)', 'load_capacity'),
-    ]
-    
-    for pattern, measure_type in measurement_patterns:
-        matches = re.finditer(pattern, text)
-        for match in matches:
-            value, unit = match.groups()
-            value = float(value.replace(',', '.'))
-            measurements.append({
-                'type': measure_type,
-                'value': value,
-                'unit': unit
-            })
+    for match in MEASUREMENT_PATTERN.finditer(text):
+        value, unit = match.groups()
+        measurements.append(measurement_index.normalize_measurement(float(value.replace(',', '.')), unit))
     
     return measurements
 
-def extract_milestones(text: str) -> List[Dict[str, Any]]:
-    """Extrahuje milníky projektu z textu"""
-    doc = nlp(text)
+def extract_milestones(doc) -> List[Dict[str, Any]]:
+    """Extrahuje milníky projektu z již zpracovaného spaCy dokumentu"""
     milestones = []
-    
-    # Klíčová slova pro identifikaci milníků
-    milestone_keywords = ['milník', 'fáze', 'etapa', 'deadline', 'termín']
-    
     for sent in doc.sents:
         sent_text = sent.text.lower()
-        if any(keyword in sent_text for keyword in milestone_keywords):
+        if any(keyword in sent_text for keyword in MILESTONE_KEYWORDS):
             dates = extract_dates(sent.text)
             if dates:
                 milestones.append({
@@ -113,18 +201,18 @@ def extract_milestones(text: str) -> List[Dict[str, Any]]:
     
     return milestones
 
-def extract_key_data_from_text(text: str) -> Dict[str, Any]:
+def extract_key_data_from_doc(doc) -> Dict[str, Any]:
     """
-    Hlavní funkce pro extrakci klíčových dat z textu.
-    Zpracovává text pomocí spaCy a dalších metod pro získání strukturovaných dat.
+    Extrakce klíčových dat z jednoho průchodu spaCy pipeline.
+    Všechny extraktory sdílejí stejný zpracovaný dokument.
     """
-    doc = nlp(text)
+    text = doc.text
     
     # Inicializace výsledného slovníku
     extracted_data = {
         'dates': extract_dates(text),
         'measurements': extract_measurements(text),
-        'milestones': extract_milestones(text),
+        'milestones': extract_milestones(doc),
         'entities': {},
         'keywords': set()
     }
@@ -148,34 +236,223 @@ def extract_key_data_from_text(text: str) -> Dict[str, Any]:
     
     return extracted_data
 
+# Počet bloků textu v jedné dávce nlp.pipe
+NLP_BATCH_SIZE = 8
+
+def _merge_extracted_data(target: Dict[str, Any], keywords: set, data: Dict[str, Any]):
+    """Přidá výsledek extrakce jednoho bloku textu do souhrnného výsledku dokumentu"""
+    target['dates'].extend(data['dates'])
+    target['measurements'].extend(data['measurements'])
+    target['milestones'].extend(data['milestones'])
+    for label, entities in data['entities'].items():
+        target['entities'].setdefault(label, []).extend(entities)
+    keywords.update(data['keywords'])
+
+def _empty_extracted_data() -> Dict[str, Any]:
+    return {'dates': [], 'measurements': [], 'milestones': [], 'entities': {}, 'keywords': []}
+
+def extract_key_data_from_chunks(chunks: Iterable[str], batch_size: int = NLP_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Extrakce klíčových dat z textu rozděleného na bloky (stránky PDF, skupiny řádků XLSX).
+    Bloky jdou přes nlp.pipe, takže velikost dokumentu neomezuje nlp.max_length ani paměť parseru.
+    """
+    extracted_data = _empty_extracted_data()
+    keywords = set()
+    for doc in get_nlp().pipe(chunks, batch_size=batch_size):
+        _merge_extracted_data(extracted_data, keywords, extract_key_data_from_doc(doc))
+    extracted_data['keywords'] = list(keywords)
+    return extracted_data
+
+def extract_key_data_from_text(text: str) -> Dict[str, Any]:
+    """
+    Hlavní funkce pro extrakci klíčových dat z textu.
+    Text se spaCy zpracuje jen jednou a výsledek sdílí všechny extraktory.
+    """
+    return extract_key_data_from_doc(get_nlp()(text))
+
+# --- Extrakce textu po stránkách/řádcích s omezenou pamětí ---
+# Počet neprázdných řádků tabulky v jednom bloku textu
+XLSX_ROWS_PER_CHUNK = 500
+# Velikost bloku při stahování objektu do dočasného souboru
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+def _page_ready(item) -> bool:
+    return not isinstance(item, Future) or item.done()
+
+def _page_text(item, page_timings: Optional[list]) -> str:
+    page = item.result() if isinstance(item, Future) else item
+    if page_timings is not None:
+        page_timings.append({"page": page["page"], "source": page["source"], "seconds": page["seconds"]})
+    return page["text"]
+
+def iter_pdf_text(source: BinaryIO, path: Optional[str] = None, page_timings: Optional[list] = None) -> Iterator[str]:
+    """
+    Text PDF stránku po stránce; zpracovaná stránka se hned uvolní z cache pdfplumberu.
+    Stránky bez textové vrstvy se (je-li k dispozici cesta k souboru) rozpoznají OCR
+    paralelně v poolu a vrací se ve stejném pořadí jako stránky dokumentu.
+    """
+    import pdfplumber
+    pending = deque()
+    with pdfplumber.open(source) as pdf, ocr.page_pool() as pool:
+        for page_number, page in enumerate(pdf.pages, start=1):
+            started = time.perf_counter()
+            text = page.extract_text() or ""
+            page.flush_cache()
+            if text.strip() or path is None:
+                pending.append({
+                    "page": page_number,
+                    "text": text,
+                    "source": "text",
+                    "seconds": round(time.perf_counter() - started, 3),
+                })
+            else:
+                pending.append(pool.submit(ocr.ocr_pdf_page, path, page_number))
+            while pending and _page_ready(pending[0]):
+                yield _page_text(pending.popleft(), page_timings)
+        while pending:
+            yield _page_text(pending.popleft(), page_timings)
+
+def iter_xlsx_text(source: BinaryIO) -> Iterator[str]:
+    """Text sešitu po blocích řádků, sešit se čte v režimu read-only"""
+    import openpyxl
+    wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            rows = []
+            for row in ws.iter_rows(values_only=True):
+                row_text = " ".join(str(value) for value in row if value)
+                if row_text:
+                    rows.append(row_text)
+                if len(rows) >= XLSX_ROWS_PER_CHUNK:
+                    yield "\n".join(rows)
+                    rows = []
+            if rows:
+                yield "\n".join(rows)
+    finally:
+        wb.close()
+
+def iter_document_text(filename: str, source: BinaryIO, path: Optional[str] = None,
+                       page_timings: Optional[list] = None) -> Iterator[str]:
+    """Extrakce textu podle typu dokumentu, po blocích"""
+    if filename.lower().endswith('.pdf'):
+        yield from iter_pdf_text(source, path=path, page_timings=page_timings)
+    elif filename.lower().endswith(('.xlsx', '.xls')):
+        yield from iter_xlsx_text(source)
+    else:
+        # Pro obrázky použijeme původní OCR
+        from PIL import Image
+        started = time.perf_counter()
+        text = ocr.ocr_image(Image.open(source))
+        if page_timings is not None:
+            page_timings.append({"page": 1, "source": "ocr", "seconds": round(time.perf_counter() - started, 3)})
+        yield text
+
 def process_pdf_document(file_content: bytes) -> str:
     """Zpracování PDF dokumentu a extrakce textu"""
-    text = ""
-    with pdfplumber.open(BytesIO(file_content)) as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() or ""
-    return text
+    return "\n".join(iter_pdf_text(BytesIO(file_content)))
 
 def process_xlsx_document(file_content: bytes) -> str:
     """Zpracování Excel dokumentu a extrakce textu"""
-    text = []
-    wb = openpyxl.load_workbook(BytesIO(file_content), data_only=True)
-    for sheet in wb.sheetnames:
-        ws = wb[sheet]
-        for row in ws.iter_rows():
-            row_text = " ".join(str(cell.value) for cell in row if cell.value)
-            if row_text:
-                text.append(row_text)
-    return "\n".join(text)
-
-def get_project(db: Session, project_id: int):
-    return db.query(models.Project).filter(models.Project.id == project_id).first()
-
-def get_projects(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Project).offset(skip).limit(limit).all()
+    return "\n".join(iter_xlsx_text(BytesIO(file_content)))
+
+# --- Keyset (kurzorové) stránkování ---
+def encode_cursor(*values) -> str:
+    """Neprůhledný token další stránky z hodnot řadicích sloupců posledního řádku"""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid pagination cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid pagination cursor")
+    return values
+
+def _cursor_value(column, value):
+    # Datum se v tokenu nese jako ISO řetězec, NULL (např. neplatné datum ze starých dat) jako null
+    if value is None and column.nullable:
+        return None
+    if isinstance(column.type, Date):
+        try:
+            return date.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid pagination cursor")
+    return value
+
+def _paginate(query, columns: list, skip: int = 0, limit: int | None = 100, cursor: str | None = None) -> list:
+    """
+    Stránka řádků ve stabilním pořadí podle `columns`. S kurzorem se čte přes řádkové porovnání
+    (col1, col2) > (v1, v2), které je rozsahem v indexu a je stejně rychlé na libovolně hluboké
+    stránce; bez kurzoru zůstává kompatibilní OFFSET. Sloupce s NULL se řadí na konec (výchozí
+    pořadí Postgresu i jeho indexů, SQLite ho dostane explicitně); NULL smí mít jen první sloupec.
+    """
+    order = [column.asc().nulls_last() if column.nullable else column for column in columns]
+    if not cursor:
+        return query.order_by(*order).offset(skip).limit(limit).all()
+    values = decode_cursor(cursor)
+    if len(values) != len(columns):
+        raise ValueError("Invalid pagination cursor")
+    values = [_cursor_value(column, value) for column, value in zip(columns, values)]
+    column = columns[0]
+    if not column.nullable:
+        return query.filter(tuple_(*columns) > tuple_(*values)).order_by(*order).limit(limit).all()
+    # NULL se porovnáním nenajde a podmínka "... OR col IS NULL" by index nevyužila (deep stránka
+    # by procházela všechny předchozí řádky), proto dva rozsahové dotazy: řádky s hodnotou, pak NULL
+    rows = []
+    if values[0] is None:
+        nulls = query.filter(column.is_(None), tuple_(*columns[1:]) > tuple_(*values[1:]))
+    else:
+        rows = query.filter(column.isnot(None), tuple_(*columns) > tuple_(*values)).order_by(*order).limit(limit).all()
+        if limit is not None and len(rows) >= limit:
+            return rows
+        nulls = query.filter(column.is_(None))
+    return rows + nulls.order_by(*order).limit(None if limit is None else limit - len(rows)).all()
+
+# Funkce pracují se synchronní Session; z asynchronní session (AsyncSession) se volají
+# přes `await db.run_sync(crud.get_project, project_id)`, dotazy pak jdou přes asyncpg bez blokování.
+def get_project(db: Session, project_id: int, with_details: bool = False):
+    query = db.query(models.Project).filter(models.Project.id == project_id)
+    if with_details:
+        # Vnořené dokumenty a logy se načtou hned (async session je nenačítá líně)
+        query = query.options(selectinload(models.Project.documents), selectinload(models.Project.progress_logs))
+    return query.first()
+
+def get_projects(db: Session, skip: int = 0, limit: int = 100, with_details: bool = False, cursor: str | None = None):
+    query = db.query(models.Project)
+    if with_details:
+        # Dokumenty a logy všech projektů stránky dvěma dotazy místo dvou dotazů na projekt
+        query = query.options(selectinload(models.Project.documents), selectinload(models.Project.progress_logs))
+    return _paginate(query, [models.Project.id], skip, limit, cursor)
+
+def get_project_summaries(db: Session, skip: int = 0, limit: int = 100, cursor: str | None = None) -> List[Dict[str, Any]]:
+    """Seznam projektů se souhrnnými údaji spočítanými v jednom SQL dotazu (bez vnořených dokumentů a logů)"""
+    document_count = db.query(func.count(models.Document.id)).filter(
+        models.Document.project_id == models.Project.id
+    ).correlate(models.Project).scalar_subquery()
+    latest_percentage = db.query(models.ProgressLog.percentage_completed).filter(
+        models.ProgressLog.project_id == models.Project.id
+    ).order_by(models.ProgressLog.date.desc().nulls_last(), models.ProgressLog.id.desc()).limit(1).correlate(models.Project).scalar_subquery()
+    query = db.query(
+        models.Project.id,
+        models.Project.name,
+        models.Project.description,
+        models.Project.owner_id,
+        document_count.label("document_count"),
+        func.coalesce(models.ProjectProgress.progress_count, 0).label("progress_log_count"),
+        _rollup_average().label("overall_progress"),
+        latest_percentage.label("latest_percentage"),
+        models.ProjectProgress.last_date.label("last_progress_date"),
+    ).outerjoin(
+        models.ProjectProgress, models.ProjectProgress.project_id == models.Project.id
+    )
+    rows = _paginate(query, [models.Project.id], skip, limit, cursor)
+    return [dict(row._mapping) for row in rows]
 
 def create_project(db: Session, project: schemas.ProjectCreate):
     db_project = models.Project(**project.dict(), owner_id=1) # Hardcoded owner_id
+    # Řádek souhrnu postupu vzniká s projektem, zápisy logů ho pak jen zamykají a upravují
+    db_project.progress_rollup = models.ProjectProgress(progress_sum=0, progress_count=0)
     db.add(db_project)
     db.commit()
     db.refresh(db_project)
@@ -193,19 +470,110 @@ def update_project(db: Session, project_id: int, project: schemas.ProjectCreate)
 def delete_project(db: Session, project_id: int):
     db_project = db.query(models.Project).filter(models.Project.id == project_id).first()
     if db_project:
+        # Index měření drží project_id mimo vztahy modelu, odkaz na projekt se odpojí ručně
+        db.query(models.Measurement).filter(models.Measurement.project_id == project_id).update(
+            {models.Measurement.project_id: None}, synchronize_session=False
+        )
         db.delete(db_project)
         db.commit()
     return db_project
 
-def get_documents(db: Session, project_id: int, category: str | None = None, skip: int = 0, limit: int = 100):
+def get_documents(db: Session, project_id: int, category: str | None = None, skip: int = 0, limit: int | None = 100,
+                  cursor: str | None = None):
     query = db.query(models.Document).filter(models.Document.project_id == project_id)
     if category:
         query = query.filter(models.Document.category == category)
-    return query.offset(skip).limit(limit).all()
+    return _paginate(query, [models.Document.id], skip, limit, cursor)
+
+def get_measurements(db: Session, measure_type: str | None = None, min_value: float | None = None,
+                     max_value: float | None = None, project_id: int | None = None, skip: int = 0,
+                     limit: int = 100, cursor: str | None = None):
+    """
+    Měření v rozsahu hodnot (v jednotkách SI) z indexu (type, normalized_value),
+    v rámci projektu z indexu (project_id, type, normalized_value). Řazeno podle hodnoty.
+    """
+    query = db.query(models.Measurement).options(selectinload(models.Measurement.document))
+    if project_id is not None:
+        query = query.filter(models.Measurement.project_id == project_id)
+    if measure_type is not None:
+        query = query.filter(models.Measurement.type == measure_type)
+    if min_value is not None:
+        query = query.filter(models.Measurement.normalized_value >= min_value)
+    if max_value is not None:
+        query = query.filter(models.Measurement.normalized_value <= max_value)
+    return _paginate(query, [models.Measurement.normalized_value, models.Measurement.id], skip, limit, cursor)
+
+# --- Materializovaný souhrn postupu (project_progress) ---
+def _apply_progress_rollup(db: Session, project_id: int, added: Optional[tuple] = None, removed: Optional[tuple] = None,
+                           added_many: Iterable[tuple] = ()):
+    """
+    Inkrementální úprava souhrnu postupu projektu v rámci aktuální transakce.
+    `added` a `removed` jsou dvojice (percentage_completed, date), `added_many` více přidaných
+    logů najednou (dávková synchronizace). Změny logu musí být před voláním flushnuté,
+    protože při odebrání maxima se extrémy dopočítají dotazem.
+    Log odpojený od smazaného projektu (project_id = NULL) do žádného souhrnu nepatří.
+    """
+    if project_id is None:
+        return None
+    # Pořadí zámků je všude stejné: nejdřív change_counter (verze změn, viz changes.py), pak
+    # řádek souhrnu. create_progress_log by jinak zamkl souhrn dřív než flush, který bere verzi,
+    # a proti update/delete/sync (ty verzi berou už při flushi/INSERTu) by hrozil deadlock.
+    changes.current_version(db)
+    query = db.query(models.ProjectProgress).filter(models.ProjectProgress.project_id == project_id)
+    rollup = query.with_for_update().first()
+    if rollup is None:
+        # Řádek zakládá create_project (a migrace/přepočet pro starší projekty); chybí-li přesto,
+        # založí se v savepointu, aby souběžné založení téhož řádku neshodilo celou transakci
+        try:
+            with db.begin_nested():
+                db.add(models.ProjectProgress(project_id=project_id, progress_sum=0, progress_count=0))
+        except IntegrityError:
+            pass
+        rollup = query.with_for_update().one()
+
+    stale_extremes = False
+    if removed is not None:
+        percentage, date = removed
+        rollup.progress_sum -= percentage
+        rollup.progress_count -= 1
+        stale_extremes = percentage == rollup.max_percentage or date == rollup.last_date
+    for percentage, date in ([added] if added is not None else []) + list(added_many):
+        rollup.progress_sum += percentage
+        rollup.progress_count += 1
+        if rollup.max_percentage is None or percentage > rollup.max_percentage:
+            rollup.max_percentage = percentage
+        if date is not None and (rollup.last_date is None or date > rollup.last_date):
+            rollup.last_date = date
+
+    if stale_extremes:
+        rollup.max_percentage, rollup.last_date = db.query(
+            func.max(models.ProgressLog.percentage_completed),
+            func.max(models.ProgressLog.date),
+        ).filter(models.ProgressLog.project_id == project_id).one()
+    return rollup
+
+def rebuild_progress_rollups(db: Session) -> int:
+    """Hromadný přepočet tabulky project_progress z progress_logs (oprava rozjetých souhrnů)"""
+    db.query(models.ProjectProgress).delete(synchronize_session=False)
+    # Každý projekt dostane řádek, i bez logů (nulový souhrn), zápisy logů ho pak jen zamykají
+    totals = db.query(
+        models.Project.id,
+        func.coalesce(func.sum(models.ProgressLog.percentage_completed), 0),
+        func.count(models.ProgressLog.percentage_completed),
+        func.max(models.ProgressLog.percentage_completed),
+        func.max(models.ProgressLog.date),
+    ).outerjoin(models.ProgressLog, models.ProgressLog.project_id == models.Project.id).group_by(models.Project.id)
+    result = db.execute(insert(models.ProjectProgress.__table__).from_select(
+        ["project_id", "progress_sum", "progress_count", "max_percentage", "last_date"],
+        totals.statement,
+    ))
+    db.commit()
+    return result.rowcount
 
 def create_progress_log(db: Session, progress_log: schemas.ProgressLogCreate, project_id: int):
     db_progress_log = models.ProgressLog(**progress_log.dict(), project_id=project_id)
     db.add(db_progress_log)
+    _apply_progress_rollup(db, project_id, added=(db_progress_log.percentage_completed, db_progress_log.date))
     db.commit()
     db.refresh(db_progress_log)
     return db_progress_log
@@ -213,9 +581,16 @@ def create_progress_log(db: Session, progress_log: schemas.ProgressLogCreate, pr
 def update_progress_log(db: Session, progress_log_id: int, progress_log: schemas.ProgressLogCreate):
     db_progress_log = db.query(models.ProgressLog).filter(models.ProgressLog.id == progress_log_id).first()
     if db_progress_log:
+        removed = (db_progress_log.percentage_completed, db_progress_log.date)
         db_progress_log.date = progress_log.date
         db_progress_log.percentage_completed = progress_log.percentage_completed
         db_progress_log.notes = progress_log.notes
+        db.flush()
+        _apply_progress_rollup(
+            db, db_progress_log.project_id,
+            added=(db_progress_log.percentage_completed, db_progress_log.date),
+            removed=removed,
+        )
         db.commit()
         db.refresh(db_progress_log)
     return db_progress_log
@@ -224,18 +599,211 @@ def delete_progress_log(db: Session, progress_log_id: int):
     db_progress_log = db.query(models.ProgressLog).filter(models.ProgressLog.id == progress_log_id).first()
     if db_progress_log:
         db.delete(db_progress_log)
+        db.flush()
+        _apply_progress_rollup(
+            db, db_progress_log.project_id,
+            removed=(db_progress_log.percentage_completed, db_progress_log.date),
+        )
         db.commit()
     return db_progress_log
 
-def get_progress_logs(db: Session, project_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.ProgressLog).filter(models.ProgressLog.project_id == project_id).offset(skip).limit(limit).all()
+def get_progress_logs(db: Session, project_id: int, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    query = db.query(models.ProgressLog).filter(models.ProgressLog.project_id == project_id)
+    return _paginate(query, [models.ProgressLog.date, models.ProgressLog.id], skip, limit, cursor)
 
 def get_project_overall_progress(db: Session, project_id: int):
-    progress_logs = db.query(models.ProgressLog).filter(models.ProgressLog.project_id == project_id).all()
-    if not progress_logs:
+    """Průměrný postup projektu ze souhrnu project_progress (bez procházení logů)"""
+    rollup = db.query(models.ProjectProgress).filter(models.ProjectProgress.project_id == project_id).first()
+    if rollup is None or not rollup.progress_count:
         return 0
-    total_percentage = sum([log.percentage_completed for log in progress_logs])
-    return total_percentage / len(progress_logs)
+    return rollup.progress_sum / rollup.progress_count
+
+# --- Dávková synchronizace z mobilní aplikace ---
+# Položky nesou idempotency_key generovaný klientem. Opakovaně odeslaná dávka (výpadek
+# spojení před přijetím odpovědi) vrátí pro už uložené položky status "duplicate" a stejné id.
+
+def _sync_result(idempotency_key: str, status: str, id: Optional[int] = None, error: Optional[str] = None) -> Dict[str, Any]:
+    return {"idempotency_key": idempotency_key, "status": status, "id": id, "error": error}
+
+def _ids_by_key(db: Session, model, keys: Iterable[str]) -> Dict[str, int]:
+    keys = list(keys)
+    if not keys:
+        return {}
+    return dict(db.query(model.idempotency_key, model.id).filter(model.idempotency_key.in_(keys)).all())
+
+def _sync_rows(db: Session, model, items: list, existing_projects: set, build_row) -> List[Dict[str, Any]]:
+    """
+    Vloží nové položky jednoho typu jedním vícehodnotovým INSERTem a vrátí výsledky v pořadí položek.
+    build_row vrací slovník sloupců, nebo řetězec s chybou, pokud položku nelze uložit.
+    """
+    existing = _ids_by_key(db, model, {item.idempotency_key for item in items})
+    results, rows, pending = [], {}, []
+    for item in items:
+        key = item.idempotency_key
+        if key in existing or key in rows:
+            # Už uložená položka, nebo stejný klíč dvakrát v jedné dávce
+            pending.append((len(results), key))
+            results.append(_sync_result(key, "duplicate"))
+            continue
+        row = build_row(item) if item.project_id in existing_projects else "Project not found"
+        if isinstance(row, str):
+            results.append(_sync_result(key, "error", error=row))
+            continue
+        rows[key] = row
+        pending.append((len(results), key))
+        results.append(_sync_result(key, "created"))
+    if rows:
+        # Core INSERT obchází ORM, verzi pro feed změn je potřeba doplnit ručně
+        version = changes.current_version(db)
+        db.execute(insert(model.__table__).values([{**row, "version": version} for row in rows.values()]))
+    ids = {**existing, **_ids_by_key(db, model, rows.keys())}
+    for index, key in pending:
+        results[index]["id"] = ids[key]
+    return results
+
+def _sync_batch(db: Session, batch: schemas.SyncBatch, object_sizes: Dict[str, Optional[int]]) -> Dict[str, List[Dict[str, Any]]]:
+    project_ids = {item.project_id for item in batch.progress_logs + batch.photos}
+    existing_projects = {
+        project_id for project_id, in db.query(models.Project.id).filter(models.Project.id.in_(project_ids))
+    } if project_ids else set()
+
+    def progress_log_row(item: schemas.SyncProgressLog):
+        return {
+            "idempotency_key": item.idempotency_key,
+            "project_id": item.project_id,
+            "date": item.date,
+            "percentage_completed": item.percentage_completed,
+            "notes": item.notes,
+        }
+
+    def photo_row(item: schemas.SyncPhoto):
+        size = object_sizes.get(item.content_hash)
+        if size is None:
+            return "Photo content not uploaded"
+        return {
+            "idempotency_key": item.idempotency_key,
+            "project_id": item.project_id,
+            "filename": item.filename,
+            "category": item.category,
+            "object_name": storage.content_key(item.content_hash),
+            "content_hash": item.content_hash,
+            "size": size,
+            "content_type": item.content_type,
+        }
+
+    log_results = _sync_rows(db, models.ProgressLog, batch.progress_logs, existing_projects, progress_log_row)
+    photo_results = _sync_rows(db, models.Document, batch.photos, existing_projects, photo_row)
+
+    # Souhrn postupu se upraví jednou za projekt, ne po každém logu
+    added: Dict[int, list] = {}
+    for item, result in zip(batch.progress_logs, log_results):
+        if result["status"] == "created":
+            added.setdefault(item.project_id, []).append((item.percentage_completed, item.date))
+    for project_id, logs in added.items():
+        _apply_progress_rollup(db, project_id, added_many=logs)
+    db.commit()
+    return {"progress_logs": log_results, "photos": photo_results}
+
+def sync_batch(db: Session, batch: schemas.SyncBatch, minio_client: Minio) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Uloží dávku progress logů a odkazů na fotky (obsah nahraný předem přes /sync/objects)
+    v jedné transakci. Vrací výsledek pro každou položku ve stejném pořadí.
+    """
+    # Existence objektů se ověří před transakcí, dotazy na MinIO nedrží zámky v databázi
+    object_sizes = {
+        content_hash: storage.object_size(minio_client, storage.content_key(content_hash))
+        for content_hash in {photo.content_hash for photo in batch.photos}
+    }
+    try:
+        return _sync_batch(db, batch, object_sizes)
+    except IntegrityError:
+        # Stejnou dávku souběžně uložil jiný požadavek (klient ji odeslal znovu před odpovědí);
+        # po rollbacku se jeho položky najdou jako duplicitní
+        db.rollback()
+        return _sync_batch(db, batch, object_sizes)
+
+# --- Cache výsledků OCR/extrakce ---
+# Verze extrakční logiky; zvýšit při změně OCR/NLP, aby se starší výsledky přestaly používat
+EXTRACTOR_VERSION = "4"
+
+def get_cached_ocr_result(db: Session, document_id: int, content_hash: str):
+    return db.query(models.OcrResult).filter(
+        models.OcrResult.document_id == document_id,
+        models.OcrResult.content_hash == content_hash,
+        models.OcrResult.extractor_version == EXTRACTOR_VERSION,
+    ).first()
+
+def lookup_ocr_cache(db: Session, db_document: models.Document, minio_client: Minio):
+    """Najde uložený výsledek podle aktuálního ETagu objektu (jen HEAD požadavek, bez stahování)"""
+    try:
+        content_hash = minio_client.stat_object(storage.BUCKET_NAME, db_document.object_name).etag
+    except Exception:
+        return None
+    return get_cached_ocr_result(db, db_document.id, content_hash)
+
+def store_ocr_result(db: Session, document_id: int, content_hash: str, text: str, extracted_data: Dict[str, Any]):
+    # Výsledky pro starší obsah nebo verzi extrakce už nejsou potřeba
+    db.query(models.OcrResult).filter(models.OcrResult.document_id == document_id).delete(synchronize_session=False)
+    db_result = models.OcrResult(
+        document_id=document_id,
+        content_hash=content_hash,
+        extractor_version=EXTRACTOR_VERSION,
+        ocr_text=text,
+        extracted_data=jsonable_encoder(extracted_data),
+    )
+    db.add(db_result)
+    # Text a entity zůstávají i pro fulltextové vyhledávání (GET /search)
+    search.index_document(db, document_id, text, db_result.extracted_data)
+    measurement_index.index_measurements(db, document_id, db_result.extracted_data.get('measurements') or [])
+    db.commit()
+    return db_result
+
+def _download_to_spool(minio_client: Minio, object_name: str):
+    """Stáhne objekt z MinIO po blocích do dočasného souboru (smaže se při zavření), vrací (ETag, soubor)"""
+    spool = tempfile.NamedTemporaryFile()
+    try:
+        response = minio_client.get_object(storage.BUCKET_NAME, object_name)
+        try:
+            content_hash = response.headers.get("ETag", "").strip('"')
+            for chunk in response.stream(SPOOL_CHUNK_SIZE):
+                spool.write(chunk)
+        finally:
+            response.close()
+            response.release_conn()
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+    return content_hash, spool
+
+@contextmanager
+def spool_object(minio_client: Minio, object_name: str):
+    """Stáhne objekt z MinIO po blocích do dočasného souboru, vrací dvojici (ETag, soubor)"""
+    content_hash, spool = _download_to_spool(minio_client, object_name)
+    with spool:
+        yield content_hash, spool
+
+def _collect_text(chunks: Iterable[str], text: StringIO) -> Iterator[str]:
+    """Propouští bloky dál do nlp.pipe a zároveň z nich skládá celý text dokumentu"""
+    for index, chunk in enumerate(chunks):
+        if index:
+            text.write("\n")
+        text.write(chunk)
+        yield chunk
+
+def download_and_extract_data(minio_client: Minio, object_name: str, filename: str):
+    """
+    Stáhne objekt z MinIO a vrátí trojici (ETag, text, vytěžená data). Typ dokumentu se určí
+    z původního názvu souboru. Bloky textu jdou z generátoru stránek/řádků rovnou do nlp.pipe,
+    dokud je dočasný soubor otevřený; v paměti se drží jen výsledný text a rozpracovaná dávka.
+    """
+    page_timings = []
+    text = StringIO()
+    with spool_object(minio_client, object_name) as (content_hash, spool):
+        chunks = iter_document_text(filename, spool, path=spool.name, page_timings=page_timings)
+        extracted_data = extract_key_data_from_chunks(_collect_text(chunks, text))
+    extracted_data['page_timings'] = page_timings
+    return content_hash, text.getvalue(), extracted_data
 
 def perform_ocr_on_document(db: Session, document_id: int, minio_client: Minio):
     """Rozšířená funkce pro OCR a extrakci dat z různých typů dokumentů"""
@@ -243,106 +811,212 @@ def perform_ocr_on_document(db: Session, document_id: int, minio_client: Minio):
     if not db_document:
         return None, None
 
-    bucket_name = "ranger-bucket"
     try:
-        response = minio_client.get_object(bucket_name, db_document.filename)
-        file_content = response.read()
-        
-        # Zpracování podle typu dokumentu
-        if db_document.filename.lower().endswith('.pdf'):
-            text = process_pdf_document(file_content)
-        elif db_document.filename.lower().endswith(('.xlsx', '.xls')):
-            text = process_xlsx_document(file_content)
-        else:
-            # Pro obrázky použijeme původní OCR
-            image = Image.open(BytesIO(file_content))
-            text = pytesseract.image_to_string(image, lang='ces')
-        
-        # Extrakce klíčových dat
-        extracted_data = extract_key_data_from_text(text)
+        cached = lookup_ocr_cache(db, db_document, minio_client)
+        if cached:
+            return cached.ocr_text, cached.extracted_data
+
+        # Extrakce textu a klíčových dat v jednom průchodu dokumentem
+        content_hash, text, extracted_data = download_and_extract_data(
+            minio_client, db_document.object_name, db_document.filename
+        )
+        if content_hash:
+            store_ocr_result(db, document_id, content_hash, text, extracted_data)
         return text, extracted_data
         
     except Exception as e:
         print(f"Error processing document: {e}")
         return None, None
 
-def get_total_projects_count(db: Session):
-    return db.query(models.Project).count()
-
-def get_completed_projects_count(db: Session):
-    completed_projects = db.query(models.Project).join(models.ProgressLog).filter(models.ProgressLog.percentage_completed == 100).distinct().count()
-    return completed_projects
+def _batch_ocr_result(document_id: int, filename: str, text=None, extracted_data=None, cached=False, error=None):
+    return {
+        "document_id": document_id,
+        "filename": filename,
+        "status": "failed" if error else "done",
+        "cached": cached,
+        "ocr_text": text,
+        "extracted_data": extracted_data,
+        "error": error,
+    }
 
+def _fetch_for_ocr(minio_client: Minio, object_name: str, cached_hash: Optional[str]):
+    """
+    Krok poolu stahování: s uloženým výsledkem nejdřív porovná ETag objektu (HEAD) a nezměněný
+    obsah nestahuje (vrací (ETag, None)), jinak objekt stáhne do dočasného souboru.
+    """
+    if cached_hash is not None:
+        try:
+            content_hash = minio_client.stat_object(storage.BUCKET_NAME, object_name).etag
+        except Exception:
+            content_hash = None
+        if content_hash == cached_hash:
+            return content_hash, None
+    return _download_to_spool(minio_client, object_name)
+
+def perform_batch_ocr(db: Session, documents: List[models.Document], minio_client: Minio,
+                      batch_size: int = 8, n_process: int = 1, download_workers: int = 8):
+    """
+    Dávková OCR/extrakce pro více dokumentů (generátor výsledků).
+    Objekty se stahují souběžně, texty jdou přes nlp.pipe a výsledek každého
+    dokumentu se vrací hned, jak je hotový. Výsledky z cache se vrací bez stahování,
+    kontrola ETagu běží souběžně se staženími ostatních dokumentů.
+    """
+    pending = [(db_document.id, db_document.object_name, db_document.filename) for db_document in documents]
+    if not pending:
+        return
+    # Hashe uložených výsledků jedním dotazem (bez textů, ty se načtou jen pro použité výsledky)
+    cached_hashes = dict(db.query(models.OcrResult.document_id, models.OcrResult.content_hash).filter(
+        models.OcrResult.document_id.in_([document_id for document_id, _, _ in pending]),
+        models.OcrResult.extractor_version == EXTRACTOR_VERSION,
+    ).all())
+
+    # Výsledky hotové mimo nlp.pipe (z cache, chyby stahování), vrací se mezi výsledky pipe
+    ready = []
+
+    def downloaded_chunks():
+        # Rozpracovaných stažení je nejvýš download_workers, další se zařadí, až se jedno z nich převezme;
+        # dočasných souborů je tak otevřeno nejvýš download_workers + 1 (právě zpracovávaný)
+        pool = ThreadPoolExecutor(max_workers=download_workers)
+        remaining = iter(pending)
+        in_flight: Dict[Future, tuple] = {}
+
+        def submit_next():
+            for document_id, object_name, filename in remaining:
+                future = pool.submit(_fetch_for_ocr, minio_client, object_name, cached_hashes.get(document_id))
+                in_flight[future] = (document_id, filename)
+                return
+
+        try:
+            for _ in range(download_workers):
+                submit_next()
+            while in_flight:
+                future = next(iter(wait(in_flight, return_when=FIRST_COMPLETED).done))
+                document_id, filename = in_flight.pop(future)
+                submit_next()
+                try:
+                    content_hash, spool = future.result()
+                except Exception as e:
+                    ready.append(_batch_ocr_result(document_id, filename, error=str(e)))
+                    continue
+                if spool is None:
+                    cached = get_cached_ocr_result(db, document_id, content_hash)
+                    ready.append(_batch_ocr_result(document_id, filename, cached.ocr_text, cached.extracted_data, cached=True))
+                    continue
+                # Bloky jdou do pipe rovnou z generátoru stránek/řádků, dokud je dočasný soubor otevřený.
+                # Bloky jednoho dokumentu jdou za sebou, poslední nese časy stránek (= konec dokumentu),
+                # proto se vrací s posunem o jeden blok
+                page_timings, previous = [], None
+                with spool:
+                    try:
+                        for chunk in iter_document_text(filename, spool, path=spool.name, page_timings=page_timings):
+                            if previous is not None:
+                                yield previous, (document_id, filename, content_hash, None, None)
+                            previous = chunk
+                    except Exception as e:
+                        yield "", (document_id, filename, content_hash, None, str(e))
+                        continue
+                yield previous or "", (document_id, filename, content_hash, page_timings, None)
+        finally:
+            # Ukončení generátoru (odpojený klient, chyba zpracování): nezačatá stažení se zruší,
+            # běžící doběhnou a jejich dočasné soubory se zavřou
+            for future in in_flight:
+                future.cancel()
+            pool.shutdown(wait=True)
+            for future in in_flight:
+                if not future.cancelled() and future.exception() is None:
+                    spool = future.result()[1]
+                    if spool is not None:
+                        spool.close()
+
+    chunks = downloaded_chunks()
+    try:
+        yield from _batch_ocr_pipe(db, chunks, ready, batch_size, n_process)
+    finally:
+        # Zavření generátoru uklidí i rozpracovaná stažení, nečeká se na garbage collector
+        chunks.close()
+
+def _batch_ocr_pipe(db: Session, chunks, ready: list, batch_size: int, n_process: int):
+    """Bloky dokumentů přes nlp.pipe; výsledek dokumentu se uloží a vrátí po jeho posledním bloku"""
+    extracted_data, keywords, texts = _empty_extracted_data(), set(), []
+    for doc, (document_id, filename, content_hash, page_timings, error) in get_nlp().pipe(
+        chunks, as_tuples=True, batch_size=batch_size, n_process=n_process
+    ):
+        while ready:
+            yield ready.pop(0)
+        if error is not None:
+            # Extrakce selhala uprostřed dokumentu, už zpracované bloky se zahodí
+            yield _batch_ocr_result(document_id, filename, error=error)
+            extracted_data, keywords, texts = _empty_extracted_data(), set(), []
+            continue
+        texts.append(doc.text)
+        _merge_extracted_data(extracted_data, keywords, extract_key_data_from_doc(doc))
+        if page_timings is None:
+            continue
+        text = "\n".join(texts)
+        extracted_data['keywords'] = list(keywords)
+        extracted_data['page_timings'] = page_timings
+        if content_hash:
+            store_ocr_result(db, document_id, content_hash, text, extracted_data)
+        yield _batch_ocr_result(document_id, filename, text, extracted_data)
+        extracted_data, keywords, texts = _empty_extracted_data(), set(), []
+    while ready:
+        yield ready.pop(0)
+
+# --- Agregace postupu projektů ---
+def _rollup_average():
+    """SQL výraz pro průměrný postup projektu ze souhrnu (projekt bez logů má 0)"""
+    return func.coalesce(
+        models.ProjectProgress.progress_sum * 1.0 / func.nullif(models.ProjectProgress.progress_count, 0), 0
+    )
 
-    total_overall_progress = 0
-    for project in all_projects:
-        total_overall_progress += get_project_overall_progress(db, project.id)
-    return total_overall_progress / len(all_projects)
+def get_progress_aggregates(db: Session) -> Dict[str, Any]:
+    """
+    Statistiky pro dashboard v jednom dotazu nad souhrnnou tabulkou:
+    počet projektů, dokončené projekty a průměrný celkový postup.
+    """
+    total, completed, average = db.query(
+        func.count(models.Project.id),
+        func.count(case([(models.ProjectProgress.max_percentage == 100, 1)])),
+        func.avg(_rollup_average()),
+    ).outerjoin(models.ProjectProgress, models.ProjectProgress.project_id == models.Project.id).one()
+    return {
+        "total_projects": total,
+        "completed_projects": completed,
+        "average_overall_progress": float(average) if average is not None else 0,
+    }
 
 # --- Detekce anomálií ve fotodokumentaci ---
-import cv2
-import numpy as np
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
 
-def detect_anomaly_in_image(document_id: int, minio_client: Minio):
-    """
-    Skutečná logika detekce anomálií ve fotodokumentaci pomocí OpenCV.
-    Detekuje základní typy anomálií: chybějící/nové objekty, poškození, barevné odchylky.
-    """
-    bucket_name = "ranger-bucket"
-    from .models import SessionLocal, Document
-    db = SessionLocal()
-    db_document = db.query(Document).filter(Document.id == document_id).first()
-    if not db_document:
-        return {"anomaly_detected": False, "message": "Dokument nenalezen."}
+def _detect_anomaly_in_object(object_name: str, minio_client: Minio) -> Dict[str, Any]:
     try:
-        response = minio_client.get_object(bucket_name, db_document.filename)
-        file_content = response.read()
-        image = Image.open(BytesIO(file_content)).convert('RGB')
-        img_np = np.array(image)
-        img_cv = cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR)
-
-        # 1. Detekce rozmazání (ostrost)
-        gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-        laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-        blurry = laplacian_var < 50  # Prahová hodnota pro rozmazání
-
-        # 2. Detekce dominantní barvy (např. příliš červené = rez)
-        mean_color = cv2.mean(img_cv)
-        red_ratio = mean_color[2] / (mean_color[0] + mean_color[1] + mean_color[2] + 1e-5)
-        rusty = red_ratio > 0.5
-
-        # 3. Detekce poškození (velké tmavé oblasti)
-        _, thresh = cv2.threshold(gray, 40, 255, cv2.THRESH_BINARY_INV)
-        dark_area = np.sum(thresh == 255) / (thresh.shape[0] * thresh.shape[1])
-        damaged = dark_area > 0.15
-
-        # 4. (Volitelně) Detekce chybějících objektů pomocí jednoduché kontury
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        large_contours = [cnt for cnt in contours if cv2.contourArea(cnt) > 5000]
-        missing_parts = len(large_contours) < 2  # Očekáváme aspoň 2 velké objekty
-
-        # Výsledek
-        anomaly_types = []
-        if blurry:
-            anomaly_types.append("Rozmazaný snímek")
-        if rusty:
-            anomaly_types.append("Podezření na rez (převaha červené)")
-        if damaged:
-            anomaly_types.append("Velké tmavé oblasti - možné poškození")
-        if missing_parts:
-            anomaly_types.append("Chybějící části/objekty")
-
-        if anomaly_types:
-            return {
-                "anomaly_detected": True,
-                "message": "Byly detekovány anomálie.",
-                "details": ", ".join(anomaly_types)
-            }
-        else:
-            return {
-                "anomaly_detected": False,
-                "message": "Žádné zjevné anomálie nebyly detekovány. (Omezená přesnost)",
-                "details": None
-            }
+        response = minio_client.get_object(storage.BUCKET_NAME, object_name)
+        try:
+            file_content = response.read()
+        finally:
+            response.close()
+            response.release_conn()
+        return anomaly.analyze_image(file_content)
     except Exception as e:
         return {"anomaly_detected": False, "message": f"Chyba při zpracování: {e}"}
+
+def detect_anomaly_in_image(db: Session, document_id: int, minio_client: Minio):
+    """Detekce anomálií v jedné fotce dokumentace (logika viz anomaly.analyze_image)"""
+    db_document = db.query(models.Document).filter(models.Document.id == document_id).first()
+    if not db_document:
+        return {"anomaly_detected": False, "message": "Dokument nenalezen."}
+    return _detect_anomaly_in_object(db_document.object_name, minio_client)
+
+def detect_anomalies_in_project(db: Session, project_id: int, minio_client: Minio) -> List[Dict[str, Any]]:
+    """Paralelní detekce anomálií ve všech fotkách projektu, výsledky v pořadí dokumentů"""
+    photos = [
+        (db_document.id, db_document.filename, db_document.object_name)
+        for db_document in get_documents(db, project_id=project_id, limit=None)
+        if db_document.filename.lower().endswith(PHOTO_EXTENSIONS)
+    ]
+    with ThreadPoolExecutor(max_workers=anomaly.ANOMALY_WORKERS) as pool:
+        results = pool.map(lambda photo: _detect_anomaly_in_object(photo[2], minio_client), photos)
+        return [
+            {"document_id": document_id, "filename": filename, **result}
+            for (document_id, filename, _), result in zip(photos, results)
+        ]
@@ -0,0 +1,91 @@
+"""
+Nastavení a metriky poolu databázových spojení.
+
+Každý proces uvicornu má vlastní pool pro synchronní i asynchronní engine, počet spojení
+do Postgresu je tedy nejvýše workers * 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+(plus jedno spojení na každý proces OCR_WORKERS). Stav poolů je vidět na GET /metrics.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Jak dlouho (s) čekat na volné spojení, než požadavek skončí chybou
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Spojení starší než DB_POOL_RECYCLE sekund se zavřou (ochrana proti timeoutům na straně serveru/proxy)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Ověření spojení před použitím (po restartu Postgresu nevrací pool mrtvá spojení)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+def _empty_metrics() -> Dict[str, Any]:
+    return {"checkouts": 0, "waits": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0, "timeouts": 0}
+
+class _PoolMetrics:
+    """
+    Počítá výdeje spojení z poolu a čekání na spojení při vyčerpaném poolu.
+    Metriky jsou na třídě, aby přežily engine.dispose() (ten vytváří novou instanci poolu).
+    """
+    metrics: Dict[str, Any]
+    _metrics_lock: threading.Lock
+
+    def _do_get(self):
+        exhausted = self.checkedout() >= self.size() + max(self._max_overflow, 0)
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._metrics_lock:
+                self.metrics["checkouts"] += 0 if timed_out else 1
+                self.metrics["timeouts"] += 1 if timed_out else 0
+                if exhausted:
+                    self.metrics["waits"] += 1
+                    self.metrics["wait_seconds"] += waited
+                    self.metrics["max_wait_seconds"] = max(self.metrics["max_wait_seconds"], waited)
+
+class InstrumentedQueuePool(_PoolMetrics, QueuePool):
+    metrics = _empty_metrics()
+    _metrics_lock = threading.Lock()
+
+class InstrumentedAsyncQueuePool(_PoolMetrics, AsyncAdaptedQueuePool):
+    metrics = _empty_metrics()
+    _metrics_lock = threading.Lock()
+
+def engine_options(url: str, asynchronous: bool = False) -> Dict[str, Any]:
+    """Parametry poolu pro create_engine/create_async_engine; SQLite si pool volí sám"""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if asynchronous else InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+def pool_status(engine) -> Dict[str, Any]:
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    status = {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+    }
+    if isinstance(pool, _PoolMetrics):
+        with pool._metrics_lock:
+            status.update(pool.metrics, wait_seconds=round(pool.metrics["wait_seconds"], 3),
+                          max_wait_seconds=round(pool.metrics["max_wait_seconds"], 3))
+    return status
@@ -0,0 +1,168 @@
+"""
+Push kanál změn pro klienty (Server-Sent Events, GET /events).
+
+Zapisující endpointy po commitu publikují malé události vázané na projekt
+(např. {"type": "progress_log.created", "project_id": 1, "id": 7}). Klient podle nich
+načte jen to, co potřebuje (GET /changes, /dashboard_stats/, výsledek OCR úlohy),
+a nemusí nic periodicky dotazovat. Události nejsou trvalé: po výpadku spojení
+klient obnoví stav přes GET /changes.
+
+Výchozí broker rozesílá události jen v rámci procesu. S více workery uvicornu
+(nebo jinými procesy zapisujícími do databáze) se nastaví EVENTS_BACKEND=postgres,
+události pak jdou přes LISTEN/NOTIFY a dostanou je odběratelé ve všech workerech.
+"""
+import asyncio
+import json
+import os
+import select
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+from sqlalchemy import text as sql_text
+from . import models
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "ranger_events")
+# Nejvýše nedoručených událostí na klienta; pomalý klient místo nich dostane "resync"
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+# Interval (s) komentáře keepalive, drží spojení přes proxy a odhalí odpojené klienty
+EVENTS_KEEPALIVE = float(os.getenv("EVENTS_KEEPALIVE", "15"))
+
+class Subscription:
+    """Fronta událostí jednoho SSE spojení, volitelně jen pro jeden projekt"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, project_id: Optional[int] = None):
+        self.loop = loop
+        self.project_id = project_id
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+
+    def wants(self, event: Dict[str, Any]) -> bool:
+        # Události bez projektu (resync) dostanou všichni
+        return self.project_id is None or event.get("project_id") in (None, self.project_id)
+
+    def _put(self, event: Dict[str, Any]):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Klient nestíhá číst: nevyřízené události se zahodí a klient si stav obnoví sám
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync", "project_id": self.project_id})
+
+    def deliver(self, event: Dict[str, Any]):
+        """Bezpečné volat z libovolného vlákna, událost se vloží ve smyčce odběratele"""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Smyčka už skončila (vypínání serveru)
+            pass
+
+class EventBroker:
+    """Rozesílání událostí odběratelům v tomto procesu"""
+    # Publikování neblokuje, async endpointy ho mohou volat přímo
+    blocking = False
+
+    def __init__(self):
+        self._subscriptions: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, project_id: Optional[int] = None) -> Subscription:
+        subscription = Subscription(asyncio.get_running_loop(), project_id)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscriptions)
+
+    def dispatch(self, event: Dict[str, Any]):
+        with self._lock:
+            subscriptions = [subscription for subscription in self._subscriptions if subscription.wants(event)]
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    def publish(self, event: Dict[str, Any]):
+        self.dispatch(event)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+class PostgresEventBroker(EventBroker):
+    """
+    Události přes Postgres LISTEN/NOTIFY. Publikuje se jen přes NOTIFY, lokální odběratele
+    obsluhuje stejné vlákno LISTEN jako odběratele ostatních workerů.
+    """
+    blocking = True
+
+    def __init__(self, engine, channel: str = EVENTS_CHANNEL):
+        super().__init__()
+        self.engine = engine
+        self.channel = channel
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def publish(self, event: Dict[str, Any]):
+        with self.engine.begin() as conn:
+            conn.execute(sql_text("SELECT pg_notify(:channel, :payload)"),
+                         {"channel": self.channel, "payload": json.dumps(event, default=str)})
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._listen, name="events-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread = None
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            connection = None
+            try:
+                # Vlastní spojení mimo pool, LISTEN drží spojení po celou dobu běhu
+                connection = self.engine.raw_connection()
+                connection.detach()
+                dbapi_connection = connection.connection
+                dbapi_connection.autocommit = True
+                with dbapi_connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                # Během výpadku mohly události chybět, klienti si stav obnoví
+                self.dispatch({"type": "resync", "project_id": None})
+                while not self._stopped.is_set():
+                    if select.select([dbapi_connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        notify = dbapi_connection.notifies.pop(0)
+                        self.dispatch(json.loads(notify.payload))
+            except Exception as e:
+                print(f"Event listener failed: {e}")
+                time.sleep(1)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+def create_broker() -> EventBroker:
+    if EVENTS_BACKEND == "postgres":
+        return PostgresEventBroker(models.engine)
+    return EventBroker()
+
+broker = create_broker()
+
+def publish(event_type: str, project_id: Optional[int] = None, **data):
+    """Publikuje událost po potvrzení zápisu; s EVENTS_BACKEND=postgres blokující volání"""
+    broker.publish({"type": event_type, "project_id": project_id, **data, "at": datetime.utcnow().isoformat()})
+
+def format_event(event: Dict[str, Any]) -> str:
+    """Událost ve formátu text/event-stream"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
@@ -0,0 +1,74 @@
+"""
+Sdílená pipeline exportů. Řádky se čtou serverovým kurzorem po dávkách
+a průběžně se z nich generuje CSV (volitelně gzip) nebo XLSX, takže paměť
+zůstává konstantní bez ohledu na velikost tabulky.
+"""
+import csv
+import tempfile
+import zlib
+from io import StringIO
+from typing import Iterable, Iterator, List
+from fastapi.responses import StreamingResponse
+
+# Počet řádků načítaných z databáze v jedné dávce
+EXPORT_BATCH_SIZE = 1000
+# Velikost bloku odesílaného klientovi
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def iter_rows(query, batch_size: int = EXPORT_BATCH_SIZE):
+    """Řádky dotazu přes serverový kurzor (stream_results) po dávkách"""
+    return query.execution_options(stream_results=True).yield_per(batch_size)
+
+def iter_csv(header: List[str], rows: Iterable) -> Iterator[bytes]:
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)  # formát gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def iter_xlsx(header: List[str], rows: Iterable, title: str) -> Iterator[bytes]:
+    """
+    XLSX přes write-only sešit openpyxl (řádky se průběžně zapisují na disk).
+    Formát ZIP se dokončí až po posledním řádku, odesílat se proto začne po uložení.
+    """
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    ws.append(header)
+    for row in rows:
+        ws.append(list(row))
+    with tempfile.TemporaryFile() as spool:
+        wb.save(spool)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(EXPORT_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def export_response(name: str, header: List[str], query, format: str = "csv", compress: bool = False) -> StreamingResponse:
+    rows = iter_rows(query)
+    if format == "xlsx":
+        body, filename, media_type = iter_xlsx(header, rows, name), f"{name}.xlsx", XLSX_MEDIA_TYPE
+    else:
+        body, filename, media_type = iter_csv(header, rows), f"{name}.csv", "text/csv; charset=utf-8"
+        if compress:
+            body, filename, media_type = gzip_stream(body), f"{filename}.gz", "application/gzip"
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f"attachment; filename={filename}"
+    })
@@ -0,0 +1,230 @@
+"""
+Fronta úloh OCR/extrakce dat. Úlohy se ukládají do tabulky ocr_jobs (přežijí restart)
+a CPU náročné zpracování běží v poolu procesů mimo event loop uvicornu.
+
+Úlohu spustí jen proces, který ji atomicky převezme ze stavu queued, takže opakované
+zařazení (např. každým workerem uvicornu po startu) ji nezpracuje dvakrát. Běžící úloha
+obnovuje heartbeat_at; úlohu s heartbeatem starším než OCR_JOB_LEASE už nikdo nezpracovává
+a při dalším startu se zařadí znovu.
+"""
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from . import models, crud, ocr, storage, events
+
+# Počet pracovních procesů pro OCR (výchozí = počet jader), od něj se odvozuje i ocr.OCR_PAGE_WORKERS
+OCR_WORKERS = ocr.OCR_WORKERS
+# Interval (s) obnovy heartbeatu běžící úlohy a doba (s), po které se úloha bez heartbeatu považuje za opuštěnou
+OCR_JOB_HEARTBEAT = float(os.getenv("OCR_JOB_HEARTBEAT", "30"))
+OCR_JOB_LEASE = float(os.getenv("OCR_JOB_LEASE", "300"))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+_executor: Optional[ProcessPoolExecutor] = None
+# MinIO klient pracovního procesu (vytváří se v _init_worker)
+_minio_client = None
+
+def _init_worker():
+    global _minio_client
+    # Spojení do databáze zděděná z rodičovského procesu se nesmí sdílet
+    models.engine.dispose()
+    _minio_client = storage.create_minio_client()
+    # Pracovní procesy existují kvůli OCR/NLP, model se načte hned při jejich startu
+    crud.preload_heavy_dependencies()
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=OCR_WORKERS, initializer=_init_worker)
+    return _executor
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _claim_job(db: Session, job_id: int) -> bool:
+    """Atomické převzetí úlohy ze stavu queued (UPDATE ... WHERE status = 'queued')"""
+    now = datetime.utcnow()
+    claimed = db.query(models.OcrJob).filter(
+        models.OcrJob.id == job_id, models.OcrJob.status == JOB_QUEUED
+    ).update({"status": JOB_RUNNING, "started_at": now, "heartbeat_at": now}, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+@contextmanager
+def _heartbeat(job_id: int):
+    """Po dobu zpracování obnovuje heartbeat_at úlohy z vedlejšího vlákna (s vlastní session)"""
+    stopped = threading.Event()
+
+    def beat():
+        while not stopped.wait(OCR_JOB_HEARTBEAT):
+            db = models.SessionLocal()
+            try:
+                db.query(models.OcrJob).filter(
+                    models.OcrJob.id == job_id, models.OcrJob.status == JOB_RUNNING
+                ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                print(f"OCR job heartbeat failed: {e}")
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=beat, name=f"ocr-job-{job_id}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+def _process_batch_job(db: Session, job: models.OcrJob):
+    """
+    Dávková úloha nad dokumenty projektu: souhrn každého dokumentu se hned zapíše do progress,
+    odkud ho API průběžně posílá klientovi. Texty zůstávají v ocr_results (POST /documents/{id}/ocr je vrátí z cache).
+    """
+    params = job.params or {}
+    documents = crud.get_documents(db, project_id=job.project_id, category=params.get("category"), limit=None)
+    progress = []
+    job.progress = progress
+    db.commit()
+    for result in crud.perform_batch_ocr(
+        db, documents, _minio_client,
+        batch_size=params.get("batch_size", crud.NLP_BATCH_SIZE),
+        n_process=params.get("n_process", 1),
+    ):
+        progress = progress + [{key: result[key] for key in ("document_id", "filename", "status", "cached", "error")}]
+        # Nový seznam, aby SQLAlchemy změnu sloupce JSON zaznamenala
+        job.progress = progress
+        db.commit()
+    job.status = JOB_DONE
+    job.result = {"documents": progress}
+
+def _process_job(db: Session, job_id: int) -> dict:
+    try:
+        job = db.query(models.OcrJob).filter(models.OcrJob.id == job_id).one()
+        # Dávkové úlohy mají místo dokumentu projekt
+        if job.project_id is not None:
+            with _heartbeat(job_id):
+                _process_batch_job(db, job)
+            job.finished_at = datetime.utcnow()
+            db.commit()
+            return _job_summary(db, job_id)
+        with _heartbeat(job_id):
+            ocr_text, extracted_data = crud.perform_ocr_on_document(db, job.document_id, _minio_client)
+        if ocr_text is None:
+            job.status = JOB_FAILED
+            job.error = "Document not found or OCR failed"
+        else:
+            job.status = JOB_DONE
+            job.result = jsonable_encoder({"ocr_text": ocr_text, "extracted_data": extracted_data})
+        job.finished_at = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        db.query(models.OcrJob).filter(models.OcrJob.id == job_id).update({
+            "status": JOB_FAILED,
+            "error": str(e),
+            "finished_at": datetime.utcnow(),
+        })
+        db.commit()
+    return _job_summary(db, job_id)
+
+def run_ocr_job(job_id: int) -> Optional[dict]:
+    """
+    Zpracování jedné úlohy v pracovním procesu, stav se průběžně zapisuje do databáze.
+    Vrací stav dokončené úlohy pro událost ocr_job.finished (publikuje ji hlavní proces),
+    None, pokud úloha neexistuje nebo ji už převzal jiný proces.
+    """
+    db = models.SessionLocal()
+    try:
+        if not _claim_job(db, job_id):
+            return None
+        return _process_job(db, job_id)
+    finally:
+        db.close()
+
+def _job_summary(db: Session, job_id: int) -> dict:
+    job_id, document_id, status, project_id = db.query(
+        models.OcrJob.id, models.OcrJob.document_id, models.OcrJob.status,
+        func.coalesce(models.Document.project_id, models.OcrJob.project_id),
+    ).outerjoin(models.Document, models.Document.id == models.OcrJob.document_id).filter(models.OcrJob.id == job_id).one()
+    return {"job_id": job_id, "document_id": document_id, "status": status, "project_id": project_id}
+
+def _publish_job_finished(future: Future):
+    # Běží ve vlákně poolu v hlavním procesu, kde jsou připojení odběratelé událostí
+    try:
+        summary = future.result()
+    except Exception as e:
+        # Pád pracovního procesu: úloha zůstane rozpracovaná, po vypršení heartbeatu se zařadí znovu
+        print(f"OCR job failed outside of the worker: {e}")
+        return
+    if summary is not None:
+        events.publish("ocr_job.finished", summary.pop("project_id"), **summary)
+
+def _submit(job_id: int):
+    get_executor().submit(run_ocr_job, job_id).add_done_callback(_publish_job_finished)
+
+def enqueue_ocr_job(db: Session, document_id: int, cached: Optional[models.OcrResult] = None) -> models.OcrJob:
+    """Zařadí úlohu do poolu; s výsledkem z cache je úloha hotová hned a nic se nespouští"""
+    if cached is not None:
+        now = datetime.utcnow()
+        job = models.OcrJob(
+            document_id=document_id,
+            status=JOB_DONE,
+            result={"ocr_text": cached.ocr_text, "extracted_data": cached.extracted_data},
+            started_at=now,
+            finished_at=now,
+        )
+    else:
+        job = models.OcrJob(document_id=document_id, status=JOB_QUEUED)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    if cached is None:
+        _submit(job.id)
+    return job
+
+def enqueue_batch_ocr_job(db: Session, project_id: int, category: Optional[str] = None,
+                          batch_size: int = 8, n_process: int = 1) -> models.OcrJob:
+    """Zařadí dávkovou OCR nad dokumenty projektu (volitelně jen jedné kategorie)"""
+    job = models.OcrJob(
+        project_id=project_id,
+        params={"category": category, "batch_size": batch_size, "n_process": n_process},
+        status=JOB_QUEUED,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _submit(job.id)
+    return job
+
+def get_ocr_job(db: Session, job_id: int):
+    return db.query(models.OcrJob).filter(models.OcrJob.id == job_id).first()
+
+def resume_pending_jobs(db: Session) -> int:
+    """
+    Po startu znovu zařadí úlohy, které nikdo nezpracovává: čekající ve frontě a rozpracované
+    s heartbeatem starším než OCR_JOB_LEASE. Úlohy, na kterých pracují živé procesy, nechá být.
+    Úlohu zařazenou víc workery zpracuje jen ten, který ji převezme první.
+    """
+    stale = datetime.utcnow() - timedelta(seconds=OCR_JOB_LEASE)
+    db.query(models.OcrJob).filter(
+        models.OcrJob.status == JOB_RUNNING,
+        func.coalesce(models.OcrJob.heartbeat_at, models.OcrJob.started_at, models.OcrJob.created_at) < stale,
+    ).update({"status": JOB_QUEUED, "started_at": None, "heartbeat_at": None}, synchronize_session=False)
+    db.commit()
+    pending = [job_id for job_id, in db.query(models.OcrJob.id).filter(models.OcrJob.status == JOB_QUEUED)]
+    for job_id in pending:
+        _submit(job_id)
+    return len(pending)
@@ -1,18 +1,24 @@
-from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, status
+import time
+# Začátek importu aplikace, pro měření doby startu
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, RedirectResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from . import models, schemas, crud
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas, crud, jobs, storage, export, dbpool, cache, search, measurements, changes, events
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
-from minio import Minio
+from datetime import date, datetime, timedelta
 import os
-from io import StringIO, BytesIO
-import csv
-from PIL import Image
-import pytesseract
-import cv2
-import numpy as np
+import asyncio
+import hashlib
+import json
+import mimetypes
+import resource
+from typing import Union
 
 
 # --- JWT nastavení ---
@@ -22,15 +28,27 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Lehký režim: API bez NLP/CV, zpracování dokumentů a fotek vrací 503
+LIGHT_MODE = os.getenv("RANGER_LIGHT_MODE", "0") == "1"
+# Načtení modelu spaCy a knihoven OCR/CV už při startu místo při prvním požadavku
+PRELOAD_MODELS = os.getenv("RANGER_PRELOAD_MODELS", "0") == "1"
+
 app = FastAPI()
 
+# Doba startu a paměť procesu (viz /health)
+startup_stats = {}
+
 # MinIO Client
-minio_client = Minio(
-    os.getenv("MINIO_URL"),
-    access_key=os.getenv("MINIO_ACCESS_KEY"),
-    secret_key=os.getenv("MINIO_SECRET_KEY"),
-    secure=False
-)
+minio_client = storage.create_minio_client()
+# Klient pro podepsané URL (jen je-li nastaveno MINIO_PUBLIC_URL)
+presign_client = storage.create_presign_client()
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# Soubory od této velikosti (bajty) se stahují přesměrováním na podepsanou URL, 0 = vypnuto
+DOWNLOAD_REDIRECT_MIN_SIZE = int(os.getenv("DOWNLOAD_REDIRECT_MIN_SIZE", "0"))
+DOWNLOAD_URL_EXPIRE_MINUTES = 15
+# Interval (s), po kterém se při streamování průběhu dávkové OCR znovu čte stav úlohy
+OCR_PROGRESS_POLL = float(os.getenv("OCR_PROGRESS_POLL", "1"))
 
 # Dependency
 # Dependency
@@ -42,6 +60,49 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    # Pro async endpointy: dotazy neblokují event loop (CRUD funkce přes db.run_sync)
+    async with models.AsyncSessionLocal() as db:
+        yield db
+
+def _max_rss_mb() -> float:
+    # ru_maxrss je na Linuxu v kilobajtech
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def require_heavy_processing():
+    if LIGHT_MODE:
+        raise HTTPException(status_code=503, detail="Document processing is disabled on this API instance")
+
+@app.on_event("startup")
+def startup():
+    try:
+        storage.ensure_bucket(minio_client)
+    except Exception as e:
+        # MinIO ještě nemusí běžet, bucket se pak ověří při prvním nahrání
+        print(f"Storage bucket check failed: {e}")
+    if not LIGHT_MODE:
+        if PRELOAD_MODELS:
+            crud.preload_heavy_dependencies()
+        db = models.SessionLocal()
+        try:
+            jobs.resume_pending_jobs(db)
+        finally:
+            db.close()
+    events.broker.start()
+    startup_stats["startup_seconds"] = round(time.perf_counter() - _import_started, 3)
+    startup_stats["startup_max_rss_mb"] = round(_max_rss_mb(), 1)
+    print(f"Backend started in {startup_stats['startup_seconds']} s, "
+          f"max RSS {startup_stats['startup_max_rss_mb']} MB (light mode: {LIGHT_MODE})")
+
+@app.on_event("shutdown")
+def stop_ocr_workers():
+    jobs.shutdown()
+    events.broker.stop()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await models.dispose_async_engine()
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -49,7 +110,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -60,21 +121,44 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = schemas.TokenData(username=username)
+        token_data = schemas.TokenData(username=username, user_id=payload.get("uid"), role=payload.get("role"))
     except JWTError:
         raise credentials_exception
-    user = crud.get_user_by_username(db, username=token_data.username)
+    # Většina požadavků skončí v cache, databáze se čte jen po vypršení nebo změně uživatele
+    user = crud.user_cache.get(token_data.username)
     if user is None:
+        user = await db.run_sync(crud.load_current_user, token_data.username)
+    # Token vydaný pro smazaný a znovu založený účet se stejným jménem neplatí
+    if user is None or (token_data.user_id is not None and token_data.user_id != user.id):
         raise credentials_exception
     return user
 
-def get_current_active_user(current_user: models.User = Depends(get_current_user)):
+def get_current_active_user(current_user: schemas.CurrentUser = Depends(get_current_user)):
     return current_user
 
-def get_current_admin_user(current_user: models.User = Depends(get_current_user)):
+def get_current_admin_user(current_user: schemas.CurrentUser = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin privileges required")
     return current_user
+@app.get("/health")
+def health():
+    return {
+        "light_mode": LIGHT_MODE,
+        "nlp_loaded": crud.is_nlp_loaded(),
+        "max_rss_mb": round(_max_rss_mb(), 1),
+        **startup_stats,
+    }
+
+@app.get("/metrics")
+def metrics():
+    """Stav poolů databázových spojení tohoto procesu (každý worker uvicornu má vlastní)"""
+    return {
+        "pid": os.getpid(),
+        "db_pool": dbpool.pool_status(models.engine),
+        "async_db_pool": dbpool.pool_status(models.async_engine.sync_engine) if models.async_engine else None,
+        "event_subscribers": events.broker.subscriber_count(),
+    }
+
 @app.post("/auth/register", response_model=schemas.UserOut)
 def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db_user = crud.get_user_by_username(db, user.username)
@@ -83,103 +167,300 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return crud.create_user(db, user)
 
 @app.post("/auth/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.get_user_by_username(db, form_data.username)
-    if not user or not crud.verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await db.run_sync(crud.get_user_by_username, form_data.username)
+    valid = user is not None and await asyncio.get_running_loop().run_in_executor(
+        crud.password_executor, crud.verify_password, form_data.password, user.hashed_password
+    )
+    if not valid:
         raise HTTPException(status_code=401, detail="Incorrect username or password")
-    access_token = create_access_token(data={"sub": user.username})
+    # ID a role v tokenu, klient je zná bez dalšího dotazu
+    access_token = create_access_token(data={"sub": user.username, "uid": user.id, "role": user.role})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/projects/", response_model=schemas.Project)
 def create_project(
     project: schemas.ProjectCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    current_user: schemas.CurrentUser = Depends(get_current_active_user)
 ):
-    return crud.create_project(db=db, project=project)
+    db_project = crud.create_project(db=db, project=project)
+    cache.response_cache.invalidate_project(None)
+    events.publish("project.created", db_project.id)
+    return db_project
 
-@app.get("/projects/", response_model=list[schemas.Project])
-def read_projects(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    projects = crud.get_projects(db, skip=skip, limit=limit)
-    return projects
+def next_cursor_headers(items: list, limit: int, *cursor_values) -> dict:
+    """Plná stránka znamená, že může existovat další; token se posílá v hlavičce X-Next-Cursor"""
+    if items and len(items) == limit:
+        return {"X-Next-Cursor": crud.encode_cursor(*cursor_values)}
+    return {}
+
+def set_next_cursor(response: Response, items: list, limit: int, *cursor_values):
+    response.headers.update(next_cursor_headers(items, limit, *cursor_values))
+
+async def _publish_event(event_type: str, project_id: int | None = None, **data):
+    # S EVENTS_BACKEND=postgres je publikování dotaz do databáze, nesmí blokovat event loop
+    if events.broker.blocking:
+        await run_in_threadpool(events.publish, event_type, project_id, **data)
+    else:
+        events.publish(event_type, project_id, **data)
+
+async def _cache_call(function, *args, **kwargs):
+    # Sdílené úložiště (Redis) je síťové volání, nesmí blokovat event loop
+    if cache.response_cache.store.blocking:
+        return await run_in_threadpool(function, *args, **kwargs)
+    return function(*args, **kwargs)
+
+async def cached_response(request: Request, name: str, scopes: list[str], params: dict, compute) -> Response:
+    """
+    JSON odpověď z cache odpovědí; při miss ji spočítá `await compute()` -> (data, hlavičky).
+    Odpověď nese slabý ETag a na shodný If-None-Match vrací 304 bez těla.
+    """
+    response_cache = cache.response_cache
+    key = entry = None
+    if response_cache.enabled:
+        key = await _cache_call(response_cache.key, name, scopes, params)
+        entry = await _cache_call(response_cache.get, key)
+    if entry is not None:
+        body, headers = entry
+    else:
+        data, headers = await compute()
+        body = JSONResponse(jsonable_encoder(data)).body
+        headers = {**headers, "ETag": f'W/"{hashlib.sha1(body).hexdigest()}"', "Cache-Control": "no-cache"}
+        if key is not None:
+            await _cache_call(response_cache.set, key, body, headers)
+    if _etag_matches(request.headers.get("if-none-match"), headers["ETag"].removeprefix("W/")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+@app.get("/projects/", response_model=Union[list[schemas.ProjectSummary], list[schemas.Project]])
+async def read_projects(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    detail: bool = False,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    async def compute():
+        # Vnořené dokumenty a logy jen na vyžádání (?detail=true), jinak odlehčený souhrn
+        try:
+            if detail:
+                projects = await db.run_sync(crud.get_projects, skip=skip, limit=limit, with_details=True, cursor=cursor)
+            else:
+                projects = await db.run_sync(crud.get_project_summaries, skip=skip, limit=limit, cursor=cursor)
+        except ValueError as e:
+            # Neplatný kurzor; chyba převodu na schéma (ValidationError je také ValueError) sem nepatří
+            raise HTTPException(status_code=400, detail=str(e))
+        if detail:
+            items = [schemas.Project.from_orm(project) for project in projects]
+            last_id = projects[-1].id if projects else None
+        else:
+            items = [schemas.ProjectSummary(**project) for project in projects]
+            last_id = projects[-1]["id"] if projects else None
+        return items, next_cursor_headers(items, limit, last_id)
+
+    params = {"skip": skip, "limit": limit, "detail": detail, "cursor": cursor}
+    return await cached_response(request, "projects", ["projects"], params, compute)
 
 @app.get("/projects/{project_id}", response_model=schemas.Project)
-def read_project(project_id: int, db: Session = Depends(get_db)):
-    db_project = crud.get_project(db, project_id=project_id)
-    if db_project is None:
-        raise HTTPException(status_code=404, detail="Project not found")
-    return db_project
+async def read_project(project_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def compute():
+        db_project = await db.run_sync(crud.get_project, project_id=project_id, with_details=True)
+        if db_project is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+        return schemas.Project.from_orm(db_project), {}
+
+    return await cached_response(request, "project", [f"project:{project_id}"], {"id": project_id}, compute)
 
 @app.put("/projects/{project_id}", response_model=schemas.Project)
 def update_project(
     project_id: int,
     project: schemas.ProjectCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    current_user: schemas.CurrentUser = Depends(get_current_active_user)
 ):
     db_project = crud.update_project(db=db, project_id=project_id, project=project)
     if db_project is None:
         raise HTTPException(status_code=404, detail="Project not found")
+    cache.response_cache.invalidate_project(project_id)
+    events.publish("project.updated", project_id)
     return db_project
 
 @app.delete("/projects/{project_id}")
 def delete_project(
     project_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin_user)
+    current_user: schemas.CurrentUser = Depends(get_current_admin_user)
 ):
     db_project = crud.delete_project(db=db, project_id=project_id)
     if db_project is None:
         raise HTTPException(status_code=404, detail="Project not found")
+    cache.response_cache.invalidate_project(project_id)
+    events.publish("project.deleted", project_id)
     return {"message": "Project deleted successfully"}
 
+def _parse_range(range_header: str, size: int):
+    """
+    Jediný rozsah "bytes=start-end", "bytes=start-" nebo "bytes=-suffix".
+    Vrací (start, end) včetně, None pro neplatnou/nepodporovanou hlavičku (pošle se
+    celý soubor) a vyhodí ValueError pro nesplnitelný rozsah.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    if not (start_text.isdigit() or start_text == "") or not (end_text.isdigit() or end_text == ""):
+        return None
+    if start_text:
+        start = int(start_text)
+        end = min(int(end_text), size - 1) if end_text else size - 1
+    elif end_text and int(end_text) > 0:
+        start, end = max(size - int(end_text), 0), size - 1
+    else:
+        raise ValueError("Unsatisfiable range")
+    if start >= size or start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
 @app.get("/documents/{document_id}/download")
-async def download_document(document_id: int, db: Session = Depends(get_db)):
-    db_document = db.query(models.Document).filter(models.Document.id == document_id).first()
+async def download_document(document_id: int, request: Request, redirect: bool = False, db: AsyncSession = Depends(get_async_db)):
+    db_document = await db.get(models.Document, document_id)
     if db_document is None:
         raise HTTPException(status_code=404, detail="Document not found")
+    object_name, filename, content_type = db_document.object_name, db_document.filename, db_document.content_type
+    # Spojení do databáze se vrátí do poolu hned, nedrží se po dobu stahování z MinIO a odesílání těla
+    await db.close()
 
-    bucket_name = "ranger-bucket"
+    # Volání MinIO jsou blokující, běží v threadpoolu; tělo odpovědi Starlette čte také v threadpoolu
+    bucket_name = storage.BUCKET_NAME
     try:
-        response = minio_client.get_object(bucket_name, db_document.filename)
-        return StreamingResponse(response.stream(32*1024), media_type="application/octet-stream", headers={
-            "Content-Disposition": f"attachment; filename=\"{db_document.filename}\"
-        })
+        stat = await run_in_threadpool(minio_client.stat_object, bucket_name, object_name)
     except Exception as e:
+        if storage.is_not_found(e):
+            raise HTTPException(status_code=404, detail="File not found in storage")
         raise HTTPException(status_code=500, detail=f"Error downloading file: {e}")
-    finally:
-        response.close()
-        response.release_conn()
-
-@app.post("/projects/{project_id}/uploadfile/")
-async def create_upload_file(project_id: int, file: UploadFile = File(...), category: str | None = None, db: Session = Depends(get_db)):
-    bucket_name = "ranger-bucket"
-    found = minio_client.bucket_exists(bucket_name)
-    if not found:
-        minio_client.make_bucket(bucket_name)
-
-    minio_client.put_object(
-        bucket_name,
-        file.filename,
-        file.file,
-        length=-1, # Unknown length
-        part_size=10*1024*1024
+
+    etag = f'"{stat.etag}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename=\"{filename}\"",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Velké soubory si klient může stáhnout přímo z MinIO přes podepsanou URL
+    if presign_client is not None and (redirect or (DOWNLOAD_REDIRECT_MIN_SIZE and stat.size >= DOWNLOAD_REDIRECT_MIN_SIZE)):
+        url = await run_in_threadpool(
+            presign_client.presigned_get_object, bucket_name, object_name,
+            expires=timedelta(minutes=DOWNLOAD_URL_EXPIRE_MINUTES),
+        )
+        return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+    start, end = 0, stat.size - 1
+    status_code = status.HTTP_200_OK
+    range_header = request.headers.get("range")
+    # If-Range: rozsah platí jen pro stejnou verzi souboru, jinak se posílá celý
+    if range_header and request.headers.get("if-range", etag) == etag and stat.size > 0:
+        try:
+            requested = _parse_range(range_header, stat.size)
+        except ValueError:
+            return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers={
+                "Content-Range": f"bytes */{stat.size}",
+            })
+        if requested is not None:
+            start, end = requested
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            headers["Content-Range"] = f"bytes {start}-{end}/{stat.size}"
+    headers["Content-Length"] = str(end - start + 1 if stat.size else 0)
+
+    try:
+        response = await run_in_threadpool(
+            minio_client.get_object, bucket_name, object_name,
+            offset=start, length=end - start + 1 if stat.size else 0,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error downloading file: {e}")
+
+    def body():
+        # Spojení se uvolní až po odeslání posledního bloku (nebo přerušení klientem)
+        try:
+            yield from response.stream(DOWNLOAD_CHUNK_SIZE)
+        finally:
+            response.close()
+            response.release_conn()
+
+    media_type = mimetypes.guess_type(filename)[0] or content_type or "application/octet-stream"
+    return StreamingResponse(body(), status_code=status_code, media_type=media_type, headers=headers)
+
+async def _store_upload(project_id: int, file: UploadFile, category: str | None):
+    """Uloží nahraný soubor do MinIO mimo event loop, vrací (nový dokument, výsledek uložení)"""
+    stored = await run_in_threadpool(storage.store_content, minio_client, file.file, file.content_type)
+    db_document = models.Document(
+        filename=file.filename,
+        project_id=project_id,
+        category=category,
+        object_name=stored["object_name"],
+        content_hash=stored["content_hash"],
+        size=stored["size"],
+        content_type=file.content_type,
     )
-    db_document = models.Document(filename=file.filename, project_id=project_id, category=category)
+    return db_document, stored
+
+def _uploaded_document(db_document: models.Document, stored: dict):
+    return schemas.UploadedDocument(
+        id=db_document.id,
+        filename=db_document.filename,
+        category=db_document.category,
+        content_hash=stored["content_hash"],
+        size=stored["size"],
+        deduplicated=stored["deduplicated"],
+    )
+
+@app.post("/projects/{project_id}/uploadfile/", response_model=schemas.UploadedDocument)
+async def create_upload_file(project_id: int, file: UploadFile = File(...), category: str | None = None, db: AsyncSession = Depends(get_async_db)):
+    db_document, stored = await _store_upload(project_id, file, category)
     db.add(db_document)
-    db.commit()
-    db.refresh(db_document)
-    return {"filename": file.filename, "category": category}
+    await db.commit()
+    await _cache_call(cache.response_cache.invalidate_project, project_id)
+    await _publish_event("document.uploaded", project_id, ids=[db_document.id])
+    return _uploaded_document(db_document, stored)
+
+@app.post("/projects/{project_id}/uploadfiles/", response_model=list[schemas.UploadedDocument])
+async def create_upload_files(project_id: int, files: list[UploadFile] = File(...), category: str | None = None, db: AsyncSession = Depends(get_async_db)):
+    """Hromadné nahrání: soubory se ukládají souběžně, dokumenty se zapíší jedním commitem"""
+    uploads = await asyncio.gather(*(_store_upload(project_id, file, category) for file in files))
+    db.add_all([db_document for db_document, _ in uploads])
+    await db.commit()
+    await _cache_call(cache.response_cache.invalidate_project, project_id)
+    await _publish_event("document.uploaded", project_id, ids=[db_document.id for db_document, _ in uploads])
+    return [_uploaded_document(db_document, stored) for db_document, stored in uploads]
 
 @app.get("/projects/{project_id}/documents/", response_model=list[schemas.Document])
-def read_documents_for_project(
+async def read_documents_for_project(
     project_id: int,
+    response: Response,
     category: str | None = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    documents = crud.get_documents(db, project_id=project_id, category=category, skip=skip, limit=limit)
+    try:
+        documents = await db.run_sync(
+            crud.get_documents, project_id=project_id, category=category, skip=skip, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if documents:
+        set_next_cursor(response, documents, limit, documents[-1].id)
     return documents
 
 @app.post("/projects/{project_id}/progress_logs/", response_model=schemas.ProgressLog)
@@ -188,16 +469,27 @@ def create_progress_log_for_project(
     progress_log: schemas.ProgressLogCreate,
     db: Session = Depends(get_db)
 ):
-    return crud.create_progress_log(db=db, progress_log=progress_log, project_id=project_id)
+    db_progress_log = crud.create_progress_log(db=db, progress_log=progress_log, project_id=project_id)
+    cache.response_cache.invalidate_project(project_id)
+    events.publish("progress_log.created", project_id, id=db_progress_log.id)
+    return db_progress_log
 
 @app.get("/projects/{project_id}/progress_logs/", response_model=list[schemas.ProgressLog])
-def read_progress_logs_for_project(
+async def read_progress_logs_for_project(
     project_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    progress_logs = crud.get_progress_logs(db, project_id=project_id, skip=skip, limit=limit)
+    try:
+        progress_logs = await db.run_sync(crud.get_progress_logs, project_id=project_id, skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if progress_logs:
+        last = progress_logs[-1]
+        set_next_cursor(response, progress_logs, limit, last.date, last.id)
     return progress_logs
 
 @app.put("/progress_logs/{progress_log_id}", response_model=schemas.ProgressLog)
@@ -209,6 +501,8 @@ def update_progress_log(
     db_progress_log = crud.update_progress_log(db=db, progress_log_id=progress_log_id, progress_log=progress_log)
     if db_progress_log is None:
         raise HTTPException(status_code=404, detail="Progress Log not found")
+    cache.response_cache.invalidate_project(db_progress_log.project_id)
+    events.publish("progress_log.updated", db_progress_log.project_id, id=db_progress_log.id)
     return db_progress_log
 
 @app.delete("/progress_logs/{progress_log_id}")
@@ -216,72 +510,275 @@ def delete_progress_log(progress_log_id: int, db: Session = Depends(get_db)):
     db_progress_log = crud.delete_progress_log(db=db, progress_log_id=progress_log_id)
     if db_progress_log is None:
         raise HTTPException(status_code=404, detail="Progress Log not found")
+    cache.response_cache.invalidate_project(db_progress_log.project_id)
+    events.publish("progress_log.deleted", db_progress_log.project_id, id=progress_log_id)
     return {"message": "Progress Log deleted successfully"}
 
-@app.post("/documents/{document_id}/ocr")
-async def perform_ocr(document_id: int, db: Session = Depends(get_db)):
-    ocr_text, extracted_data = crud.perform_ocr_on_document(db, document_id, minio_client)
-    if ocr_text is None:
-        raise HTTPException(status_code=404, detail="Document not found or OCR failed")
-    return {"ocr_text": ocr_text, "extracted_data": extracted_data}
+@app.post("/sync/objects", response_model=schemas.SyncObject)
+async def upload_sync_object(file: UploadFile = File(...)):
+    """Obsah fotky pro pozdější odkaz v /sync/batch; opakované nahrání stejného souboru se neukládá znovu"""
+    stored = await run_in_threadpool(storage.store_content, minio_client, file.file, file.content_type)
+    return schemas.SyncObject(
+        content_hash=stored["content_hash"], size=stored["size"], deduplicated=stored["deduplicated"]
+    )
 
-@app.post("/documents/{document_id}/detect_anomaly")
-async def detect_anomaly(document_id: int):
-    anomaly_result = crud.detect_anomaly_in_image(document_id, minio_client)
+@app.post("/sync/batch", response_model=schemas.SyncBatchResult)
+def sync_batch(batch: schemas.SyncBatch, db: Session = Depends(get_db)):
+    """Dávka offline záznamů z mobilní aplikace, jedna transakce a výsledek pro každou položku"""
+    results = crud.sync_batch(db, batch, minio_client)
+    # Nové řádky podle projektu: zneplatnění cache a jedna událost za projekt
+    touched: dict[int, dict[str, list[int]]] = {}
+    for kind, name, items in (("progress_logs", "progress_log_ids", batch.progress_logs),
+                              ("photos", "document_ids", batch.photos)):
+        for item, result in zip(items, results[kind]):
+            if result["status"] == "created":
+                touched.setdefault(item.project_id, {"progress_log_ids": [], "document_ids": []})[name].append(result["id"])
+    for project_id, ids in touched.items():
+        cache.response_cache.invalidate_project(project_id)
+        events.publish("sync.completed", project_id, **ids)
+    return results
+
+@app.post("/documents/{document_id}/ocr", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_heavy_processing)])
+def perform_ocr(document_id: int, db: Session = Depends(get_db)):
+    db_document = db.query(models.Document).filter(models.Document.id == document_id).first()
+    if db_document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    cached = crud.lookup_ocr_cache(db, db_document, minio_client)
+    job = jobs.enqueue_ocr_job(db, document_id, cached=cached)
+    return {"job_id": job.id, "status": job.status}
+
+async def _stream_batch_job(job_id: int):
+    """Průběh dávkové úlohy jako NDJSON: řádek se stavem, souhrn každého dokumentu, nakonec výsledný stav"""
+    yield json.dumps({"job_id": job_id, "status": jobs.JOB_QUEUED}) + "\n"
+    sent = 0
+    while True:
+        # Krátká session na každý dotaz, spojení se během čekání nedrží
+        async with models.AsyncSessionLocal() as db:
+            job = await db.get(models.OcrJob, job_id)
+            job_status, progress, error = job.status, job.progress or [], job.error
+        for entry in progress[sent:]:
+            yield json.dumps(entry, ensure_ascii=False) + "\n"
+        sent = len(progress)
+        if job_status in (jobs.JOB_DONE, jobs.JOB_FAILED):
+            yield json.dumps({"job_id": job_id, "status": job_status, "error": error}, ensure_ascii=False) + "\n"
+            return
+        await asyncio.sleep(OCR_PROGRESS_POLL)
+
+@app.post("/projects/{project_id}/ocr", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_heavy_processing)])
+def perform_project_ocr(
+    project_id: int,
+    category: str | None = None,
+    batch_size: int = Query(8, ge=1, le=256),
+    n_process: int = Query(1, ge=1),
+    db: Session = Depends(get_db)
+):
+    if crud.get_project(db, project_id=project_id) is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    # Zpracování běží v poolu úloh OCR, API jen posílá průběh (jeden dokument na řádek)
+    job = jobs.enqueue_batch_ocr_job(
+        db, project_id, category=category, batch_size=batch_size, n_process=min(n_process, jobs.OCR_WORKERS)
+    )
+    return StreamingResponse(_stream_batch_job(job.id), status_code=status.HTTP_202_ACCEPTED,
+                             media_type="application/x-ndjson")
+
+@app.get("/ocr_jobs/{job_id}", response_model=schemas.OcrJob)
+def read_ocr_job(job_id: int, db: Session = Depends(get_db)):
+    job = jobs.get_ocr_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="OCR job not found")
+    return job
+
+@app.get("/ocr_jobs/{job_id}/result")
+def read_ocr_job_result(job_id: int, db: Session = Depends(get_db)):
+    job = jobs.get_ocr_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="OCR job not found")
+    if job.status == jobs.JOB_FAILED:
+        raise HTTPException(status_code=409, detail=f"OCR job failed: {job.error}")
+    if job.status != jobs.JOB_DONE:
+        raise HTTPException(status_code=409, detail=f"OCR job is {job.status}")
+    return job.result
+
+@app.post("/documents/{document_id}/detect_anomaly", dependencies=[Depends(require_heavy_processing)])
+def detect_anomaly(document_id: int, db: Session = Depends(get_db)):
+    anomaly_result = crud.detect_anomaly_in_image(db, document_id, minio_client)
     return anomaly_result
 
-@app.get("/export/projects", response_class=StreamingResponse)
-def export_projects(db: Session = Depends(get_db)):
-    projects = crud.get_projects(db)
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["ID", "Název", "Popis", "Vlastník ID"])
-    for project in projects:
-        writer.writerow([project.id, project.name, project.description, project.owner_id])
-    output.seek(0)
-    return StreamingResponse(output, media_type="text/csv", headers={
-        "Content-Disposition": "attachment; filename=projects.csv"
+@app.post("/projects/{project_id}/detect_anomalies", dependencies=[Depends(require_heavy_processing)])
+def detect_project_anomalies(project_id: int, db: Session = Depends(get_db)):
+    if crud.get_project(db, project_id=project_id) is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return crud.detect_anomalies_in_project(db, project_id, minio_client)
+
+@app.get("/search", response_model=list[schemas.SearchResult])
+async def search_documents(
+    q: str = Query(..., min_length=2),
+    project_id: int | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Fulltextové vyhledávání ve vytěženém textu, entitách a klíčových slovech dokumentů"""
+    return await db.run_sync(search.search_documents, q, project_id=project_id, limit=limit)
+
+@app.get("/measurements", response_model=list[schemas.Measurement])
+async def read_measurements(
+    response: Response,
+    type: str | None = None,
+    min_value: float | None = Query(None, alias="min"),
+    max_value: float | None = Query(None, alias="max"),
+    unit: str | None = None,
+    project_id: int | None = None,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Měření v rozsahu hodnot z indexu, např. ?type=dimension&min=3&unit=m nebo ?min=2&unit=t&project_id=1.
+    Rozsah se zadává v jednotce `unit` (bez ní v jednotkách SI: m, kg, kg/m²).
+    """
+    try:
+        measure_type, min_si, max_si = measurements.resolve_range(type, unit, min_value, max_value)
+        rows = await db.run_sync(
+            crud.get_measurements, measure_type=measure_type, min_value=min_si, max_value=max_si,
+            project_id=project_id, skip=skip, limit=limit, cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if rows:
+        set_next_cursor(response, rows, limit, rows[-1].normalized_value, rows[-1].id)
+    return [
+        schemas.Measurement(
+            id=row.id, document_id=row.document_id, filename=row.document.filename if row.document else None,
+            project_id=row.project_id, type=row.type, value=row.value, unit=row.unit,
+            normalized_value=row.normalized_value, si_unit=row.si_unit,
+        )
+        for row in rows
+    ]
+
+@app.get("/events")
+async def stream_events(request: Request, project_id: int | None = None):
+    """
+    Server-Sent Events o změnách (projekty, dokumenty, progress logy, dokončené OCR úlohy),
+    s `project_id` jen pro jeden projekt. Data si klient dočte přes GET /changes.
+    """
+    subscription = events.broker.subscribe(project_id)
+
+    async def stream():
+        try:
+            # Po výpadku se prohlížeč znovu připojí za 3 s
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=events.EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield events.format_event(event)
+        finally:
+            events.broker.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        # nginx nesmí odpověď bufferovat
+        "X-Accel-Buffering": "no",
     })
 
+@app.get("/changes", response_model=schemas.Changes)
+async def read_changes(
+    since: str | None = None,
+    project_id: int | None = None,
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Projekty, dokumenty a progress logy změněné od kurzoru `since` a záznamy o smazaných řádcích.
+    Bez `since` vrací úplný stav; kurzor z odpovědi se pošle v dalším dotazu.
+    """
+    since_key = None
+    if since is not None:
+        try:
+            since_key = crud.decode_cursor(since)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if len(since_key) != 3 or not all(isinstance(value, int) for value in since_key):
+            raise HTTPException(status_code=400, detail="Invalid changes cursor")
+    result = await db.run_sync(changes.get_changes, since_key, project_id=project_id, limit=limit)
+    return {**result, "cursor": crud.encode_cursor(*result["cursor"])}
+
+EXPORT_FORMAT = Query("csv", regex="^(csv|xlsx)$")
+
+@app.get("/export/projects", response_class=StreamingResponse)
+def export_projects(
+    project_id: int | None = None,
+    format: str = EXPORT_FORMAT,
+    gzip: bool = False,
+    db: Session = Depends(get_db)
+):
+    query = db.query(
+        models.Project.id, models.Project.name, models.Project.description, models.Project.owner_id
+    ).order_by(models.Project.id)
+    if project_id is not None:
+        query = query.filter(models.Project.id == project_id)
+    return export.export_response("projects", ["ID", "Název", "Popis", "Vlastník ID"], query, format, gzip)
+
 @app.get("/export/documents", response_class=StreamingResponse)
-def export_documents(db: Session = Depends(get_db)):
-    documents = db.query(models.Document).all()
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["ID", "Název souboru", "Kategorie", "Projekt ID"])
-    for doc in documents:
-        writer.writerow([doc.id, doc.filename, doc.category, doc.project_id])
-    output.seek(0)
-    return StreamingResponse(output, media_type="text/csv", headers={
-        "Content-Disposition": "attachment; filename=documents.csv"
-    })
+def export_documents(
+    project_id: int | None = None,
+    format: str = EXPORT_FORMAT,
+    gzip: bool = False,
+    db: Session = Depends(get_db)
+):
+    query = db.query(
+        models.Document.id, models.Document.filename, models.Document.category, models.Document.project_id
+    ).order_by(models.Document.id)
+    if project_id is not None:
+        query = query.filter(models.Document.project_id == project_id)
+    return export.export_response("documents", ["ID", "Název souboru", "Kategorie", "Projekt ID"], query, format, gzip)
 
 @app.get("/export/progress_logs", response_class=StreamingResponse)
-def export_progress_logs(db: Session = Depends(get_db)):
-    progress_logs = db.query(models.ProgressLog).all()
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["ID", "Projekt ID", "Datum", "Procento dokončení", "Poznámky"])
-    for log in progress_logs:
-        writer.writerow([log.id, log.project_id, log.date, log.percentage_completed, log.notes])
-    output.seek(0)
-    return StreamingResponse(output, media_type="text/csv", headers={
-        "Content-Disposition": "attachment; filename=progress_logs.csv"
-    })
+def export_progress_logs(
+    project_id: int | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    format: str = EXPORT_FORMAT,
+    gzip: bool = False,
+    db: Session = Depends(get_db)
+):
+    query = db.query(
+        models.ProgressLog.id,
+        models.ProgressLog.project_id,
+        models.ProgressLog.date,
+        models.ProgressLog.percentage_completed,
+        models.ProgressLog.notes,
+    ).order_by(models.ProgressLog.id)
+    if project_id is not None:
+        query = query.filter(models.ProgressLog.project_id == project_id)
+    if date_from is not None:
+        query = query.filter(models.ProgressLog.date >= date_from)
+    if date_to is not None:
+        query = query.filter(models.ProgressLog.date <= date_to)
+    return export.export_response(
+        "progress_logs", ["ID", "Projekt ID", "Datum", "Procento dokončení", "Poznámky"], query, format, gzip
+    )
 
 @app.get("/projects/{project_id}/overall_progress/")
-def get_project_overall_progress(project_id: int, db: Session = Depends(get_db)):
-    overall_progress = crud.get_project_overall_progress(db, project_id=project_id)
-    return {"overall_progress": overall_progress}
+async def get_project_overall_progress(project_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def compute():
+        overall_progress = await db.run_sync(crud.get_project_overall_progress, project_id=project_id)
+        return {"overall_progress": overall_progress}, {}
+
+    return await cached_response(request, "overall_progress", [f"project:{project_id}"], {"id": project_id}, compute)
 
 @app.get("/dashboard_stats/")
-def get_dashboard_stats(db: Session = Depends(get_db)):
-    total_projects = crud.get_total_projects_count(db)
-    completed_projects = crud.get_completed_projects_count(db)
-    average_overall_progress = crud.get_average_overall_progress(db)
-    return {
-        "total_projects": total_projects,
-        "completed_projects": completed_projects,
-        "active_projects": total_projects - completed_projects,
-        "average_overall_progress": average_overall_progress
-    }
+async def get_dashboard_stats(request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def compute():
+        stats = await db.run_sync(crud.get_progress_aggregates)
+        return {
+            "total_projects": stats["total_projects"],
+            "completed_projects": stats["completed_projects"],
+            "active_projects": stats["total_projects"] - stats["completed_projects"],
+            "average_overall_progress": stats["average_overall_progress"]
+        }, {}
+
+    return await cached_response(request, "dashboard_stats", ["projects"], {}, compute)
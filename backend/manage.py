@@ -0,0 +1,47 @@
+"""Správcovské příkazy backendu. Spuštění: python -m backend.manage <příkaz>"""
+import argparse
+from . import models, crud, migrations, search, measurements
+
+def rebuild_progress_rollups():
+    db = models.SessionLocal()
+    try:
+        count = crud.rebuild_progress_rollups(db)
+    finally:
+        db.close()
+    print(f"Přepočítáno souhrnů postupu: {count}")
+
+def rebuild_search_index():
+    db = models.SessionLocal()
+    try:
+        count = search.rebuild_search_index(db)
+    finally:
+        db.close()
+    print(f"Zaindexováno dokumentů: {count}")
+
+def rebuild_measurement_index():
+    db = models.SessionLocal()
+    try:
+        count = measurements.rebuild_measurement_index(db)
+    finally:
+        db.close()
+    print(f"Zaindexována měření z dokumentů: {count}")
+
+def migrate():
+    applied = migrations.migrate()
+    print(f"Aplikováno migrací: {len(applied)}")
+
+COMMANDS = {
+    "migrate": migrate,
+    "rebuild-progress-rollups": rebuild_progress_rollups,
+    "rebuild-measurement-index": rebuild_measurement_index,
+    "rebuild-search-index": rebuild_search_index,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Správcovské příkazy aplikace Ranger")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args(argv)
+    COMMANDS[args.command]()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Normalizované hodnoty měření vytěžené z dokumentů (rozměry, hmotnosti, zatížení).
+
+Hodnoty se převádějí na jednotky SI, aby šly porovnávat napříč mm/cm/m nebo kg/t,
+a ukládají se do tabulky measurements s indexy podle (type, normalized_value) a projektu.
+Dotazy typu "nosníky delší než 3 m v projektu X" pak odpovídá index (crud.get_measurements).
+"""
+from typing import Any, Dict, Iterable, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from . import models
+
+# jednotka -> (typ, jednotka SI, násobek pro převod na SI)
+MEASUREMENT_UNITS = {
+    'mm': ('dimension', 'm', 0.001),
+    'cm': ('dimension', 'm', 0.01),
+    'm': ('dimension', 'm', 1.0),
+    'kg': ('weight', 'kg', 1.0),
+    't': ('weight', 'kg', 1000.0),
+    'kg/m²': ('load_capacity', 'kg/m²', 1.0),
+    'kg/m2': ('load_capacity', 'kg/m²', 1.0),
+    't/m²': ('load_capacity', 'kg/m²', 1000.0),
+    't/m2': ('load_capacity', 'kg/m²', 1000.0),
+}
+
+def normalize_measurement(value: float, unit: str) -> Optional[Dict[str, Any]]:
+    """Měření s typem podle jednotky a hodnotou v jednotkách SI, None pro neznámou jednotku"""
+    if unit not in MEASUREMENT_UNITS:
+        return None
+    measure_type, si_unit, factor = MEASUREMENT_UNITS[unit]
+    return {
+        'type': measure_type,
+        'value': value,
+        'unit': unit,
+        'normalized_value': value * factor,
+        'si_unit': si_unit,
+    }
+
+def resolve_range(measure_type: Optional[str], unit: Optional[str], min_value: Optional[float],
+                  max_value: Optional[float]) -> Tuple[Optional[str], Optional[float], Optional[float]]:
+    """
+    Převede rozsah z dotazu (např. min=2, unit=t) na jednotky SI a doplní typ podle jednotky.
+    Bez jednotky se hodnoty berou jako SI. ValueError pro neznámou nebo nesouhlasnou jednotku.
+    """
+    if unit is None:
+        return measure_type, min_value, max_value
+    if unit not in MEASUREMENT_UNITS:
+        raise ValueError(f"Unknown unit: {unit}")
+    unit_type, _, factor = MEASUREMENT_UNITS[unit]
+    if measure_type is not None and measure_type != unit_type:
+        raise ValueError(f"Unit {unit} does not match measurement type {measure_type}")
+    return (
+        unit_type,
+        min_value * factor if min_value is not None else None,
+        max_value * factor if max_value is not None else None,
+    )
+
+def index_measurements(db: Session, document_id: int, measurements: Iterable[Dict[str, Any]]):
+    """Nahradí uložená měření dokumentu (commit provádí volající)"""
+    db.query(models.Measurement).filter(models.Measurement.document_id == document_id).delete(synchronize_session=False)
+    project_id = db.query(models.Document.project_id).filter(models.Document.id == document_id).scalar()
+    rows = {}
+    for measurement in measurements:
+        # Typ a SI hodnota se odvozují z jednotky i u výsledků uložených starší verzí extrakce
+        normalized = normalize_measurement(measurement['value'], measurement['unit'])
+        if normalized is None:
+            continue
+        # Opakovaná stejná hodnota v dokumentu (např. kóta na každé stránce) se ukládá jednou
+        rows.setdefault((normalized['type'], normalized['normalized_value']), normalized)
+    if rows:
+        db.execute(insert(models.Measurement), [
+            {**row, 'document_id': document_id, 'project_id': project_id} for row in rows.values()
+        ])
+
+def rebuild_measurement_index(db: Session, batch_size: int = 500) -> int:
+    """Naplní index měření z uložených výsledků OCR"""
+    count = 0
+    for result in db.query(models.OcrResult).yield_per(batch_size):
+        index_measurements(db, result.document_id, (result.extracted_data or {}).get('measurements') or [])
+        count += 1
+    db.commit()
+    return count
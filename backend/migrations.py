@@ -0,0 +1,178 @@
+"""
+Verzované migrace schématu databáze (Alembic v projektu není).
+
+Nové databáze vytváří Base.metadata.create_all v models.py rovnou v aktuální podobě,
+existující databáze se dorovnají příkazem `python -m backend.manage migrate`.
+Každá migrace je idempotentní (nejdřív zkontroluje skutečný stav schématu),
+takže na čerstvé databázi jen zapíše svou verzi do tabulky schema_migrations.
+"""
+from datetime import date, datetime
+from typing import List
+from sqlalchemy import BigInteger, Column, Date, DateTime, Index, Integer, JSON, MetaData, String, Table, inspect, select, text
+from . import models
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", String, primary_key=True),
+    Column("applied_at", DateTime),
+)
+
+# Formáty, ve kterých klienti historicky posílali datum progress logu
+LEGACY_DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%d. %m. %Y')
+
+def _parse_legacy_date(value: str):
+    value = value.strip()
+    for date_format in LEGACY_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    try:
+        # ISO datum s časem, např. z Date.toISOString()
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+def _column_type(conn, table: str, column: str):
+    for info in inspect(conn).get_columns(table):
+        if info["name"] == column:
+            return info["type"]
+    return None
+
+def _convert_to_date(conn, table: str, column: str):
+    """
+    Převod textového sloupce na DATE: nový sloupec, backfill po distinct hodnotách
+    (parsování v Pythonu, neplatné hodnoty zůstanou NULL) a výměna sloupců.
+    """
+    column_type = _column_type(conn, table, column)
+    if column_type is None or isinstance(column_type, Date):
+        return
+    quote = conn.dialect.identifier_preparer.quote
+    table_q, column_q, new_q = quote(table), quote(column), quote(f"{column}_new")
+    conn.execute(text(f"ALTER TABLE {table_q} ADD COLUMN {new_q} DATE"))
+    values = conn.execute(text(f"SELECT DISTINCT {column_q} FROM {table_q} WHERE {column_q} IS NOT NULL")).scalars().all()
+    for value in values:
+        parsed = _parse_legacy_date(value)
+        if parsed is None:
+            print(f"{table}.{column}: neplatné datum '{value}' bude NULL")
+            continue
+        conn.execute(
+            text(f"UPDATE {table_q} SET {new_q} = :parsed WHERE {column_q} = :value"),
+            {"parsed": parsed, "value": value},
+        )
+    conn.execute(text(f"ALTER TABLE {table_q} DROP COLUMN {column_q}"))
+    conn.execute(text(f"ALTER TABLE {table_q} RENAME COLUMN {new_q} TO {column_q}"))
+
+def _add_column(conn, column: Column):
+    if _column_type(conn, column.table.name, column.name) is not None:
+        return
+    quote = conn.dialect.identifier_preparer.quote
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {quote(column.table.name)} ADD COLUMN {quote(column.name)} {column_type}"))
+
+def _progress_log_dates(conn):
+    _convert_to_date(conn, "progress_logs", "date")
+    _convert_to_date(conn, "project_progress", "last_date")
+
+def _table(name: str, *columns: Column) -> Table:
+    """
+    Zmrazená podoba tabulky pro jednu migraci (jen sloupce, se kterými migrace pracuje).
+    Migrace nesmí používat tabulky aktuálních modelů: jejich sloupce, výchozí hodnoty
+    a onupdate (např. updated_at) v době migrace ještě nemusí v databázi existovat.
+    """
+    return Table(name, MetaData(), *columns)
+
+def _composite_indexes(conn):
+    # Indexy se zakládají až po převodu sloupce date (SQLite neumí smazat indexovaný sloupec)
+    progress_logs = _table("progress_logs", Column("project_id", Integer), Column("date", Date))
+    documents = _table("documents", Column("project_id", Integer), Column("category", String))
+    Index("ix_progress_logs_project_id_date", progress_logs.c.project_id, progress_logs.c.date).create(bind=conn, checkfirst=True)
+    Index("ix_documents_project_id_category", documents.c.project_id, documents.c.category).create(bind=conn, checkfirst=True)
+
+def _document_content_keys(conn):
+    documents = _table(
+        "documents",
+        Column("filename", String),
+        Column("object_name", String, index=True),
+        Column("content_hash", String(64), index=True),
+        Column("size", BigInteger),
+        Column("content_type", String),
+    )
+    for name in ("object_name", "content_hash", "size", "content_type"):
+        _add_column(conn, documents.c[name])
+    # Starší objekty jsou v úložišti uložené pod původním názvem souboru
+    conn.execute(
+        documents.update().where(documents.c.object_name.is_(None)).values(object_name=documents.c.filename)
+    )
+    for index in documents.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+def _idempotency_keys(conn):
+    for name in ("progress_logs", "documents"):
+        table = _table(name, Column("idempotency_key", String))
+        if _column_type(conn, name, "idempotency_key") is not None:
+            continue
+        _add_column(conn, table.c.idempotency_key)
+        # SQLite neumí přidat sloupec s UNIQUE, unikátnost zajistí index
+        Index(f"uq_{name}_idempotency_key", table.c.idempotency_key, unique=True).create(bind=conn)
+
+def _change_versions(conn):
+    # Tabulky change_counter a tombstones založí create_all, tady se dorovnají existující tabulky
+    for name in ("projects", "documents", "progress_logs"):
+        table = _table(name, Column("id", Integer), Column("version", BigInteger), Column("updated_at", DateTime))
+        _add_column(conn, table.c.version)
+        _add_column(conn, table.c.updated_at)
+        # Dosavadní řádky mají verzi 0, klient je dostane při první (úplné) synchronizaci
+        conn.execute(table.update().where(table.c.version.is_(None)).values(version=0))
+        conn.execute(table.update().where(table.c.updated_at.is_(None)).values(updated_at=datetime.utcnow()))
+        Index(f"ix_{name}_version_id", table.c.version, table.c.id).create(bind=conn, checkfirst=True)
+
+def _project_progress_rows(conn):
+    # Souhrn postupu se dřív zakládal až s prvním logem projektu; teď ho zápisy logů jen zamykají.
+    # Chybějící souhrny se spočítají z existujících logů (projekt bez logů dostane nulový)
+    conn.execute(text(
+        "INSERT INTO project_progress (project_id, progress_sum, progress_count, max_percentage, last_date) "
+        "SELECT projects.id, COALESCE(SUM(progress_logs.percentage_completed), 0), "
+        "COUNT(progress_logs.percentage_completed), MAX(progress_logs.percentage_completed), MAX(progress_logs.date) "
+        "FROM projects LEFT JOIN progress_logs ON progress_logs.project_id = projects.id "
+        "WHERE projects.id NOT IN (SELECT project_id FROM project_progress) "
+        "GROUP BY projects.id"
+    ))
+
+def _ocr_job_heartbeats(conn):
+    _add_column(conn, _table("ocr_jobs", Column("heartbeat_at", DateTime)).c.heartbeat_at)
+
+def _batch_ocr_jobs(conn):
+    ocr_jobs = _table("ocr_jobs", Column("project_id", Integer), Column("params", JSON), Column("progress", JSON))
+    for name in ("project_id", "params", "progress"):
+        _add_column(conn, ocr_jobs.c[name])
+    Index("ix_ocr_jobs_project_id", ocr_jobs.c.project_id).create(bind=conn, checkfirst=True)
+
+# (verze, popis, funkce) v pořadí, v jakém se mají aplikovat
+MIGRATIONS = [
+    ("0001", "progress_logs.date a project_progress.last_date jako DATE", _progress_log_dates),
+    ("0002", "složené indexy (project_id, date) a (project_id, category)", _composite_indexes),
+    ("0003", "obsahově adresované objekty dokumentů (object_name, content_hash, size)", _document_content_keys),
+    ("0004", "idempotency_key pro offline synchronizaci (progress_logs, documents)", _idempotency_keys),
+    ("0005", "verze změn pro GET /changes (projects, documents, progress_logs)", _change_versions),
+    ("0006", "řádek project_progress pro každý projekt", _project_progress_rows),
+    ("0007", "ocr_jobs.heartbeat_at pro obnovu opuštěných úloh", _ocr_job_heartbeats),
+    ("0008", "dávkové úlohy OCR nad projektem (ocr_jobs.project_id, params, progress)", _batch_ocr_jobs),
+]
+
+def migrate(engine=None) -> List[str]:
+    """Aplikuje chybějící migrace, každou v samostatné transakci. Vrací seznam aplikovaných verzí."""
+    engine = engine or models.engine
+    schema_migrations.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        done = set(conn.execute(select(schema_migrations.c.version)).scalars().all())
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            upgrade(conn)
+            conn.execute(schema_migrations.insert().values(version=version, applied_at=datetime.utcnow()))
+        print(f"Migrace {version}: {description}")
+        applied.append(version)
+    return applied
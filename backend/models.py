@@ -1,8 +1,26 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey
+from sqlalchemy import create_engine, event, DDL, Column, Integer, BigInteger, Float, String, Text, ForeignKey, Date, DateTime, JSON, UniqueConstraint, Index
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from datetime import datetime
+import os
+from . import dbpool
 
-DATABASE_URL = "postgresql://user:password@db/ranger_db"
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user:password@db/ranger_db")
+
+# Asynchronní ovladače pro stejnou databázi (asyncpg pro Postgres, aiosqlite pro lokální SQLite)
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def _async_database_url(url: str) -> str:
+    scheme, separator, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{separator}{rest}"
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_database_url(DATABASE_URL)
 
 Base = declarative_base()
 
@@ -16,35 +34,197 @@ class User(Base):
 
 class Project(Base):
     __tablename__ = 'projects'
+    __table_args__ = (Index('ix_projects_version_id', 'version', 'id'),)
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     description = Column(String)
     owner_id = Column(Integer, ForeignKey('users.id'))
+    # Verze poslední změny z change_counter (přiděluje changes.py), podle ní čte GET /changes
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     owner = relationship("User")
     documents = relationship("Document", back_populates="project")
     progress_logs = relationship("ProgressLog", back_populates="project")
+    progress_rollup = relationship("ProjectProgress", uselist=False, back_populates="project", cascade="all, delete-orphan")
 
 class Document(Base):
     __tablename__ = 'documents'
+    __table_args__ = (
+        Index('ix_documents_project_id_category', 'project_id', 'category'),
+        Index('ix_documents_version_id', 'version', 'id'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, index=True)
     category = Column(String, nullable=True) # New field for category
+    # Klíč objektu v úložišti (obsahově adresovaný, viz storage.content_key)
+    object_name = Column(String, index=True)
+    content_hash = Column(String(64), nullable=True, index=True)
+    size = Column(BigInteger, nullable=True)
+    content_type = Column(String, nullable=True)
+    # Klíč generovaný klientem při offline synchronizaci, opakované odeslání nevytvoří duplikát
+    idempotency_key = Column(String, unique=True, nullable=True)
     project_id = Column(Integer, ForeignKey('projects.id'))
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     project = relationship("Project")
 
 class ProgressLog(Base):
     __tablename__ = 'progress_logs'
+    __table_args__ = (
+        Index('ix_progress_logs_project_id_date', 'project_id', 'date'),
+        Index('ix_progress_logs_version_id', 'version', 'id'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey('projects.id'))
-    date = Column(String) # For simplicity, store as string for now
+    date = Column(Date)
     percentage_completed = Column(Integer)
+    idempotency_key = Column(String, unique=True, nullable=True)
     notes = Column(String)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     project = relationship("Project")
 
-engine = create_engine(DATABASE_URL)
+class ProjectProgress(Base):
+    # Materializovaný souhrn progress logů projektu, udržovaný v crud při každém zápisu logu
+    __tablename__ = 'project_progress'
+    project_id = Column(Integer, ForeignKey('projects.id'), primary_key=True)
+    progress_sum = Column(Integer, nullable=False, default=0)
+    progress_count = Column(Integer, nullable=False, default=0)
+    max_percentage = Column(Integer, nullable=True, index=True)
+    last_date = Column(Date, nullable=True)
+
+    project = relationship("Project", back_populates="progress_rollup")
+
+class OcrJob(Base):
+    __tablename__ = 'ocr_jobs'
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey('documents.id'), index=True)
+    # Dávková úloha nad dokumenty projektu (document_id je pak NULL), parametry v params
+    project_id = Column(Integer, ForeignKey('projects.id'), nullable=True, index=True)
+    params = Column(JSON, nullable=True)
+    # Průběh dávkové úlohy: souhrn každého zpracovaného dokumentu
+    progress = Column(JSON, nullable=True)
+    status = Column(String, index=True, default="queued") # queued / running / done / failed
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    # Zpracovávající proces ho průběžně obnovuje, zastaralý heartbeat znamená opuštěnou úlohu
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    document = relationship("Document")
+
+class OcrResult(Base):
+    # Cache výsledků OCR/extrakce podle obsahu objektu (ETag) a verze extrakce
+    __tablename__ = 'ocr_results'
+    __table_args__ = (UniqueConstraint('document_id', 'content_hash', 'extractor_version'),)
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey('documents.id'), index=True)
+    content_hash = Column(String, nullable=False)
+    extractor_version = Column(String, nullable=False)
+    ocr_text = Column(Text)
+    extracted_data = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class DocumentText(Base):
+    """Vytěžený text dokumentu pro fulltextové vyhledávání (viz search.py)"""
+    __tablename__ = 'document_texts'
+    document_id = Column(Integer, ForeignKey('documents.id'), primary_key=True)
+    text = Column(Text)
+    entities = Column(Text)
+    keywords = Column(Text)
+    # Postgres: vážený tsvector s GIN indexem; SQLite místo něj používá FTS5 tabulku document_texts_fts
+    search_vector = Column(TSVECTOR().with_variant(Text, "sqlite"))
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    document = relationship("Document")
+
+class Measurement(Base):
+    """Měření vytěžené z dokumentu, normalized_value je v jednotce SI (viz measurements.py)"""
+    __tablename__ = 'measurements'
+    __table_args__ = (
+        Index('ix_measurements_type_normalized_value', 'type', 'normalized_value'),
+        Index('ix_measurements_project_id_type_normalized_value', 'project_id', 'type', 'normalized_value'),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey('documents.id'), index=True)
+    # Kopie documents.project_id, aby dotaz v rámci projektu stačil jeden index
+    project_id = Column(Integer, ForeignKey('projects.id'), nullable=True)
+    type = Column(String, nullable=False)
+    value = Column(Float, nullable=False)
+    unit = Column(String, nullable=False)
+    normalized_value = Column(Float, nullable=False)
+    si_unit = Column(String, nullable=False)
+
+    document = relationship("Document")
+
+class ChangeCounter(Base):
+    # Jediný řádek s poslední přidělenou verzí změn; zámek řádku řadí verze podle pořadí commitů
+    __tablename__ = 'change_counter'
+    id = Column(Integer, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+class Tombstone(Base):
+    """Záznam o smazaném řádku pro GET /changes (klient podle něj odstraní lokální kopii)"""
+    __tablename__ = 'tombstones'
+    __table_args__ = (Index('ix_tombstones_version_id', 'version', 'id'),)
+    id = Column(Integer, primary_key=True)
+    # project / document / progress_log
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    project_id = Column(Integer, nullable=True)
+    version = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+event.listen(ChangeCounter.__table__, "after_create", DDL("INSERT INTO change_counter (id, value) VALUES (1, 0)"))
+
+# Fulltextové indexy, které create_all neumí popsat modelem
+event.listen(DocumentText.__table__, "after_create", DDL(
+    "CREATE INDEX ix_document_texts_search_vector ON document_texts USING gin (search_vector)"
+).execute_if(dialect="postgresql"))
+for statement in (
+    # FTS5 s externím obsahem: text se neukládá dvakrát, index udržují triggery
+    "CREATE VIRTUAL TABLE document_texts_fts USING fts5("
+    "text, entities, keywords, content='document_texts', content_rowid='document_id')",
+    "CREATE TRIGGER document_texts_ai AFTER INSERT ON document_texts BEGIN "
+    "INSERT INTO document_texts_fts(rowid, text, entities, keywords) "
+    "VALUES (new.document_id, new.text, new.entities, new.keywords); END",
+    "CREATE TRIGGER document_texts_ad AFTER DELETE ON document_texts BEGIN "
+    "INSERT INTO document_texts_fts(document_texts_fts, rowid, text, entities, keywords) "
+    "VALUES ('delete', old.document_id, old.text, old.entities, old.keywords); END",
+    "CREATE TRIGGER document_texts_au AFTER UPDATE ON document_texts BEGIN "
+    "INSERT INTO document_texts_fts(document_texts_fts, rowid, text, entities, keywords) "
+    "VALUES ('delete', old.document_id, old.text, old.entities, old.keywords); "
+    "INSERT INTO document_texts_fts(rowid, text, entities, keywords) "
+    "VALUES (new.document_id, new.text, new.entities, new.keywords); END",
+):
+    event.listen(DocumentText.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+# SQLite (lokální vývoj a testy) sdílí spojení mezi vlákny threadpoolu FastAPI
+connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(DATABASE_URL, connect_args=connect_args, **dbpool.engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Asynchronní engine se vytvoří až při prvním použití, ovladač (asyncpg) potřebují jen async endpointy
+async_engine = None
+_async_session_factory = None
+
+def AsyncSessionLocal() -> AsyncSession:
+    global async_engine, _async_session_factory
+    if _async_session_factory is None:
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, **dbpool.engine_options(ASYNC_DATABASE_URL, asynchronous=True))
+        # Bez expirace po commitu: objekty se serializují až po skončení handleru (bez lazy loadu)
+        _async_session_factory = sessionmaker(
+            async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+    return _async_session_factory()
+
+async def dispose_async_engine():
+    if async_engine is not None:
+        await async_engine.dispose()
+
 Base.metadata.create_all(bind=engine)
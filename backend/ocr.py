@@ -0,0 +1,40 @@
+"""
+OCR naskenovaných dokumentů. Stránky PDF bez textové vrstvy se rastrují (pdf2image/poppler)
+a rozpoznávají tesseractem paralelně po stránkách. Rastrování i tesseract běží jako
+externí procesy, takže k využití všech jader stačí pool vláken.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+
+OCR_LANG = "ces"
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+# Počet pracovních procesů úloh OCR (výchozí = počet jader), viz jobs.py
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+# Počet stránek rozpoznávaných současně v jednom procesu úloh. Výchozí hodnota dělí jádra
+# mezi procesy OCR_WORKERS, aby souběžné úlohy dohromady nespouštěly víc tesseractů než jader
+OCR_PAGE_WORKERS = int(os.getenv("OCR_PAGE_WORKERS", max(1, (os.cpu_count() or 1) // OCR_WORKERS)))
+
+# Každý proces tesseractu jednovláknově, paralelizuje se po stránkách
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+def ocr_image(image) -> str:
+    import pytesseract
+    return pytesseract.image_to_string(image, lang=OCR_LANG)
+
+def ocr_pdf_page(path: str, page_number: int) -> Dict[str, Any]:
+    """Rastruje jednu stránku PDF (číslováno od 1) a rozpozná její text"""
+    from pdf2image import convert_from_path
+    started = time.perf_counter()
+    images = convert_from_path(path, dpi=OCR_DPI, first_page=page_number, last_page=page_number)
+    text = ocr_image(images[0]) if images else ""
+    return {
+        "page": page_number,
+        "text": text,
+        "source": "ocr",
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+def page_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=OCR_PAGE_WORKERS, thread_name_prefix="ocr-page")
@@ -1,6 +1,7 @@
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, constr
 from typing import Optional
+from datetime import datetime, date as date_type
 
 # --- Uživatelská autentizace ---
 class UserBase(BaseModel):
@@ -26,6 +27,26 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    user_id: Optional[int] = None
+    role: Optional[str] = None
+
+class CurrentUser(BaseModel):
+    # Přihlášený uživatel bez vazby na databázovou session (drží se v cache)
+    id: int
+    username: str
+    role: Optional[str] = "user"
+
+    class Config:
+        orm_mode = True
+
+class UploadedDocument(BaseModel):
+    id: int
+    filename: str
+    category: str | None = None
+    content_hash: str
+    size: int
+    # Stejný obsah už v úložišti byl, nic se nenahrávalo
+    deduplicated: bool
 
 class DocumentBase(BaseModel):
     filename: str
@@ -34,6 +55,30 @@ class DocumentBase(BaseModel):
 class Document(DocumentBase):
     id: int
     project_id: int
+    content_hash: str | None = None
+    size: int | None = None
+    version: int | None = None
+    updated_at: datetime | None = None
+
+    class Config:
+        orm_mode = True
+
+class ProgressLogBase(BaseModel):
+    date: date_type
+    percentage_completed: int
+    notes: str | None = None
+
+class ProgressLogCreate(ProgressLogBase):
+    pass
+
+class ProgressLog(ProgressLogBase):
+    id: int
+    # Neplatná data ze starších verzí migrace převedla na NULL, vrací se jako null
+    date: date_type | None = None
+    # Po smazání projektu zůstávají jeho logy bez projektu, dál je lze upravit i smazat
+    project_id: int | None = None
+    version: int | None = None
+    updated_at: datetime | None = None
 
     class Config:
         orm_mode = True
@@ -54,17 +99,124 @@ class Project(ProjectBase):
     class Config:
         orm_mode = True
 
-class ProgressLogBase(BaseModel):
-    date: str
-    percentage_completed: int
-    notes: str | None = None
+class ProjectSummary(ProjectBase):
+    # Odlehčená položka seznamu projektů, souhrny se počítají v SQL
+    id: int
+    owner_id: int | None = None
+    document_count: int
+    progress_log_count: int
+    overall_progress: float
+    latest_percentage: int | None = None
+    last_progress_date: date_type | None = None
+
+class OcrJob(BaseModel):
+    id: int
+    document_id: int | None = None
+    # Dávková úloha nad projektem: project_id a průběh po dokumentech
+    project_id: int | None = None
+    progress: list[dict] | None = None
+    status: str
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
 
-class ProgressLogCreate(ProgressLogBase):
-    pass
+    class Config:
+        orm_mode = True
 
-class ProgressLog(ProgressLogBase):
+class SearchResult(BaseModel):
+    document_id: int
+    filename: str
+    project_id: int | None = None
+    rank: float
+    # Úryvek textu, shody jsou obalené <b></b>
+    snippet: str | None = None
+
+class Measurement(BaseModel):
     id: int
+    document_id: int
+    filename: str | None = None
+    project_id: int | None = None
+    type: str
+    value: float
+    unit: str
+    # Hodnota v jednotce SI (m, kg, kg/m²)
+    normalized_value: float
+    si_unit: str
+
+# --- Offline synchronizace z mobilní aplikace ---
+# Nejvýše položek jednoho typu v dávce (jeden vícehodnotový INSERT na tabulku)
+SYNC_MAX_ITEMS = 500
+
+class SyncProgressLog(ProgressLogBase):
+    # Klíč generovaný klientem, opakované odeslání stejné položky nevytvoří duplikát
+    idempotency_key: constr(min_length=1, max_length=128)
     project_id: int
 
+class SyncPhoto(BaseModel):
+    idempotency_key: constr(min_length=1, max_length=128)
+    project_id: int
+    # SHA-256 obsahu nahraného přes POST /sync/objects
+    content_hash: constr(regex=r"^[0-9a-f]{64}$")
+    filename: str
+    category: str | None = "photo"
+    content_type: str | None = None
+
+class SyncBatch(BaseModel):
+    progress_logs: list[SyncProgressLog] = Field([], max_items=SYNC_MAX_ITEMS)
+    photos: list[SyncPhoto] = Field([], max_items=SYNC_MAX_ITEMS)
+
+class SyncItemResult(BaseModel):
+    idempotency_key: str
+    # created | duplicate | error
+    status: str
+    id: int | None = None
+    error: str | None = None
+
+class SyncBatchResult(BaseModel):
+    progress_logs: list[SyncItemResult]
+    photos: list[SyncItemResult]
+
+class SyncObject(BaseModel):
+    content_hash: str
+    size: int
+    deduplicated: bool
+
+# --- Feed změn (GET /changes) ---
+class ChangedProject(ProjectBase):
+    # Projekt bez vnořených dokumentů a logů, ty chodí ve feedu samostatně
+    id: int
+    owner_id: int | None = None
+    version: int
+    updated_at: datetime | None = None
+
+    class Config:
+        orm_mode = True
+
+class ChangedDocument(Document):
+    # Po smazání projektu zůstávají jeho dokumenty bez projektu
+    project_id: int | None = None
+
+class ChangedProgressLog(ProgressLog):
+    pass
+
+class DeletedRow(BaseModel):
+    # project / document / progress_log
+    entity: str
+    entity_id: int
+    project_id: int | None = None
+    version: int
+    deleted_at: datetime | None = None
+
     class Config:
         orm_mode = True
+
+class Changes(BaseModel):
+    projects: list[ChangedProject] = []
+    documents: list[ChangedDocument] = []
+    progress_logs: list[ChangedProgressLog] = []
+    deleted: list[DeletedRow] = []
+    # Kurzor pro další dotaz (?since=...), platí i když se nic nezměnilo
+    cursor: str
+    # Změn bylo víc než limit, další stránku vrátí dotaz s novým kurzorem
+    has_more: bool
@@ -0,0 +1,114 @@
+"""
+Fulltextové vyhledávání ve vytěženém textu dokumentů.
+
+Text, entity a klíčová slova se ukládají do tabulky document_texts při každém uložení
+výsledku OCR (crud.store_ocr_result). Postgres hledá přes vážený tsvector s GIN indexem,
+SQLite (vývoj a testy) přes FTS5. Dříve vytěžené dokumenty se zaindexují příkazem
+`python -m backend.manage rebuild-search-index`.
+"""
+import os
+import re
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func, literal_column, select, text as sql_text
+from sqlalchemy.orm import Session
+from . import models
+
+# Konfigurace textového vyhledávání Postgresu (pro češtinu není vestavěná, výchozí je bez stemmingu)
+SEARCH_TS_CONFIG = os.getenv("SEARCH_TS_CONFIG", "simple")
+SNIPPET_START = "<b>"
+SNIPPET_STOP = "</b>"
+SNIPPET_WORDS = 24
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+def _entity_texts(extracted_data: Dict[str, Any]) -> str:
+    entities = extracted_data.get("entities") or {}
+    return " ".join(entity["text"] for group in entities.values() for entity in group)
+
+def _weighted_vector(text: str, entities: str, keywords: str):
+    # Klíčová slova a entity mají při řazení vyšší váhu (A) než běžný text (B)
+    return func.setweight(
+        func.to_tsvector(SEARCH_TS_CONFIG, f"{keywords} {entities}"), literal_column("'A'")
+    ).op("||")(func.setweight(func.to_tsvector(SEARCH_TS_CONFIG, text), literal_column("'B'")))
+
+def index_document(db: Session, document_id: int, text: str, extracted_data: Dict[str, Any]):
+    """Uloží nebo přepíše vyhledávací záznam dokumentu (commit provádí volající)"""
+    entities = _entity_texts(extracted_data)
+    keywords = " ".join(extracted_data.get("keywords") or [])
+    db_text = db.get(models.DocumentText, document_id) or models.DocumentText(document_id=document_id)
+    db_text.text = text
+    db_text.entities = entities
+    db_text.keywords = keywords
+    if _is_postgres(db):
+        db_text.search_vector = _weighted_vector(text, entities, keywords)
+    db.add(db_text)
+
+def _fts5_query(query: str) -> str:
+    # Každé slovo v uvozovkách: vstup uživatele nemůže obsahovat operátory FTS5, slova se spojí přes AND
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", query))
+
+def _search_postgres(db: Session, query: str, project_id: Optional[int], limit: int):
+    ts_query = func.websearch_to_tsquery(SEARCH_TS_CONFIG, query)
+    rank = func.ts_rank_cd(models.DocumentText.search_vector, ts_query)
+    top = select(
+        models.DocumentText.document_id, models.DocumentText.text, rank.label("rank")
+    ).join(
+        models.Document, models.Document.id == models.DocumentText.document_id
+    ).where(models.DocumentText.search_vector.op("@@")(ts_query))
+    if project_id is not None:
+        top = top.where(models.Document.project_id == project_id)
+    top = top.order_by(rank.desc()).limit(limit).subquery()
+    # Úryvky se počítají jen pro vrácenou stránku výsledků
+    snippet = func.ts_headline(
+        SEARCH_TS_CONFIG, top.c.text, ts_query,
+        f"StartSel={SNIPPET_START}, StopSel={SNIPPET_STOP}, MaxWords={SNIPPET_WORDS}, MinWords=5, MaxFragments=2",
+    )
+    return db.execute(
+        select(top.c.document_id, models.Document.filename, models.Document.project_id,
+               top.c.rank, snippet.label("snippet"))
+        .join(models.Document, models.Document.id == top.c.document_id)
+        .order_by(top.c.rank.desc())
+    ).all()
+
+def _search_sqlite(db: Session, query: str, project_id: Optional[int], limit: int):
+    match = _fts5_query(query)
+    if not match:
+        return []
+    # bm25 je tím menší, čím lepší shoda; váhy sloupců text, entities, keywords
+    return db.execute(sql_text(
+        "SELECT d.id AS document_id, d.filename, d.project_id, "
+        "-bm25(document_texts_fts, 1.0, 4.0, 4.0) AS rank, "
+        "snippet(document_texts_fts, 0, :start, :stop, '…', :words) AS snippet "
+        "FROM document_texts_fts JOIN documents d ON d.id = document_texts_fts.rowid "
+        "WHERE document_texts_fts MATCH :match AND (:project_id IS NULL OR d.project_id = :project_id) "
+        "ORDER BY rank DESC LIMIT :limit"
+    ), {
+        "start": SNIPPET_START, "stop": SNIPPET_STOP, "words": SNIPPET_WORDS,
+        "match": match, "project_id": project_id, "limit": limit,
+    }).all()
+
+def search_documents(db: Session, query: str, project_id: Optional[int] = None, limit: int = 20) -> List[Dict[str, Any]]:
+    """Dokumenty seřazené podle relevance, s úryvkem textu se zvýrazněnými shodami"""
+    search = _search_postgres if _is_postgres(db) else _search_sqlite
+    return [
+        {
+            "document_id": row.document_id,
+            "filename": row.filename,
+            "project_id": row.project_id,
+            "rank": float(row.rank),
+            "snippet": row.snippet,
+        }
+        for row in search(db, query, project_id, limit)
+    ]
+
+def rebuild_search_index(db: Session, batch_size: int = 500) -> int:
+    """Zaindexuje všechny uložené výsledky OCR (např. vytěžené před zavedením vyhledávání)"""
+    count = 0
+    for result in db.query(models.OcrResult).yield_per(batch_size):
+        index_document(db, result.document_id, result.ocr_text or "", result.extracted_data or {})
+        count += 1
+        if count % batch_size == 0:
+            db.flush()
+    db.commit()
+    return count
@@ -0,0 +1,239 @@
+"""
+Připojení k objektovému úložišti MinIO.
+
+Nahrané soubory se ukládají pod klíčem odvozeným z SHA-256 obsahu (viz store_content),
+takže stejné soubory se stejným názvem si nepřepisují obsah a duplicitní obsah se ukládá jednou.
+
+Pro vývoj a testy bez MinIO lze nastavit STORAGE_BACKEND=local, objekty se pak
+ukládají do adresáře LOCAL_STORAGE_DIR přes LocalObjectStore se stejným API.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+from minio import Minio
+from minio.error import S3Error
+
+BUCKET_NAME = "ranger-bucket"
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "minio")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "/tmp/ranger-storage")
+# Adresa MinIO dostupná klientům (pro presigned URL); bez ní se přesměrování nepoužívá
+MINIO_PUBLIC_URL = os.getenv("MINIO_PUBLIC_URL")
+
+# Velikost a počet souběžně nahrávaných částí multipart uploadu (MinIO vyžaduje části aspoň 5 MiB)
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", str(10 * 1024 * 1024)))
+UPLOAD_PARALLEL_PARTS = int(os.getenv("UPLOAD_PARALLEL_PARTS", "4"))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Buckety, o kterých už víme, že existují (ověřuje se jednou za běh procesu)
+_known_buckets = set()
+_bucket_lock = threading.Lock()
+
+def create_minio_client():
+    if STORAGE_BACKEND == "local":
+        return LocalObjectStore(LOCAL_STORAGE_DIR)
+    return Minio(
+        os.getenv("MINIO_URL"),
+        access_key=os.getenv("MINIO_ACCESS_KEY"),
+        secret_key=os.getenv("MINIO_SECRET_KEY"),
+        secure=False
+    )
+
+def create_presign_client() -> Optional[Minio]:
+    """Klient pro podepisování URL veřejnou adresou MinIO, např. http://localhost:9000"""
+    if STORAGE_BACKEND == "local" or not MINIO_PUBLIC_URL:
+        return None
+    public_url = urlparse(MINIO_PUBLIC_URL)
+    return Minio(
+        public_url.netloc,
+        access_key=os.getenv("MINIO_ACCESS_KEY"),
+        secret_key=os.getenv("MINIO_SECRET_KEY"),
+        secure=public_url.scheme == "https",
+        # Se zadaným regionem se podpis spočítá bez dotazu na server
+        region="us-east-1",
+    )
+
+def is_not_found(error: Exception) -> bool:
+    return isinstance(error, S3Error) and error.code in ("NoSuchKey", "NoSuchBucket")
+
+def ensure_bucket(client, bucket_name: str = BUCKET_NAME):
+    """Založí bucket, pokud neexistuje; dotaz na MinIO proběhne jen poprvé"""
+    if bucket_name in _known_buckets:
+        return
+    with _bucket_lock:
+        if bucket_name in _known_buckets:
+            return
+        if not client.bucket_exists(bucket_name):
+            client.make_bucket(bucket_name)
+        _known_buckets.add(bucket_name)
+
+# --- Obsahově adresované ukládání ---
+def content_key(content_hash: str) -> str:
+    """Klíč objektu odvozený z SHA-256 obsahu, stejný obsah = stejný objekt"""
+    return f"sha256/{content_hash[:2]}/{content_hash}"
+
+def hash_file(file) -> Tuple[str, int]:
+    """SHA-256 a velikost souboru, čte se po blocích od začátku; soubor zůstane na začátku"""
+    digest = hashlib.sha256()
+    size = 0
+    file.seek(0)
+    while chunk := file.read(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return digest.hexdigest(), size
+
+def object_size(client, object_name: str, bucket_name: str = BUCKET_NAME) -> Optional[int]:
+    """Velikost objektu v bajtech, None pokud objekt neexistuje"""
+    try:
+        return client.stat_object(bucket_name, object_name).size
+    except Exception as e:
+        if is_not_found(e):
+            return None
+        raise
+
+def object_exists(client, object_name: str, bucket_name: str = BUCKET_NAME) -> bool:
+    return object_size(client, object_name, bucket_name) is not None
+
+def store_content(client, file, content_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Uloží soubor pod obsahový klíč. Objekt se stejným obsahem se znovu nenahrává,
+    nový se nahraje se známou délkou po částech paralelně. Blokující volání (mimo event loop).
+    """
+    ensure_bucket(client)
+    content_hash, size = hash_file(file)
+    object_name = content_key(content_hash)
+    deduplicated = object_exists(client, object_name)
+    if not deduplicated:
+        client.put_object(
+            BUCKET_NAME,
+            object_name,
+            file,
+            length=size,
+            content_type=content_type or "application/octet-stream",
+            part_size=UPLOAD_PART_SIZE,
+            num_parallel_uploads=UPLOAD_PARALLEL_PARTS,
+        )
+    return {
+        "object_name": object_name,
+        "content_hash": content_hash,
+        "size": size,
+        "deduplicated": deduplicated,
+    }
+
+# --- Lokální náhrada MinIO ---
+class _LocalObjectResponse:
+    """Odpověď get_object se stejným rozhraním jako urllib3 odpověď klienta Minio"""
+
+    def __init__(self, file, length: int, etag: str):
+        self._file = file
+        self._remaining = length
+        self.headers = {"ETag": f'"{etag}"', "Content-Length": str(length)}
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        if amt is None or amt > self._remaining:
+            amt = self._remaining
+        data = self._file.read(amt)
+        self._remaining -= len(data)
+        return data
+
+    def stream(self, amt: int = 64 * 1024):
+        while True:
+            data = self.read(amt)
+            if not data:
+                break
+            yield data
+
+    def close(self):
+        self._file.close()
+
+    def release_conn(self):
+        pass
+
+class LocalObjectStore:
+    """
+    Náhrada MinIO nad lokálním adresářem pro vývoj a testy.
+    Implementuje jen podmnožinu API klienta Minio, kterou backend používá.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, bucket_name: str, object_name: str, meta: bool = False) -> str:
+        base = os.path.join(self.root, ".meta" if meta else "", bucket_name)
+        path = os.path.normpath(os.path.join(base, object_name))
+        if not path.startswith(os.path.normpath(base) + os.sep):
+            raise ValueError(f"Invalid object name: {object_name}")
+        return path
+
+    def _not_found(self, bucket_name: str, object_name: str) -> S3Error:
+        # Klíčové argumenty: pořadí pozičních se mezi verzemi klienta Minio liší
+        return S3Error(
+            code="NoSuchKey", message="Object does not exist", resource=object_name, request_id=None,
+            host_id=None, response=None, bucket_name=bucket_name, object_name=object_name,
+        )
+
+    def bucket_exists(self, bucket_name: str) -> bool:
+        return os.path.isdir(os.path.join(self.root, bucket_name))
+
+    def make_bucket(self, bucket_name: str):
+        os.makedirs(os.path.join(self.root, bucket_name), exist_ok=True)
+
+    def put_object(self, bucket_name: str, object_name: str, data, length: int, content_type="application/octet-stream",
+                   metadata=None, part_size: int = 0, **kwargs):
+        path = self._path(bucket_name, object_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        digest = hashlib.md5()
+        remaining = length if length >= 0 else None
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as target:
+            while remaining is None or remaining > 0:
+                chunk = data.read(1024 * 1024 if remaining is None else min(1024 * 1024, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                target.write(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+        os.replace(target.name, path)
+        etag = digest.hexdigest()
+        meta_path = self._path(bucket_name, object_name, meta=True)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        with open(meta_path, "w") as meta:
+            meta.write(etag)
+        return SimpleNamespace(bucket_name=bucket_name, object_name=object_name, etag=etag)
+
+    def stat_object(self, bucket_name: str, object_name: str):
+        path = self._path(bucket_name, object_name)
+        try:
+            info = os.stat(path)
+            with open(self._path(bucket_name, object_name, meta=True)) as meta:
+                etag = meta.read().strip()
+        except FileNotFoundError:
+            raise self._not_found(bucket_name, object_name)
+        return SimpleNamespace(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            etag=etag,
+            size=info.st_size,
+            last_modified=datetime.fromtimestamp(info.st_mtime, tz=timezone.utc),
+            content_type="application/octet-stream",
+        )
+
+    def get_object(self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0, **kwargs):
+        stat = self.stat_object(bucket_name, object_name)
+        file = open(self._path(bucket_name, object_name), "rb")
+        file.seek(offset)
+        available = max(stat.size - offset, 0)
+        return _LocalObjectResponse(file, min(length, available) if length else available, stat.etag)
+
+    def remove_object(self, bucket_name: str, object_name: str):
+        for meta in (False, True):
+            try:
+                os.remove(self._path(bucket_name, object_name, meta=meta))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,50 @@
+"""
+Společné nastavení testů backendu. Spuštění z kořenového adresáře projektu:
+python -m pytest backend/tests
+
+models.py čte DATABASE_URL a zakládá tabulky už při importu, proto se prostředí
+(SQLite v dočasném adresáři, lokální úložiště, bez cache odpovědí) nastaví
+před prvním importem backendu.
+"""
+import os
+import sys
+import tempfile
+import uuid
+import pytest
+
+TEST_DIR = tempfile.mkdtemp(prefix="ranger-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(TEST_DIR, 'ranger.db')}",
+    STORAGE_BACKEND="local",
+    LOCAL_STORAGE_DIR=os.path.join(TEST_DIR, "storage"),
+    RANGER_LIGHT_MODE="1",
+    RESPONSE_CACHE_TTL="0",
+    EVENTS_BACKEND="memory",
+)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from backend import main, models  # noqa: E402
+
+@pytest.fixture
+def db():
+    session = models.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def auth_headers(client):
+    """Hlavička s tokenem nově zaregistrovaného správce"""
+    username = f"admin-{uuid.uuid4().hex[:8]}"
+    client.post("/auth/register", json={
+        "username": username, "email": f"{username}@example.com", "password": "heslo", "role": "admin",
+    })
+    token = client.post("/auth/login", data={"username": username, "password": "heslo"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,43 @@
+"""
+Detekce rozmazání při zmenšeném dekódování: práh musí dávat stejný verdikt
+jako v plném rozlišení (syntetická scéna ostrá a rozmazaná).
+"""
+import pytest
+from backend import anomaly
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+def _scene(seed, height=1200, width=1600):
+    """Barevné obdélníky, kruhy a text s mírným šumem, uloženo jako JPEG"""
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), 128, np.uint8)
+    for _ in range(250):
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        if rng.random() < 0.5:
+            cv2.rectangle(img, (x, y), (x + int(rng.integers(10, 300)), y + int(rng.integers(10, 300))), color, -1)
+        else:
+            cv2.circle(img, (x, y), int(rng.integers(5, 150)), color, -1)
+    for _ in range(150):
+        position = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        cv2.putText(img, "ABC123", position, cv2.FONT_HERSHEY_SIMPLEX, float(rng.uniform(0.5, 3)), (0, 0, 0), 2)
+    return np.clip(img + rng.normal(0, 4, img.shape), 0, 255).astype(np.uint8)
+
+def _jpeg(img) -> bytes:
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+def _blurred(result) -> bool:
+    return "Rozmazaný snímek" in (result["details"] or "")
+
+@pytest.mark.parametrize("scale", [1, 2, 4, 8])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_blur_verdict_does_not_depend_on_decode_scale(monkeypatch, scale, seed):
+    monkeypatch.setattr(anomaly, "ANOMALY_DECODE_SCALE", scale)
+    sharp = _scene(seed)
+    blurred = cv2.GaussianBlur(sharp, (0, 0), 3)
+
+    assert not _blurred(anomaly.analyze_image(_jpeg(sharp)))
+    result = anomaly.analyze_image(_jpeg(blurred))
+    assert _blurred(result)
+    assert result["metrics"]["laplacian_var"] < result["metrics"]["blur_threshold"]
@@ -0,0 +1,96 @@
+"""
+Dávková OCR projektu běží jako úloha ocr_jobs (v testu synchronně místo poolu procesů),
+API jen streamuje průběh z databáze. Nezměněné dokumenty s uloženým výsledkem se nestahují.
+"""
+import io
+import json
+import pytest
+from backend import crud, jobs, main
+
+openpyxl = pytest.importorskip("openpyxl")
+
+class FakeDoc:
+    def __init__(self, text):
+        self.text = text
+        self.sents = []
+        self.ents = []
+        self.noun_chunks = []
+
+class FakeNlp:
+    def pipe(self, texts, batch_size=1, as_tuples=False, n_process=1):
+        for item in texts:
+            yield (FakeDoc(item[0]), item[1]) if as_tuples else FakeDoc(item)
+
+class CountingStore:
+    """Lokální úložiště, které počítá stažení objektů"""
+
+    def __init__(self, store):
+        self.store = store
+        self.downloads = []
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def get_object(self, bucket_name, object_name, **kwargs):
+        self.downloads.append(object_name)
+        return self.store.get_object(bucket_name, object_name, **kwargs)
+
+def _xlsx(rows):
+    workbook = openpyxl.Workbook()
+    for row in rows:
+        workbook.active.append([row])
+    content = io.BytesIO()
+    workbook.save(content)
+    return content.getvalue()
+
+@pytest.fixture
+def batch_worker(monkeypatch):
+    """Úloha se zpracuje hned při zařazení, s počítajícím úložištěm a bez spaCy"""
+    store = CountingStore(main.minio_client)
+    monkeypatch.setattr(main, "LIGHT_MODE", False)
+    monkeypatch.setattr(jobs, "_minio_client", store)
+    monkeypatch.setattr(jobs, "_submit", jobs.run_ocr_job)
+    monkeypatch.setattr(crud, "get_nlp", lambda: FakeNlp())
+    return store
+
+def _project_with_documents(client, auth_headers):
+    project_id = client.post("/projects/", json={"name": "Dávková OCR"}, headers=auth_headers).json()["id"]
+    for name in ("a", "b"):
+        client.post(f"/projects/{project_id}/uploadfile/", params={"category": "výkresy"}, files={
+            "file": (f"{name}.xlsx", _xlsx(f"{name} {i}" for i in range(5)), "application/octet-stream"),
+        })
+    client.post(f"/projects/{project_id}/uploadfile/", params={"category": "jiné"}, files={
+        "file": ("c.xlsx", _xlsx(["c"]), "application/octet-stream"),
+    })
+    return project_id
+
+def _run(client, project_id):
+    response = client.post(f"/projects/{project_id}/ocr", params={"category": "výkresy"})
+    assert response.status_code == 202
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_project_ocr_streams_job_progress(client, auth_headers, batch_worker):
+    project_id = _project_with_documents(client, auth_headers)
+
+    lines = _run(client, project_id)
+    job_id = lines[0]["job_id"]
+    assert lines[0]["status"] == jobs.JOB_QUEUED
+    assert lines[-1] == {"job_id": job_id, "status": jobs.JOB_DONE, "error": None}
+    documents = lines[1:-1]
+    assert sorted(entry["filename"] for entry in documents) == ["a.xlsx", "b.xlsx"]
+    assert {(entry["status"], entry["cached"]) for entry in documents} == {("done", False)}
+    assert len(batch_worker.downloads) == 2
+
+    job = client.get(f"/ocr_jobs/{job_id}").json()
+    assert (job["project_id"], job["document_id"], job["status"]) == (project_id, None, jobs.JOB_DONE)
+    assert job["progress"] == documents
+
+    # Druhý běh vezme výsledky z ocr_results, objekty už znovu nestahuje
+    batch_worker.downloads.clear()
+    documents = _run(client, project_id)[1:-1]
+    assert {(entry["status"], entry["cached"]) for entry in documents} == {("done", True)}
+    assert batch_worker.downloads == []
+
+def test_project_ocr_unknown_project(client, batch_worker):
+    assert client.post("/projects/999999/ocr").status_code == 404
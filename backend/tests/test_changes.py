@@ -0,0 +1,124 @@
+"""Feed změn GET /changes: stránkování podle (version, kind, id), záznamy o smazání, filtr projektu"""
+import uuid
+from backend import crud
+
+def _create_project(client, auth_headers, name="Feed změn"):
+    return client.post("/projects/", json={"name": name}, headers=auth_headers).json()["id"]
+
+def _changes(client, **params):
+    response = client.get("/changes", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+def _sync_logs(client, project_id, count):
+    """Logy vložené jednou dávkou, tedy v jedné transakci se stejnou verzí"""
+    results = client.post("/sync/batch", json={"progress_logs": [
+        {"idempotency_key": uuid.uuid4().hex, "project_id": project_id, "date": "2024-06-01", "percentage_completed": 10 + index}
+        for index in range(count)
+    ]}).json()["progress_logs"]
+    return [result["id"] for result in results]
+
+def _pages(client, since, **params):
+    """Všechny stránky od kurzoru; vrací seznam stránek a kurzor za poslední"""
+    pages = []
+    while True:
+        page = _changes(client, since=since, **params)
+        pages.append(page)
+        since = page["cursor"]
+        if not page["has_more"]:
+            return pages, since
+
+def test_paging_through_rows_with_the_same_version(client, auth_headers):
+    project_id = _create_project(client, auth_headers)
+    since = _changes(client, project_id=project_id)["cursor"]
+    content_hash = client.post("/sync/objects", files={"file": ("foto.jpg", uuid.uuid4().bytes, "image/jpeg")}).json()["content_hash"]
+    # Logy i fotka v jedné transakci: všechny řádky mají stejnou verzi, liší se druhem a id
+    batch = client.post("/sync/batch", json={
+        "progress_logs": [
+            {"idempotency_key": uuid.uuid4().hex, "project_id": project_id, "date": "2024-06-01", "percentage_completed": value}
+            for value in range(7)
+        ],
+        "photos": [{"idempotency_key": uuid.uuid4().hex, "project_id": project_id, "content_hash": content_hash, "filename": "foto.jpg"}],
+    }).json()
+    log_ids = [result["id"] for result in batch["progress_logs"]]
+    document_ids = [result["id"] for result in batch["photos"]]
+
+    pages, _ = _pages(client, since, project_id=project_id, limit=3)
+
+    assert [page["has_more"] for page in pages] == [True, True, False]
+    assert [len(page["documents"]) + len(page["progress_logs"]) for page in pages] == [3, 3, 2]
+    # Každý řádek právě jednou: v jedné verzi nejdřív dokumenty, pak logy podle id
+    assert [document["id"] for page in pages for document in page["documents"]] == document_ids
+    assert [log["id"] for page in pages for log in page["progress_logs"]] == sorted(log_ids)
+    assert len({log["version"] for page in pages for log in page["progress_logs"]}) == 1
+
+    # Kurzor poslední stránky už nic nevrací a zůstává platný
+    last = pages[-1]["cursor"]
+    empty = _changes(client, since=last, project_id=project_id)
+    assert (empty["progress_logs"], empty["documents"], empty["has_more"], empty["cursor"]) == ([], [], False, last)
+
+def test_deleted_rows_are_reported_as_tombstones(client, auth_headers):
+    project_id = _create_project(client, auth_headers)
+    log_ids = _sync_logs(client, project_id, 2)
+    since = _changes(client, project_id=project_id)["cursor"]
+
+    client.delete(f"/progress_logs/{log_ids[0]}")
+    deleted = _changes(client, since=since, project_id=project_id)["deleted"]
+    assert [(row["entity"], row["entity_id"], row["project_id"]) for row in deleted] == [("progress_log", log_ids[0], project_id)]
+
+    since = _changes(client, since=since, project_id=project_id)["cursor"]
+    client.delete(f"/projects/{project_id}", headers=auth_headers)
+    page = _changes(client, since=since)
+    assert [(row["entity"], row["entity_id"]) for row in page["deleted"] if row["project_id"] == project_id] == [("project", project_id)]
+    # Zbylý log projektu zůstal bez projektu, i to je změna
+    assert [(log["id"], log["project_id"]) for log in page["progress_logs"] if log["id"] == log_ids[1]] == [(log_ids[1], None)]
+
+def test_project_filter(client, auth_headers):
+    project_id = _create_project(client, auth_headers, "Sledovaný")
+    other_id = _create_project(client, auth_headers, "Jiný")
+    since = _changes(client, project_id=project_id)["cursor"]
+
+    other_logs = _sync_logs(client, other_id, 2)
+    own_logs = _sync_logs(client, project_id, 2)
+    client.delete(f"/progress_logs/{other_logs[0]}")
+    client.put(f"/projects/{other_id}", json={"name": "Jiný přejmenovaný"}, headers=auth_headers)
+
+    page = _changes(client, since=since, project_id=project_id)
+    assert [log["id"] for log in page["progress_logs"]] == own_logs
+    assert (page["projects"], page["documents"], page["deleted"]) == ([], [], [])
+
+    everything, _ = _pages(client, since)
+    assert {log["id"] for page in everything for log in page["progress_logs"]} >= set(own_logs + other_logs[1:])
+    assert {project["id"] for page in everything for project in page["projects"]} >= {other_id}
+    assert {row["entity_id"] for page in everything for row in page["deleted"]} >= {other_logs[0]}
+
+def test_full_snapshot_without_since(client, auth_headers):
+    project_id = _create_project(client, auth_headers)
+    log_ids = _sync_logs(client, project_id, 3)
+    client.delete(f"/progress_logs/{log_ids[0]}")
+    client.put(f"/projects/{project_id}", json={"name": "Aktuální název"}, headers=auth_headers)
+
+    snapshot = _changes(client, project_id=project_id)
+    # Aktuální stav: smazaný log chybí, záznamy o smazání se v úplném stavu neposílají
+    assert [project["name"] for project in snapshot["projects"]] == ["Aktuální název"]
+    assert [log["id"] for log in snapshot["progress_logs"]] == log_ids[1:]
+    assert (snapshot["deleted"], snapshot["has_more"]) == ([], False)
+
+    # Úplný stav po stránkách: stejné řádky, kurzor pak hlásí jen novější změny
+    pages, cursor = _pages(client, None, project_id=project_id, limit=1)
+    assert [log["id"] for page in pages for log in page["progress_logs"]] == log_ids[1:]
+    assert [project["id"] for page in pages for project in page["projects"]] == [project_id]
+    new_log = _sync_logs(client, project_id, 1)
+    after = _changes(client, since=cursor, project_id=project_id)
+    assert ([log["id"] for log in after["progress_logs"]], after["projects"]) == (new_log, [])
+
+def test_empty_snapshot_cursor_skips_old_tombstones(client, auth_headers):
+    project_id = _create_project(client, auth_headers)
+    client.delete(f"/projects/{project_id}", headers=auth_headers)
+    snapshot = _changes(client, project_id=project_id)
+    assert (snapshot["projects"], snapshot["deleted"]) == ([], [])
+    assert _changes(client, since=snapshot["cursor"], project_id=project_id)["deleted"] == []
+
+def test_invalid_since(client):
+    assert client.get("/changes", params={"since": "neplatný"}).status_code == 400
+    assert client.get("/changes", params={"since": crud.encode_cursor(1, 2)}).status_code == 400
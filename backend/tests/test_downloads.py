@@ -0,0 +1,194 @@
+"""
+Stahování dokumentů z lokálního úložiště (STORAGE_BACKEND=local): rozsahy, If-Range, If-None-Match,
+uvolnění spojení do databáze před odesláním těla. Zátěžový benchmark běží jen s RANGER_BENCHMARK=1.
+"""
+import asyncio
+import os
+import statistics
+import time
+import pytest
+from fastapi import Response
+from sqlalchemy import event
+from backend import main, models, storage
+
+CONTENT = bytes(range(256)) * 40
+
+@pytest.fixture
+def document(client, db):
+    project = models.Project(name="Stahování", owner_id=1)
+    db.add(project)
+    db.commit()
+    uploaded = client.post(f"/projects/{project.id}/uploadfile/", files={
+        "file": ("vykres.pdf", CONTENT, "application/pdf"),
+    }).json()
+    return uploaded["id"]
+
+def _download(client, document_id, **headers):
+    return client.get(f"/documents/{document_id}/download", headers=headers)
+
+def test_full_download(client, document):
+    response = _download(client, document)
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["content-length"] == str(len(CONTENT))
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-type"] == "application/pdf"
+    assert 'filename="vykres.pdf"' in response.headers["content-disposition"]
+
+@pytest.mark.parametrize("range_header, start, end", [
+    ("bytes=0-99", 0, 99),
+    ("bytes=100-", 100, len(CONTENT) - 1),
+    ("bytes=5000-99999", 5000, len(CONTENT) - 1),
+    ("bytes=-300", len(CONTENT) - 300, len(CONTENT) - 1),
+    ("bytes=-99999", 0, len(CONTENT) - 1),
+])
+def test_range_returns_partial_content(client, document, range_header, start, end):
+    response = _download(client, document, Range=range_header)
+    assert response.status_code == 206
+    assert response.content == CONTENT[start:end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(CONTENT)}"
+    assert response.headers["content-length"] == str(end - start + 1)
+
+@pytest.mark.parametrize("range_header", ["bytes=10240-", "bytes=20000-20010", "bytes=-0", "bytes=50-10"])
+def test_unsatisfiable_range(client, document, range_header):
+    response = _download(client, document, Range=range_header)
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+def test_unsupported_range_sends_whole_file(client, document):
+    # Více rozsahů najednou se nepodporuje, pošle se celý soubor
+    response = _download(client, document, Range="bytes=0-1,5-6")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+def test_if_range(client, document):
+    etag = _download(client, document).headers["etag"]
+
+    response = _download(client, document, Range="bytes=0-9", **{"If-Range": etag})
+    assert (response.status_code, response.content) == (206, CONTENT[:10])
+
+    # Zastaralý ETag: klient má jinou verzi, rozsah se ignoruje a posílá se celý soubor
+    response = _download(client, document, Range="bytes=0-9", **{"If-Range": '"zastaraly"'})
+    assert (response.status_code, response.content) == (200, CONTENT)
+    assert "content-range" not in response.headers
+
+def test_if_none_match(client, document):
+    etag = _download(client, document).headers["etag"]
+
+    for header in (etag, f"W/{etag}", f'"jiny", {etag}', "*"):
+        response = _download(client, document, **{"If-None-Match": header})
+        assert response.status_code == 304, header
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+    response = _download(client, document, **{"If-None-Match": '"jiny"'})
+    assert (response.status_code, response.content) == (200, CONTENT)
+
+def test_missing_document(client):
+    assert _download(client, 999999).status_code == 404
+
+class SlowStore:
+    """Úložiště se simulovanou síťovou latencí (blokující volání jako klient MinIO)"""
+
+    def __init__(self, store, latency, on_chunk=None):
+        self.store, self.latency, self.on_chunk = store, latency, on_chunk
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def stat_object(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return self.store.stat_object(*args, **kwargs)
+
+    def get_object(self, *args, **kwargs):
+        time.sleep(self.latency)
+        response = self.store.get_object(*args, **kwargs)
+        if self.on_chunk is None:
+            return response
+        stream = response.stream
+
+        def observed(size):
+            for chunk in stream(size):
+                self.on_chunk()
+                yield chunk
+
+        response.stream = observed
+        return response
+
+@pytest.fixture
+def async_connections():
+    """Počet spojení vydaných z poolu asynchronního enginu"""
+    models.AsyncSessionLocal()
+    engine = models.async_engine.sync_engine
+    checked_out = [0]
+
+    def checkout(*args):
+        checked_out[0] += 1
+
+    def checkin(*args):
+        checked_out[0] -= 1
+
+    event.listen(engine, "checkout", checkout)
+    event.listen(engine, "checkin", checkin)
+    yield checked_out
+    event.remove(engine, "checkout", checkout)
+    event.remove(engine, "checkin", checkin)
+
+def test_download_releases_connection_before_streaming(client, document, async_connections, monkeypatch):
+    during_body = []
+    monkeypatch.setattr(main, "minio_client", SlowStore(main.minio_client, 0, lambda: during_body.append(async_connections[0])))
+    monkeypatch.setattr(main, "DOWNLOAD_CHUNK_SIZE", 1024)
+
+    response = _download(client, document)
+
+    assert response.content == CONTENT
+    assert len(during_body) == len(CONTENT) // 1024
+    assert set(during_body) == {0}
+
+async def _latencies(url: str, clients: int) -> list:
+    import httpx
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as http:
+        # Všichni klienti přijdou současně, latence se měří od společného začátku
+        started = time.perf_counter()
+
+        async def one():
+            response = await http.get(url)
+            assert response.status_code == 200
+            return time.perf_counter() - started
+
+        return await asyncio.gather(*(one() for _ in range(clients)))
+
+def _percentiles(latencies: list) -> tuple:
+    cuts = statistics.quantiles(latencies, n=100)
+    return cuts[49], cuts[98]
+
+@pytest.mark.skipif(os.getenv("RANGER_BENCHMARK") != "1", reason="benchmark se spouští s RANGER_BENCHMARK=1")
+def test_benchmark_concurrent_downloads(document, monkeypatch):
+    """
+    200 souběžných klientů proti stahování s latencí úložiště 10 ms na volání. Srovnání s handlerem
+    v původní podobě (async def se synchronní session a blokujícími voláními úložiště v event loopu).
+    """
+    monkeypatch.setattr(main, "minio_client", SlowStore(main.minio_client, 0.01))
+
+    async def blocking_download(document_id: int):
+        db = models.SessionLocal()
+        try:
+            db_document = db.query(models.Document).filter(models.Document.id == document_id).first()
+        finally:
+            db.close()
+        main.minio_client.stat_object(storage.BUCKET_NAME, db_document.object_name)
+        response = main.minio_client.get_object(storage.BUCKET_NAME, db_document.object_name)
+        return Response(b"".join(response.stream(main.DOWNLOAD_CHUNK_SIZE)), media_type="application/pdf")
+
+    main.app.add_api_route("/benchmark/blocking_download/{document_id}", blocking_download)
+    try:
+        loop = asyncio.get_event_loop()
+        before = loop.run_until_complete(_latencies(f"/benchmark/blocking_download/{document}", 200))
+        after = loop.run_until_complete(_latencies(f"/documents/{document}/download", 200))
+    finally:
+        main.app.router.routes.pop()
+
+    (p50_before, p99_before), (p50_after, p99_after) = _percentiles(before), _percentiles(after)
+    print(f"blokující handler: p50 {p50_before * 1000:.0f} ms, p99 {p99_before * 1000:.0f} ms")
+    print(f"async handler:     p50 {p50_after * 1000:.0f} ms, p99 {p99_after * 1000:.0f} ms")
+    assert p99_after < p99_before / 2
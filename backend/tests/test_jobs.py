@@ -0,0 +1,79 @@
+import importlib
+import os
+import time
+from datetime import datetime, timedelta
+import pytest
+from backend import crud, jobs, models, ocr
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    calls = []
+
+    def perform_ocr_on_document(db, document_id, minio_client):
+        calls.append(document_id)
+        return "text", {"dates": []}
+
+    monkeypatch.setattr(crud, "perform_ocr_on_document", perform_ocr_on_document)
+    return calls
+
+def _job(db, **values):
+    job = models.OcrJob(document_id=None, **values)
+    db.add(job)
+    db.commit()
+    return job.id
+
+def _status(db, job_id):
+    db.expire_all()
+    return db.query(models.OcrJob).filter(models.OcrJob.id == job_id).one().status
+
+def test_job_runs_once(db, fake_ocr):
+    job_id = _job(db, status=jobs.JOB_QUEUED)
+    assert jobs.run_ocr_job(job_id)["status"] == jobs.JOB_DONE
+    # Stejná úloha zařazená podruhé (jiným workerem) se už nespustí
+    assert jobs.run_ocr_job(job_id) is None
+    assert len(fake_ocr) == 1
+    assert _status(db, job_id) == jobs.JOB_DONE
+
+def test_running_job_is_not_claimed(db, fake_ocr):
+    job_id = _job(db, status=jobs.JOB_RUNNING, started_at=datetime.utcnow(), heartbeat_at=datetime.utcnow())
+    assert jobs.run_ocr_job(job_id) is None
+    assert fake_ocr == []
+    assert _status(db, job_id) == jobs.JOB_RUNNING
+
+def test_resume_only_orphaned_jobs(db, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(jobs, "_submit", submitted.append)
+    db.query(models.OcrJob).delete()
+    db.commit()
+    old = datetime.utcnow() - timedelta(seconds=jobs.OCR_JOB_LEASE + 60)
+    queued = _job(db, status=jobs.JOB_QUEUED)
+    live = _job(db, status=jobs.JOB_RUNNING, started_at=old, heartbeat_at=datetime.utcnow())
+    orphaned = _job(db, status=jobs.JOB_RUNNING, started_at=old, heartbeat_at=old)
+    legacy = _job(db, status=jobs.JOB_RUNNING, started_at=old)
+    done = _job(db, status=jobs.JOB_DONE)
+
+    assert jobs.resume_pending_jobs(db) == 3
+    assert sorted(submitted) == sorted([queued, orphaned, legacy])
+    assert [_status(db, job_id) for job_id in (live, orphaned, done)] == [jobs.JOB_RUNNING, jobs.JOB_QUEUED, jobs.JOB_DONE]
+
+def test_heartbeat_refreshes_running_job(db, monkeypatch):
+    monkeypatch.setattr(jobs, "OCR_JOB_HEARTBEAT", 0.05)
+    started = datetime.utcnow() - timedelta(hours=1)
+    job_id = _job(db, status=jobs.JOB_RUNNING, started_at=started, heartbeat_at=started)
+    with jobs._heartbeat(job_id):
+        time.sleep(0.2)
+    db.expire_all()
+    assert db.query(models.OcrJob).filter(models.OcrJob.id == job_id).one().heartbeat_at > started
+
+@pytest.mark.parametrize("workers, page_workers", [("4", 4), ("16", 1), ("32", 1)])
+def test_page_workers_share_cores_with_job_processes(monkeypatch, workers, page_workers):
+    # Procesy úloh x vlákna stránek nepřesáhnou počet jader (16)
+    monkeypatch.setattr(os, "cpu_count", lambda: 16)
+    monkeypatch.setenv("OCR_WORKERS", workers)
+    monkeypatch.delenv("OCR_PAGE_WORKERS", raising=False)
+    try:
+        importlib.reload(ocr)
+        assert ocr.OCR_PAGE_WORKERS == page_workers
+    finally:
+        monkeypatch.undo()
+        importlib.reload(ocr)
@@ -0,0 +1,49 @@
+"""Zápisy progress logů zamykají change_counter dřív než řádek souhrnu project_progress"""
+from datetime import date
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from backend import crud, models, schemas
+
+@pytest.fixture
+def statements():
+    recorded = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        recorded.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    yield recorded
+    event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+
+def _first(statements, prefix, table):
+    return next(index for index, statement in enumerate(statements) if statement.startswith(prefix) and table in statement)
+
+def _assert_counter_locked_first(statements):
+    assert _first(statements, "UPDATE change_counter", "change_counter") < _first(statements, "SELECT", "FROM project_progress")
+
+@pytest.fixture
+def project_id(db):
+    return crud.create_project(db, schemas.ProjectCreate(name="Zámky")).id
+
+def test_create_progress_log_lock_order(db, project_id, statements):
+    crud.create_progress_log(db, schemas.ProgressLogCreate(date=date(2024, 1, 1), percentage_completed=10), project_id)
+    _assert_counter_locked_first(statements)
+
+def test_update_and_delete_progress_log_lock_order(db, project_id, statements):
+    log = crud.create_progress_log(db, schemas.ProgressLogCreate(date=date(2024, 1, 1), percentage_completed=10), project_id)
+    for write in (
+        lambda: crud.update_progress_log(db, log.id, schemas.ProgressLogCreate(date=date(2024, 1, 2), percentage_completed=20)),
+        lambda: crud.delete_progress_log(db, log.id),
+    ):
+        statements.clear()
+        write()
+        _assert_counter_locked_first(statements)
+
+def test_sync_batch_lock_order(db, project_id, statements):
+    batch = schemas.SyncBatch(progress_logs=[schemas.SyncProgressLog(
+        idempotency_key=f"zamky-{project_id}", project_id=project_id, date=date(2024, 1, 1), percentage_completed=30,
+    )])
+    crud.sync_batch(db, batch, minio_client=None)
+    _assert_counter_locked_first(statements)
+    assert db.query(models.ProjectProgress).filter(models.ProjectProgress.project_id == project_id).one().progress_sum == 30
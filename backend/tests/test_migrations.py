@@ -0,0 +1,91 @@
+"""
+Migrace databáze ve schématu původní verze aplikace až na aktuální schéma.
+Vedle SQLite se migrace spustí i proti Postgresu, je-li nastaveno TEST_POSTGRES_URL
+(databáze se před testem vyprázdní).
+"""
+import os
+from datetime import date
+import pytest
+from sqlalchemy import Column, Date, ForeignKey, Integer, MetaData, String, Table, create_engine, inspect, text
+from sqlalchemy.orm import Session
+from backend import migrations, models
+
+# Schéma původní verze aplikace (před tabulkou schema_migrations)
+baseline = MetaData()
+Table("users", baseline,
+      Column("id", Integer, primary_key=True), Column("username", String, unique=True),
+      Column("email", String, unique=True), Column("hashed_password", String), Column("role", String))
+Table("projects", baseline,
+      Column("id", Integer, primary_key=True), Column("name", String), Column("description", String),
+      Column("owner_id", Integer, ForeignKey("users.id")))
+Table("documents", baseline,
+      Column("id", Integer, primary_key=True), Column("filename", String), Column("category", String),
+      Column("project_id", Integer, ForeignKey("projects.id")))
+Table("progress_logs", baseline,
+      Column("id", Integer, primary_key=True), Column("project_id", Integer, ForeignKey("projects.id")),
+      Column("date", String), Column("percentage_completed", Integer), Column("notes", String))
+
+def _postgres_url():
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL není nastavené")
+    return url
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def engine(request, tmp_path):
+    if request.param == "sqlite":
+        engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    else:
+        engine = create_engine(_postgres_url())
+        models.Base.metadata.drop_all(engine)
+        migrations.schema_migrations.drop(engine, checkfirst=True)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def baseline_db(engine):
+    """Databáze v původním schématu s daty; nové tabulky založí create_all jako při startu aplikace"""
+    baseline.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO projects (id, name) VALUES (1, 'Most'), (2, 'Hala')"))
+        conn.execute(text(
+            "INSERT INTO documents (id, filename, category, project_id) VALUES (1, 'plan.pdf', 'plány', 1)"
+        ))
+        conn.execute(text(
+            "INSERT INTO progress_logs (id, project_id, date, percentage_completed) "
+            "VALUES (1, 1, '2024-01-05', 20), (2, 1, '7.2.2024', 45), (3, 1, '2024-03-01T10:00:00.000Z', 60), "
+            "(4, 1, 'neznámé', 70)"
+        ))
+    models.Base.metadata.create_all(engine)
+    return engine
+
+def test_migrate_baseline_schema(baseline_db, capsys):
+    applied = migrations.migrate(baseline_db)
+    assert "progress_logs.date: neplatné datum 'neznámé' bude NULL" in capsys.readouterr().out
+    assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrations.migrate(baseline_db) == []
+
+    columns = {column["name"]: column["type"] for column in inspect(baseline_db).get_columns("progress_logs")}
+    assert isinstance(columns["date"], Date)
+    for table in ("projects", "documents", "progress_logs"):
+        names = {column["name"] for column in inspect(baseline_db).get_columns(table)}
+        assert {"version", "updated_at"} <= names
+    index_names = {index["name"] for index in inspect(baseline_db).get_indexes("progress_logs")}
+    assert {"ix_progress_logs_project_id_date", "ix_progress_logs_version_id", "uq_progress_logs_idempotency_key"} <= index_names
+
+    with Session(baseline_db) as db:
+        logs = db.query(models.ProgressLog).order_by(models.ProgressLog.id).all()
+        assert [log.date for log in logs] == [date(2024, 1, 5), date(2024, 2, 7), date(2024, 3, 1), None]
+        assert all(log.version == 0 and log.updated_at is not None for log in logs)
+        document = db.query(models.Document).one()
+        assert document.object_name == "plan.pdf"
+        rollups = {
+            rollup.project_id: (rollup.progress_sum, rollup.progress_count, rollup.max_percentage, rollup.last_date)
+            for rollup in db.query(models.ProjectProgress)
+        }
+        assert rollups == {1: (195, 4, 70, date(2024, 3, 1)), 2: (0, 0, None, None)}
+
+        # Po migraci jdou zápisy přes aktuální modely (verze změn, updated_at)
+        logs[0].percentage_completed = 25
+        db.commit()
+        assert logs[0].version == 1
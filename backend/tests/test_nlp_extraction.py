@@ -0,0 +1,72 @@
+"""
+Extrakce klíčových dat zpracuje každý blok textu modelem spaCy právě jednou a nepotřebné
+komponenty pipeline vypne. Model se v testech nahrazuje náhradou, která počítá průchody.
+"""
+import sys
+import time
+import types
+import pytest
+from backend import crud
+
+class FakeSpan:
+    def __init__(self, text):
+        self.text = text
+
+class FakeDoc:
+    def __init__(self, text):
+        self.text = text
+        self.sents = [FakeSpan(sentence) for sentence in text.split("\n") if sentence]
+        self.ents = []
+        self.noun_chunks = []
+
+class FakeNlp:
+    def __init__(self):
+        self.pipe_names = ["tok2vec", "tagger", "parser", "ner", "lemmatizer", "textcat"]
+        self.disabled = []
+        self.parsed = []
+
+    def disable_pipe(self, name):
+        self.disabled.append(name)
+
+    def __call__(self, text):
+        self.parsed.append(text)
+        return FakeDoc(text)
+
+    def pipe(self, texts, batch_size=1, **kwargs):
+        for text in texts:
+            yield self(text)
+
+@pytest.fixture
+def fake_nlp(monkeypatch):
+    nlp = FakeNlp()
+    monkeypatch.setitem(sys.modules, "spacy", types.SimpleNamespace(load=lambda name: nlp))
+    monkeypatch.setattr(crud, "_nlp", None)
+    return nlp
+
+def _page(number):
+    return (
+        f"Strana {number}. Etapa {number} má termín 1.{number % 12 + 1}.2024\n"
+        f"Nosník délky 6 m, deska 250 mm, zatížení 5 kg/m2\n"
+        f"Montáž zahájena 2024-02-{number % 28 + 1:02d}"
+    )
+
+def test_unused_components_are_disabled(fake_nlp):
+    assert crud.get_nlp() is fake_nlp
+    assert fake_nlp.disabled == ["lemmatizer", "textcat"]
+
+def test_text_is_parsed_once(fake_nlp):
+    text = "\n".join(_page(number) for number in range(1, 301))
+    extracted_data = crud.extract_key_data_from_text(text)
+    assert fake_nlp.parsed == [text]
+    assert len(extracted_data["measurements"]) == 900
+    assert len(extracted_data["milestones"]) == 300
+
+def test_each_page_is_parsed_once(fake_nlp):
+    pages = [_page(number) for number in range(1, 501)]
+    started = time.perf_counter()
+    extracted_data = crud.extract_key_data_from_chunks(iter(pages))
+    per_page = (time.perf_counter() - started) / len(pages)
+    assert fake_nlp.parsed == pages
+    assert len(extracted_data["dates"]) == 1000
+    # Mimo model spaCy (regulární výrazy, slučování výsledků) stránka nesmí stát víc než zlomek milisekundy
+    assert per_page < 0.002, f"{per_page * 1000:.3f} ms na stránku"
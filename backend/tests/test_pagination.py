@@ -0,0 +1,91 @@
+"""
+Práce databáze na stránku progress logů: stránka podle kurzoru stojí stejně na začátku
+i na konci projektu, OFFSET roste s hloubkou. Práce se měří deterministicky počtem kroků
+virtuálního stroje SQLite (progress handler), benchmark s časy běží jen s RANGER_BENCHMARK=1.
+"""
+import os
+import time
+from datetime import date, timedelta
+import pytest
+from backend import crud, models
+
+PAGE = 100
+
+def _project_with_logs(db, count, undated=0):
+    """Projekt s `count` logy (10 na den) a `undated` logy bez data, vkládáno přímo přes DB-API"""
+    project = models.Project(name="Dlouhá historie", owner_id=1)
+    db.add(project)
+    db.commit()
+    start = date(2000, 1, 1)
+    rows = [(project.id, (start + timedelta(days=index // 10)).isoformat(), 50.0) for index in range(count)]
+    rows += [(project.id, None, 50.0)] * undated
+    raw = models.engine.raw_connection()
+    try:
+        raw.cursor().executemany(
+            "INSERT INTO progress_logs (project_id, date, percentage_completed, version) VALUES (?, ?, ?, 1)", rows
+        )
+        raw.commit()
+    finally:
+        raw.close()
+    return project.id
+
+def _cursor_at(db, project_id, position):
+    """Kurzor stránky začínající na pozici `position` (hodnoty řádku těsně před ní)"""
+    if position == 0:
+        return None
+    log = crud.get_progress_logs(db, project_id, skip=position - 1, limit=1)[0]
+    return crud.encode_cursor(log.date, log.id)
+
+def _vm_steps(db, function) -> int:
+    """Počet kroků virtuálního stroje SQLite (po stovkách) během volání"""
+    steps = [0]
+
+    def count():
+        steps[0] += 1
+        return 0
+
+    connection = db.connection().connection
+    connection.set_progress_handler(count, 100)
+    try:
+        function()
+    finally:
+        connection.set_progress_handler(None, 100)
+    return steps[0]
+
+@pytest.fixture(scope="module")
+def long_project():
+    db = models.SessionLocal()
+    try:
+        yield _project_with_logs(db, 20000, undated=150)
+    finally:
+        db.close()
+
+@pytest.mark.parametrize("position", [10000, 19950, 20050])
+def test_cursor_page_work_does_not_grow_with_depth(db, long_project, position):
+    first = _vm_steps(db, lambda: crud.get_progress_logs(db, long_project, limit=PAGE))
+    cursor = _cursor_at(db, long_project, position)
+    page = []
+    deep_cursor = _vm_steps(db, lambda: page.extend(crud.get_progress_logs(db, long_project, limit=PAGE, cursor=cursor)))
+    deep_offset = _vm_steps(db, lambda: crud.get_progress_logs(db, long_project, skip=position, limit=PAGE))
+
+    # Stránka přes přechod z logů s datem na logy bez data (20000) je pořád celá a správně seřazená
+    assert [log.id for log in page] == [log.id for log in crud.get_progress_logs(db, long_project, skip=position, limit=PAGE)]
+    assert deep_cursor <= 2 * first + 10
+    assert deep_offset > 10 * first
+
+@pytest.mark.skipif(os.getenv("RANGER_BENCHMARK") != "1", reason="benchmark se spouští s RANGER_BENCHMARK=1")
+def test_benchmark_pages_of_million_logs(db):
+    project_id = _project_with_logs(db, 1_000_000)
+
+    def timed(**kwargs):
+        started = time.perf_counter()
+        crud.get_progress_logs(db, project_id, limit=PAGE, **kwargs)
+        return time.perf_counter() - started
+
+    first = min(timed() for _ in range(5))
+    for position in (500_000, 999_900):
+        cursor = _cursor_at(db, project_id, position)
+        by_cursor = min(timed(cursor=cursor) for _ in range(5))
+        by_offset = min(timed(skip=position) for _ in range(5))
+        print(f"pozice {position}: první stránka {first * 1000:.1f} ms, kurzor {by_cursor * 1000:.1f} ms, OFFSET {by_offset * 1000:.1f} ms")
+        assert by_cursor < 3 * first + 0.005
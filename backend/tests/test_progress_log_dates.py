@@ -0,0 +1,69 @@
+"""Progress logy bez data (neplatná data převedená migrací na NULL) v API a stránkování"""
+from datetime import date
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Query
+from backend import crud, models
+
+def _project_with_logs(db, dates):
+    project = models.Project(name="Starý projekt", owner_id=1)
+    db.add(project)
+    logs = []
+    for index, log_date in enumerate(dates):
+        logs.append(models.ProgressLog(project=project, date=log_date, percentage_completed=10 * (index + 1)))
+        db.add(logs[-1])
+        db.flush()
+    db.commit()
+    crud.rebuild_progress_rollups(db)
+    return project.id, [log.id for log in logs]
+
+def test_endpoints_return_logs_without_date(client, db):
+    project_id, _ = _project_with_logs(db, [date(2024, 1, 1), None, date(2024, 2, 1)])
+    for url in (f"/projects/{project_id}", f"/projects/{project_id}/progress_logs/", "/changes", "/projects/?detail=true"):
+        assert client.get(url).status_code == 200, url
+
+    summary = next(item for item in client.get("/projects/?limit=1000").json() if item["id"] == project_id)
+    # Poslední log je ten s nejnovějším datem, log bez data se za poslední nepovažuje
+    assert (summary["latest_percentage"], summary["last_progress_date"]) == (30, "2024-02-01")
+
+def test_cursor_pages_through_null_dates(client, db):
+    project_id, ids = _project_with_logs(db, [None, date(2024, 3, 1), None, date(2024, 1, 1)])
+    seen, cursor = [], None
+    while True:
+        response = client.get(f"/projects/{project_id}/progress_logs/", params={"limit": 1, "cursor": cursor})
+        assert response.status_code == 200
+        seen += [(log["id"], log["date"]) for log in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == [(ids[3], "2024-01-01"), (ids[1], "2024-03-01"), (ids[0], None), (ids[2], None)]
+
+def test_update_and_delete_log_without_date(client, db):
+    project_id, ids = _project_with_logs(db, [None, date(2024, 1, 1)])
+    response = client.put(f"/progress_logs/{ids[0]}", json={"date": "2024-05-01", "percentage_completed": 50})
+    assert response.status_code == 200
+    assert response.json()["date"] == "2024-05-01"
+    assert client.get(f"/projects/{project_id}/overall_progress/").json()["overall_progress"] == 35
+    assert client.delete(f"/progress_logs/{ids[1]}").status_code == 200
+
+def _postgres_page_sql(monkeypatch, db, cursor):
+    """SQL dotazů stránky zkompilované pro Postgres (dotazy se nespouští)"""
+    statements = []
+
+    def compile_only(query):
+        statements.append(str(query.statement.compile(dialect=postgresql.dialect())))
+        return []
+
+    monkeypatch.setattr(Query, "all", compile_only)
+    crud._paginate(db.query(models.ProgressLog), [models.ProgressLog.date, models.ProgressLog.id], limit=10, cursor=cursor)
+    return statements
+
+def test_postgres_keyset_with_nullable_date(monkeypatch, db):
+    # Řádky s datem a řádky bez data jsou dva rozsahy v indexu, bez OR přes celý projekt
+    with_date, without_date = _postgres_page_sql(monkeypatch, db, crud.encode_cursor(date(2024, 1, 1), 5))
+    assert "progress_logs.date IS NOT NULL AND (progress_logs.date, progress_logs.id) >" in with_date
+    assert "ORDER BY progress_logs.date ASC NULLS LAST, progress_logs.id" in with_date
+    assert "WHERE progress_logs.date IS NULL ORDER BY" in without_date
+    assert " OR " not in with_date + without_date
+
+    (without_date,) = _postgres_page_sql(monkeypatch, db, crud.encode_cursor(None, 5))
+    assert "progress_logs.date IS NULL AND (progress_logs.id) >" in without_date
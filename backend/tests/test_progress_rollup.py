@@ -0,0 +1,54 @@
+from backend import crud, models
+
+def _create_project(client, auth_headers, name="Projekt"):
+    return client.post("/projects/", json={"name": name}, headers=auth_headers).json()["id"]
+
+def _rollup(db, project_id):
+    return db.query(models.ProjectProgress).filter(models.ProjectProgress.project_id == project_id).first()
+
+def test_create_project_creates_rollup_row(client, auth_headers, db):
+    project_id = _create_project(client, auth_headers)
+    rollup = _rollup(db, project_id)
+    assert (rollup.progress_sum, rollup.progress_count, rollup.max_percentage) == (0, 0, None)
+
+def test_progress_logs_update_rollup(client, auth_headers, db):
+    project_id = _create_project(client, auth_headers)
+    first = client.post(f"/projects/{project_id}/progress_logs/", json={"date": "2024-01-01", "percentage_completed": 40}).json()
+    client.post(f"/projects/{project_id}/progress_logs/", json={"date": "2024-02-01", "percentage_completed": 60})
+    client.put(f"/progress_logs/{first['id']}", json={"date": "2024-03-01", "percentage_completed": 80})
+    rollup = _rollup(db, project_id)
+    assert (rollup.progress_sum, rollup.progress_count, rollup.max_percentage, str(rollup.last_date)) == (140, 2, 80, "2024-03-01")
+    assert client.get(f"/projects/{project_id}/overall_progress/").json()["overall_progress"] == 70
+
+def test_orphaned_log_after_project_delete(client, auth_headers, db):
+    project_id = _create_project(client, auth_headers)
+    log_ids = [
+        client.post(f"/projects/{project_id}/progress_logs/", json={"date": "2024-01-01", "percentage_completed": value}).json()["id"]
+        for value in (10, 20)
+    ]
+    assert client.delete(f"/projects/{project_id}", headers=auth_headers).status_code == 200
+
+    response = client.put(f"/progress_logs/{log_ids[0]}", json={"date": "2024-01-02", "percentage_completed": 30})
+    assert response.status_code == 200
+    assert response.json()["project_id"] is None
+    assert client.delete(f"/progress_logs/{log_ids[1]}").status_code == 200
+    assert db.query(models.ProjectProgress).filter(models.ProjectProgress.project_id.is_(None)).count() == 0
+
+def test_missing_rollup_row_is_recreated(client, auth_headers, db):
+    project_id = _create_project(client, auth_headers)
+    db.query(models.ProjectProgress).filter(models.ProjectProgress.project_id == project_id).delete()
+    db.commit()
+    client.post(f"/projects/{project_id}/progress_logs/", json={"date": "2024-01-01", "percentage_completed": 25})
+    rollup = _rollup(db, project_id)
+    assert (rollup.progress_sum, rollup.progress_count) == (25, 1)
+
+def test_rebuild_creates_rows_for_projects_without_logs(client, auth_headers, db):
+    empty_id = _create_project(client, auth_headers)
+    logged_id = _create_project(client, auth_headers)
+    client.post(f"/projects/{logged_id}/progress_logs/", json={"date": "2024-01-01", "percentage_completed": 50})
+    db.query(models.ProjectProgress).delete()
+    db.commit()
+
+    assert crud.rebuild_progress_rollups(db) == db.query(models.Project).count()
+    assert (_rollup(db, empty_id).progress_sum, _rollup(db, empty_id).progress_count) == (0, 0)
+    assert (_rollup(db, logged_id).progress_sum, _rollup(db, logged_id).max_percentage) == (50, 50)
@@ -0,0 +1,21 @@
+import pytest
+from pydantic import ValidationError
+from backend import models
+
+def test_invalid_cursor_is_bad_request(client):
+    response = client.get("/projects/", params={"cursor": "neplatný"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid pagination cursor"}
+
+@pytest.mark.parametrize("detail", [False, True])
+def test_schema_error_is_not_reported_as_bad_request(client, db, detail):
+    # Chyba převodu na schéma je chyba serveru, nesmí skončit jako 400 s textem chyby pydanticu
+    project = models.Project(name=None, owner_id=1)
+    db.add(project)
+    db.commit()
+    try:
+        with pytest.raises(ValidationError):
+            client.get("/projects/", params={"detail": detail, "limit": 1000})
+    finally:
+        db.delete(project)
+        db.commit()
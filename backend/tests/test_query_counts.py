@@ -0,0 +1,78 @@
+"""
+Seznam projektů, dashboard a postup projektu musí mít pevný počet SQL dotazů
+bez ohledu na počet projektů a logů (žádné N+1)
+"""
+from contextlib import contextmanager
+from datetime import date
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from backend import crud, models
+
+@contextmanager
+def count_statements():
+    # Posluchač na třídě Engine zachytí synchronní i asynchronní engine (async_engine.sync_engine)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+
+@pytest.fixture
+def projects_with_children(db):
+    for index in range(20):
+        project = models.Project(name=f"Projekt {index}", owner_id=1)
+        project.progress_rollup = models.ProjectProgress(progress_sum=0, progress_count=0)
+        project.documents = [models.Document(filename=f"plan-{index}-{n}.pdf") for n in range(2)]
+        project.progress_logs = [models.ProgressLog(date=date(2024, 1, n + 1), percentage_completed=10 * n) for n in range(3)]
+        db.add(project)
+    db.commit()
+
+def _statements_for(client, url):
+    with count_statements() as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(statements)
+
+@pytest.mark.parametrize("detail, expected", [(False, 1), (True, 3)])
+def test_project_list_query_count_does_not_grow_with_page(client, projects_with_children, detail, expected):
+    small = _statements_for(client, f"/projects/?limit=2&detail={str(detail).lower()}")
+    large = _statements_for(client, f"/projects/?limit=20&detail={str(detail).lower()}")
+    assert small == large == expected
+
+def _add_projects(db, count, logs_per_project):
+    projects = []
+    for index in range(count):
+        project = models.Project(name=f"Dashboard {index}", owner_id=1)
+        project.progress_logs = [
+            models.ProgressLog(date=date(2024, 1, 1), percentage_completed=100 if n == logs_per_project - 1 else n)
+            for n in range(logs_per_project)
+        ]
+        db.add(project)
+        projects.append(project)
+    db.commit()
+    crud.rebuild_progress_rollups(db)
+    return projects
+
+def test_dashboard_stats_query_count_does_not_grow_with_projects(client, db):
+    _add_projects(db, 2, 10)
+    small = _statements_for(client, "/dashboard_stats/")
+    _add_projects(db, 50, 100)
+    large = _statements_for(client, "/dashboard_stats/")
+    assert small == large == 1
+
+    stats = client.get("/dashboard_stats/").json()
+    assert stats["total_projects"] == db.query(models.Project).count()
+    assert stats["completed_projects"] >= 52
+
+def test_overall_progress_query_count_does_not_grow_with_logs(client, db):
+    few, many = _add_projects(db, 1, 2)[0], _add_projects(db, 1, 500)[0]
+    assert _statements_for(client, f"/projects/{few.id}/overall_progress/") == 1
+    assert _statements_for(client, f"/projects/{many.id}/overall_progress/") == 1
+    expected = (sum(range(499)) + 100) / 500
+    assert client.get(f"/projects/{many.id}/overall_progress/").json()["overall_progress"] == pytest.approx(expected)
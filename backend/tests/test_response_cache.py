@@ -0,0 +1,116 @@
+"""
+Cache odpovědí: zápisy přes API zneplatní seznam a detail projektu, postup projektu i dashboard,
+shodný If-None-Match vrací 304. Testy běží se zapnutou cache v paměti (conftest ji jinak vypíná).
+"""
+import importlib
+from datetime import date
+import pytest
+from backend import cache, crud, models
+
+@pytest.fixture(autouse=True)
+def response_cache(monkeypatch):
+    enabled = cache.ResponseCache(cache.LRUCacheStore(1024), ttl=60)
+    monkeypatch.setattr(cache, "response_cache", enabled)
+    return enabled
+
+@pytest.fixture
+def project_id(client, auth_headers):
+    project_id = client.post("/projects/", json={"name": "Cache"}, headers=auth_headers).json()["id"]
+    client.post(f"/projects/{project_id}/progress_logs/", json={"date": "2024-01-01", "percentage_completed": 20})
+    return project_id
+
+def _views(client, project_id):
+    """Všechny cachované odpovědi týkající se projektu"""
+    summary = next(item for item in client.get("/projects/", params={"limit": 1000}).json() if item["id"] == project_id)
+    return {
+        "summary": summary,
+        "project": client.get(f"/projects/{project_id}").json(),
+        "overall_progress": client.get(f"/projects/{project_id}/overall_progress/").json()["overall_progress"],
+        "dashboard": client.get("/dashboard_stats/").json(),
+    }
+
+def test_responses_are_cached(client, db, project_id):
+    before = _views(client, project_id)
+    # Zápis mimo API cache nezneplatní: odpovědi zůstávají z cache
+    db.query(models.Project).filter(models.Project.id == project_id).update({"name": "Mimo API"})
+    db.add(models.ProgressLog(project_id=project_id, date=date(2024, 2, 1), percentage_completed=80))
+    db.commit()
+    crud.rebuild_progress_rollups(db)
+    assert _views(client, project_id) == before
+
+def test_progress_log_writes_invalidate(client, project_id):
+    before = _views(client, project_id)
+    log_id = client.post(f"/projects/{project_id}/progress_logs/", json={"date": "2024-02-01", "percentage_completed": 60}).json()["id"]
+    created = _views(client, project_id)
+    assert created["overall_progress"] == 40
+    assert created["summary"]["latest_percentage"] == 60
+    assert len(created["project"]["progress_logs"]) == 2
+    assert created["dashboard"] != before["dashboard"]
+
+    client.put(f"/progress_logs/{log_id}", json={"date": "2024-02-01", "percentage_completed": 100})
+    updated = _views(client, project_id)
+    assert updated["overall_progress"] == 60
+    assert updated["summary"]["latest_percentage"] == 100
+    assert updated["dashboard"] != created["dashboard"]
+
+    client.delete(f"/progress_logs/{log_id}")
+    deleted = _views(client, project_id)
+    assert deleted["overall_progress"] == 20
+    assert len(deleted["project"]["progress_logs"]) == 1
+    assert deleted["dashboard"] == before["dashboard"]
+
+def test_project_writes_invalidate(client, auth_headers, project_id):
+    before = _views(client, project_id)
+    client.put(f"/projects/{project_id}", json={"name": "Přejmenovaný"}, headers=auth_headers)
+    renamed = _views(client, project_id)
+    assert renamed["summary"]["name"] == renamed["project"]["name"] == "Přejmenovaný"
+
+    other = client.post("/projects/", json={"name": "Další"}, headers=auth_headers).json()["id"]
+    assert client.get("/dashboard_stats/").json()["total_projects"] == before["dashboard"]["total_projects"] + 1
+    client.delete(f"/projects/{other}", headers=auth_headers)
+    assert client.get("/dashboard_stats/").json()["total_projects"] == before["dashboard"]["total_projects"]
+    assert all(item["id"] != other for item in client.get("/projects/", params={"limit": 1000}).json())
+
+def test_upload_and_sync_invalidate(client, project_id):
+    _views(client, project_id)
+    client.post(f"/projects/{project_id}/uploadfile/", files={"file": ("plan.pdf", b"%PDF obsah", "application/pdf")})
+    assert [document["filename"] for document in client.get(f"/projects/{project_id}").json()["documents"]] == ["plan.pdf"]
+
+    client.post("/sync/batch", json={"progress_logs": [{
+        "idempotency_key": f"cache-{project_id}", "project_id": project_id, "date": "2024-03-01", "percentage_completed": 80,
+    }]})
+    synced = _views(client, project_id)
+    assert synced["overall_progress"] == 50
+    assert synced["summary"]["latest_percentage"] == 80
+
+@pytest.mark.parametrize("url", [
+    "/projects/?cursor={cursor}", "/projects/{id}", "/projects/{id}/overall_progress/", "/dashboard_stats/",
+])
+def test_if_none_match(client, project_id, url):
+    # Stránka seznamu začínající tímto projektem (na první stránce být nemusí)
+    url = url.format(id=project_id, cursor=crud.encode_cursor(project_id - 1))
+    response = client.get(url)
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+
+    not_modified = client.get(url, headers={"If-None-Match": etag})
+    assert (not_modified.status_code, not_modified.content) == (304, b"")
+    assert not_modified.headers["etag"] == etag
+
+    # Po zápisu se stará verze už neshoduje
+    client.post(f"/projects/{project_id}/progress_logs/", json={"date": "2024-04-01", "percentage_completed": 90})
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+def test_default_ttl_without_shared_store_is_short(monkeypatch):
+    # Cache v paměti workeru nezneplatní zápisy ostatních workerů, výchozí platnost je jen pár sekund
+    monkeypatch.delenv("RESPONSE_CACHE_URL", raising=False)
+    monkeypatch.delenv("RESPONSE_CACHE_TTL", raising=False)
+    try:
+        importlib.reload(cache)
+        assert cache.RESPONSE_CACHE_TTL == 5
+        assert isinstance(cache.response_cache.store, cache.LRUCacheStore)
+    finally:
+        monkeypatch.undo()
+        importlib.reload(cache)
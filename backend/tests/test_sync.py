@@ -0,0 +1,91 @@
+"""Dávková synchronizace z mobilní aplikace (/sync/objects, /sync/batch): idempotence a souhrn postupu"""
+import hashlib
+import uuid
+from backend import models
+
+def _create_project(client, auth_headers, name="Synchronizace"):
+    return client.post("/projects/", json={"name": name}, headers=auth_headers).json()["id"]
+
+def _key(name):
+    # Klíče jsou v databázi unikátní napříč testy
+    return f"{name}-{uuid.uuid4().hex}"
+
+def _log(project_id, key, percentage, day="2024-05-01"):
+    return {"idempotency_key": key, "project_id": project_id, "date": day, "percentage_completed": percentage}
+
+def _rollup(db, project_id):
+    db.expire_all()
+    return db.query(models.ProjectProgress).filter(models.ProjectProgress.project_id == project_id).one()
+
+def _upload_photo(client, content):
+    response = client.post("/sync/objects", files={"file": ("foto.jpg", content, "image/jpeg")})
+    assert response.status_code == 200
+    return response.json()["content_hash"]
+
+def test_retried_batch_returns_duplicates_with_original_ids(client, auth_headers, db):
+    project_id = _create_project(client, auth_headers)
+    content_hash = _upload_photo(client, b"fotka " + uuid.uuid4().bytes)
+    batch = {
+        "progress_logs": [_log(project_id, _key("log-a"), 30), _log(project_id, _key("log-b"), 50)],
+        "photos": [{"idempotency_key": _key("foto"), "project_id": project_id,
+                    "content_hash": content_hash, "filename": "foto.jpg"}],
+    }
+
+    first = client.post("/sync/batch", json=batch).json()
+    assert {result["status"] for result in first["progress_logs"] + first["photos"]} == {"created"}
+
+    # Klient nedostal odpověď a odeslal stejnou dávku znovu
+    retry = client.post("/sync/batch", json=batch).json()
+    for kind in ("progress_logs", "photos"):
+        assert [result["status"] for result in retry[kind]] == ["duplicate"] * len(batch[kind])
+        assert [result["id"] for result in retry[kind]] == [result["id"] for result in first[kind]]
+    assert db.query(models.ProgressLog).filter(models.ProgressLog.project_id == project_id).count() == 2
+    assert db.query(models.Document).filter(models.Document.project_id == project_id).count() == 1
+
+def test_key_repeated_within_batch_inserts_one_row(client, auth_headers, db):
+    project_id = _create_project(client, auth_headers)
+    key = _key("dvakrat")
+    results = client.post("/sync/batch", json={
+        "progress_logs": [_log(project_id, key, 40), _log(project_id, key, 40)],
+    }).json()["progress_logs"]
+
+    assert [result["status"] for result in results] == ["created", "duplicate"]
+    assert results[0]["id"] == results[1]["id"]
+    assert db.query(models.ProgressLog).filter(models.ProgressLog.idempotency_key == key).count() == 1
+    rollup = _rollup(db, project_id)
+    assert (rollup.progress_sum, rollup.progress_count) == (40, 1)
+
+def test_retry_is_not_counted_twice_in_progress(client, auth_headers, db):
+    project_id = _create_project(client, auth_headers)
+    batch = {"progress_logs": [_log(project_id, _key("a"), 20, "2024-01-01"), _log(project_id, _key("b"), 60, "2024-02-01")]}
+
+    for _ in range(3):
+        assert client.post("/sync/batch", json=batch).status_code == 200
+
+    rollup = _rollup(db, project_id)
+    assert (rollup.progress_sum, rollup.progress_count, rollup.max_percentage, str(rollup.last_date)) == (80, 2, 60, "2024-02-01")
+    assert client.get(f"/projects/{project_id}/overall_progress/").json()["overall_progress"] == 40
+
+def test_photo_without_uploaded_content_is_rejected(client, auth_headers, db):
+    project_id = _create_project(client, auth_headers)
+    missing_hash = hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+    key = _key("bez-obsahu")
+
+    result = client.post("/sync/batch", json={
+        "photos": [{"idempotency_key": key, "project_id": project_id, "content_hash": missing_hash, "filename": "foto.jpg"}],
+        "progress_logs": [_log(project_id, _key("log"), 10)],
+    }).json()
+
+    assert result["photos"] == [{
+        "idempotency_key": key, "status": "error", "id": None, "error": "Photo content not uploaded",
+    }]
+    # Chybná fotka neshodí zbytek dávky
+    assert result["progress_logs"][0]["status"] == "created"
+    assert db.query(models.Document).filter(models.Document.idempotency_key == key).count() == 0
+
+    # Po nahrání obsahu projde stejná položka napodruhé
+    content_hash = _upload_photo(client, b"pozdejsi " + uuid.uuid4().bytes)
+    result = client.post("/sync/batch", json={
+        "photos": [{"idempotency_key": key, "project_id": project_id, "content_hash": content_hash, "filename": "foto.jpg"}],
+    }).json()
+    assert result["photos"][0]["status"] == "created"
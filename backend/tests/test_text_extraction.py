@@ -0,0 +1,216 @@
+"""
+Extrakce textu velkých dokumentů: bloky stránek/řádků musí jít do nlp.pipe průběžně
+(dokud je dočasný soubor otevřený), ne až po načtení celého dokumentu do paměti.
+spaCy se v testech nahrazuje jednoduchým modelem, který jen počítá přijaté bloky.
+"""
+import os
+import pytest
+from backend import crud
+
+class FakeDoc:
+    def __init__(self, text):
+        self.text = text
+        self.sents = []
+        self.ents = []
+        self.noun_chunks = []
+
+class FakeNlp:
+    """nlp.pipe po dávkách; zaznamená, kolik bloků vyrobil generátor před prvním výsledkem"""
+
+    def __init__(self, produced):
+        self.produced = produced
+        self.produced_before_first_doc = None
+
+    def pipe(self, texts, batch_size=1, as_tuples=False, n_process=1):
+        assert not isinstance(texts, (list, tuple))
+        batch = []
+        for item in texts:
+            batch.append(item)
+            if len(batch) == batch_size:
+                yield from self._docs(batch, as_tuples)
+                batch = []
+        yield from self._docs(batch, as_tuples)
+
+    def _docs(self, batch, as_tuples):
+        if batch and self.produced_before_first_doc is None:
+            self.produced_before_first_doc = len(self.produced)
+        for item in batch:
+            yield (FakeDoc(item[0]), item[1]) if as_tuples else FakeDoc(item)
+
+class FakeResponse:
+    def __init__(self, path, etag):
+        self.path = path
+        self.headers = {"ETag": f'"{etag}"'}
+
+    def stream(self, size):
+        with open(self.path, "rb") as f:
+            while chunk := f.read(size):
+                yield chunk
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+class FakeMinio:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_object(self, bucket, object_name):
+        return FakeResponse(self.objects[object_name], etag="")
+
+    def stat_object(self, bucket, object_name):
+        raise FileNotFoundError(object_name)
+
+@pytest.fixture
+def fake_nlp(monkeypatch):
+    produced = []
+    iter_document_text = crud.iter_document_text
+
+    def counted(*args, **kwargs):
+        for chunk in iter_document_text(*args, **kwargs):
+            produced.append(len(chunk))
+            yield chunk
+
+    nlp = FakeNlp(produced)
+    monkeypatch.setattr(crud, "iter_document_text", counted)
+    monkeypatch.setattr(crud, "get_nlp", lambda: nlp)
+    return nlp
+
+def _write_xlsx(path, rows):
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for row in rows:
+        ws.append([row])
+    wb.save(path)
+
+def _write_pdf(path, pages):
+    """Minimální PDF s jedním řádkem textu na stránce"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(1, pages + 1):
+        content = f"BT /F1 12 Tf 72 720 Td (Strana {page}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R "
+            f"/Resources << /Font << /F1 3 0 R >> >> >>"
+        ).encode())
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode()
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+def test_large_xlsx_is_streamed_into_nlp(tmp_path, fake_nlp):
+    rows = 500_000
+    path = str(tmp_path / "velky.xlsx")
+    _write_xlsx(path, (f"Nosník {i} délky 6 m" if i == rows - 1 else f"položka {i}" for i in range(rows)))
+
+    content_hash, text, extracted_data = crud.download_and_extract_data(FakeMinio({"velky": path}), "velky", "velky.xlsx")
+
+    assert len(fake_nlp.produced) == rows // crud.XLSX_ROWS_PER_CHUNK
+    # Do prvního výsledku pipe vznikla jen první dávka bloků, ne celý sešit
+    assert fake_nlp.produced_before_first_doc <= crud.NLP_BATCH_SIZE
+    assert text.count("\n") == rows - 1
+    assert text.startswith("položka 0\npoložka 1\n")
+    assert [m["unit"] for m in extracted_data["measurements"]] == ["m"]
+
+def test_large_pdf_is_streamed_into_nlp(tmp_path, fake_nlp):
+    pytest.importorskip("pdfplumber")
+    pages = 1000
+    path = str(tmp_path / "velky.pdf")
+    _write_pdf(path, pages)
+
+    content_hash, text, extracted_data = crud.download_and_extract_data(FakeMinio({"velky": path}), "velky", "velky.pdf")
+
+    assert len(fake_nlp.produced) == pages
+    assert fake_nlp.produced_before_first_doc <= crud.NLP_BATCH_SIZE
+    assert len(extracted_data["page_timings"]) == pages
+    assert "Strana 1\n" in text and text.endswith("Strana 1000")
+
+def test_batch_ocr_discards_document_failing_mid_extraction(tmp_path, fake_nlp, db, monkeypatch):
+    good, bad = str(tmp_path / "dobry.xlsx"), str(tmp_path / "vadny.xlsx")
+    _write_xlsx(good, (f"dobrý {i}" for i in range(1200)))
+    _write_xlsx(bad, (f"vadný {i}" for i in range(1200)))
+    iter_xlsx_text = crud.iter_xlsx_text
+
+    def failing_xlsx_text(source):
+        for index, chunk in enumerate(iter_xlsx_text(source)):
+            if index == 2 and chunk.startswith("vadný"):
+                raise ValueError("poškozený sešit")
+            yield chunk
+
+    class Document:
+        def __init__(self, id, object_name, filename):
+            self.id, self.object_name, self.filename = id, object_name, filename
+
+    monkeypatch.setattr(crud, "iter_xlsx_text", failing_xlsx_text)
+    results = list(crud.perform_batch_ocr(
+        db, [Document(1, "dobry", "dobry.xlsx"), Document(2, "vadny", "vadny.xlsx")],
+        FakeMinio({"dobry": good, "vadny": bad}), batch_size=2, download_workers=1,
+    ))
+
+    results = {result["document_id"]: result for result in results}
+    assert results[1]["status"] == "done"
+    assert results[1]["ocr_text"].split("\n") == [f"dobrý {i}" for i in range(1200)]
+    assert (results[2]["status"], results[2]["error"]) == ("failed", "poškozený sešit")
+
+class Document:
+    def __init__(self, id, object_name, filename):
+        self.id, self.object_name, self.filename = id, object_name, filename
+
+@pytest.fixture
+def spool_paths(monkeypatch):
+    """Cesty všech dočasných souborů stažení; otevřený soubor na disku existuje (mazání při zavření)"""
+    paths, open_at_creation = [], []
+    named_temporary_file = crud.tempfile.NamedTemporaryFile
+
+    def tracked(*args, **kwargs):
+        spool = named_temporary_file(*args, **kwargs)
+        paths.append(spool.name)
+        open_at_creation.append(sum(os.path.exists(path) for path in paths))
+        return spool
+
+    monkeypatch.setattr(crud.tempfile, "NamedTemporaryFile", tracked)
+    return paths, open_at_creation
+
+def _batch_documents(tmp_path, count):
+    objects = {}
+    for index in range(count):
+        path = str(tmp_path / f"sesit{index}.xlsx")
+        _write_xlsx(path, (f"řádek {index}/{i}" for i in range(10)))
+        objects[f"sesit{index}"] = path
+    return [Document(index, f"sesit{index}", f"sesit{index}.xlsx") for index in range(count)], FakeMinio(objects)
+
+def test_batch_ocr_bounds_open_downloads(tmp_path, fake_nlp, db, spool_paths):
+    paths, open_at_creation = spool_paths
+    documents, minio = _batch_documents(tmp_path, 8)
+
+    results = list(crud.perform_batch_ocr(db, documents, minio, batch_size=1, download_workers=2))
+
+    assert sorted(result["document_id"] for result in results) == list(range(8))
+    # Nejvýš download_workers rozpracovaných stažení a jeden právě zpracovávaný soubor
+    assert max(open_at_creation) <= 3
+    assert not any(os.path.exists(path) for path in paths)
+
+def test_closed_batch_ocr_releases_downloads(tmp_path, fake_nlp, db, spool_paths):
+    paths, _ = spool_paths
+    documents, minio = _batch_documents(tmp_path, 8)
+
+    results = crud.perform_batch_ocr(db, documents, minio, batch_size=1, download_workers=2)
+    next(results)
+    # Odpojený klient: generátor se zavře po prvním výsledku
+    results.close()
+
+    assert len(paths) < len(documents)
+    assert not any(os.path.exists(path) for path in paths)
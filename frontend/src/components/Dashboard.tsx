@@ -11,9 +11,38 @@ const Dashboard: React.FC = () => {
   const [stats, setStats] = useState<DashboardStats | null>(null);
 
   useEffect(() => {
-    fetch('/api/dashboard_stats/')
-      .then(response => response.json())
-      .then(data => setStats(data));
+    const fetchStats = () => {
+      fetch('/api/dashboard_stats/')
+        .then(response => response.json())
+        .then(data => setStats(data));
+    };
+    fetchStats();
+
+    // Statistiky se znovu načtou jen po změně hlášené serverem (SSE), bez periodického dotazování;
+    // více událostí těsně po sobě (např. dávková synchronizace) vyvolá jediný dotaz
+    let timer: ReturnType<typeof setTimeout> | undefined;
+    const refresh = () => {
+      clearTimeout(timer);
+      timer = setTimeout(fetchStats, 500);
+    };
+    const source = new EventSource('/api/events');
+    [
+      'project.created', 'project.updated', 'project.deleted',
+      'progress_log.created', 'progress_log.updated', 'progress_log.deleted',
+      'sync.completed', 'resync',
+    ].forEach(type => source.addEventListener(type, refresh));
+    let opened = false;
+    source.onopen = () => {
+      // Po obnovení spojení mohly události chybět
+      if (opened) {
+        refresh();
+      }
+      opened = true;
+    };
+    return () => {
+      clearTimeout(timer);
+      source.close();
+    };
   }, []);
 
   if (!stats) {
@@ -1,16 +1,18 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useParams } from 'react-router-dom';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import PdfViewer from './PdfViewer';
 
 interface Document {
   id: number;
+  project_id?: number | null;
   filename: string;
   category?: string;
 }
 
 interface ProgressLog {
   id: number;
+  project_id?: number | null;
   date: string;
   percentage_completed: number;
   notes: string;
@@ -24,6 +26,40 @@ interface Project {
   progress_logs: ProgressLog[];
 }
 
+interface Changes {
+  projects: Omit<Project, 'documents' | 'progress_logs'>[];
+  documents: Document[];
+  progress_logs: ProgressLog[];
+  deleted: { entity: string; entity_id: number }[];
+  cursor: string;
+  has_more: boolean;
+}
+
+// Sloučí dávku změn z GET /changes do lokálního stavu projektu
+const applyChanges = (project: Project | null, changes: Changes, projectId: number): Project | null => {
+  const deleted = (entity: string) =>
+    new Set(changes.deleted.filter(row => row.entity === entity).map(row => row.entity_id));
+  if (deleted('project').has(projectId)) {
+    return null;
+  }
+  const merge = <T extends { id: number; project_id?: number | null }>(items: T[], changed: T[], removed: Set<number>) => {
+    const byId = new Map(items.map(item => [item.id, item]));
+    changed.forEach(item => byId.set(item.id, item));
+    removed.forEach(id => byId.delete(id));
+    return Array.from(byId.values()).filter(item => item.project_id === undefined || item.project_id === projectId);
+  };
+  const changedProject = changes.projects.find(changed => changed.id === projectId);
+  if (!project && !changedProject) {
+    return null;
+  }
+  return {
+    ...(project ?? { documents: [], progress_logs: [] }),
+    ...changedProject,
+    documents: merge(project?.documents ?? [], changes.documents, deleted('document')),
+    progress_logs: merge(project?.progress_logs ?? [], changes.progress_logs, deleted('progress_log')),
+  } as Project;
+};
+
 const ProjectDetail: React.FC = () => {
   const { projectId } = useParams<{ projectId: string }>();
   const [project, setProject] = useState<Project | null>(null);
@@ -39,28 +75,60 @@ const ProjectDetail: React.FC = () => {
   const [extractedData, setExtractedData] = useState<any[]>([]);
   const [anomalyResult, setAnomalyResult] = useState<any | null>(null);
 
-  const fetchProject = () => {
-    fetch(`/api/projects/${projectId}`)
-      .then(response => response.json())
-      .then(data => setProject(data));
+  // Kurzor feedu změn; první načtení (bez kurzoru) vrátí celý projekt, další jen to, co se od té doby změnilo
+  const changesCursor = useRef<string | null>(null);
+
+  const fetchProject = async () => {
+    let hasMore = true;
+    while (hasMore) {
+      const params = new URLSearchParams({ project_id: String(projectId) });
+      if (changesCursor.current) {
+        params.set('since', changesCursor.current);
+      }
+      const changes: Changes = await fetch(`/api/changes?${params}`).then(response => response.json());
+      changesCursor.current = changes.cursor;
+      hasMore = changes.has_more;
+      setProject(prevProject => applyChanges(prevProject, changes, Number(projectId)));
+    }
     fetch(`/api/projects/${projectId}/overall_progress/`)
       .then(response => response.json())
       .then(data => setOverallProgress(data.overall_progress));
   };
 
   useEffect(() => {
+    changesCursor.current = null;
+    setProject(null);
     fetchProject();
   }, [projectId]);
 
+  // Čekající OCR úlohy podle job_id, vyřizuje je událost ocr_job.finished
+  const ocrWaiters = useRef(new Map<number, (job: any) => void>());
+
+  // Změny projektu (i z jiných klientů a mobilní aplikace) hlásí server přes SSE, nic se periodicky nedotazuje
   useEffect(() => {
-    let url = `/api/projects/${projectId}/documents/`;
-    if (filterCategory) {
-      url += `?category=${filterCategory}`;
-    }
-    fetch(url)
-      .then(response => response.json())
-      .then(data => setProject(prevProject => prevProject ? { ...prevProject, documents: data } : null));
-  }, [projectId, filterCategory]);
+    const source = new EventSource(`/api/events?project_id=${projectId}`);
+    [
+      'project.updated', 'progress_log.created', 'progress_log.updated', 'progress_log.deleted',
+      'document.uploaded', 'sync.completed', 'resync',
+    ].forEach(type => source.addEventListener(type, () => fetchProject()));
+    source.addEventListener('ocr_job.finished', event => {
+      const job = JSON.parse((event as MessageEvent).data);
+      const waiter = ocrWaiters.current.get(job.job_id);
+      if (waiter) {
+        ocrWaiters.current.delete(job.job_id);
+        waiter(job);
+      }
+    });
+    let opened = false;
+    source.onopen = () => {
+      // Po obnovení spojení se dočtou změny, jejichž události se ztratily
+      if (opened) {
+        fetchProject();
+      }
+      opened = true;
+    };
+    return () => source.close();
+  }, [projectId]);
 
   const handleFileChange = (event: React.ChangeEvent<HTMLInputElement>) => {
     if (event.target.files) {
@@ -139,13 +207,35 @@ const ProjectDetail: React.FC = () => {
     setPdfToView(`/api/documents/${documentId}/download`);
   };
 
+  // Počká na událost ocr_job.finished; stav se jednou ověří i dotazem pro úlohu hotovou
+  // dřív, než se čekání zaregistrovalo (např. výsledek z cache)
+  const waitForOcrJob = (jobId: number): Promise<any> =>
+    new Promise<any>(resolve => {
+      ocrWaiters.current.set(jobId, resolve);
+      fetch(`/api/ocr_jobs/${jobId}`)
+        .then(response => response.json())
+        .then(job => {
+          if (job.status === 'done' || job.status === 'failed') {
+            ocrWaiters.current.delete(jobId);
+            resolve(job);
+          }
+        });
+    }).then(job => {
+      if (job.status === 'done') {
+        return fetch(`/api/ocr_jobs/${jobId}/result`).then(response => response.json());
+      }
+      return null;
+    });
+
   const handleOcr = (documentId: number) => {
+    setOcrResult('Zpracovávám OCR...');
     fetch(`/api/documents/${documentId}/ocr`, {
       method: 'POST',
     })
       .then(response => response.json())
+      .then(job => waitForOcrJob(job.job_id))
       .then(data => {
-        if (data.ocr_text) {
+        if (data && data.ocr_text) {
           setOcrResult(data.ocr_text);
           setExtractedData(data.extracted_data);
         } else {
@@ -177,6 +267,11 @@ const ProjectDetail: React.FC = () => {
     return <div>Loading...</div>;
   }
 
+  // Filtr kategorie se aplikuje lokálně, dokumenty se při změně filtru znovu nestahují
+  const documents = filterCategory
+    ? project.documents.filter(doc => doc.category === filterCategory)
+    : project.documents;
+
   // Prepare data for the chart
   const chartData = project.progress_logs
     .sort((a, b) => new Date(a.date).getTime() - new Date(b.date).getTime())
@@ -246,11 +341,11 @@ const ProjectDetail: React.FC = () => {
           <option value="fotodokumentace">Fotodokumentace</option>
           <option value="ostatni">Ostatní</option>
         </select>
-        {project.documents.length === 0 ? (
+        {documents.length === 0 ? (
           <p>Žádné dokumenty nebyly nahrány.</p>
         ) : (
           <ul>
-            {project.documents.map(doc => (
+            {documents.map(doc => (
               <li key={doc.id} className="mb-2 p-2 border rounded flex justify-between items-center">
                 <div>
                   <a href={`/api/documents/${doc.id}/download`} target="_blank" rel="noopener noreferrer" className="text-blue-600 hover:underline">
@@ -26,7 +26,8 @@ const ProjectList: React.FC = () => {
     })
       .then(response => {
         if (response.ok) {
-          fetchProjects(); // Refresh project list
+          // Smazaný projekt stačí odebrat lokálně, seznam se znovu nestahuje
+          setProjects(prevProjects => prevProjects.filter(project => project.id !== projectId));
         }
       });
   };
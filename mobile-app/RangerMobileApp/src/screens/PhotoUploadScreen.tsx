@@ -1,8 +1,7 @@
 import React, { useState } from 'react';
 import { View, Text, Button, Image, Alert } from 'react-native';
 import { launchImageLibrary } from 'react-native-image-picker';
-import { uploadPhoto } from '../utils/api';
-import { getData, saveData } from '../utils/storage';
+import { flushOutbox, queuePhoto } from '../utils/sync';
 
 export default function PhotoUploadScreen({ route }: any) {
   const { projectId } = route.params;
@@ -13,9 +12,6 @@ export default function PhotoUploadScreen({ route }: any) {
     const result = await launchImageLibrary({ mediaType: 'photo', quality: 0.8 });
     if (result.assets && result.assets.length > 0) {
       setPhoto(result.assets[0]);
-      // Uložení offline
-      const local = (await getData(`photos_${projectId}`)) || [];
-      await saveData(`photos_${projectId}`, [...local, result.assets[0]]);
     }
   };
 
@@ -25,16 +21,11 @@ export default function PhotoUploadScreen({ route }: any) {
       return;
     }
     setUploading(true);
-    try {
-      await uploadPhoto(projectId, {
-        uri: photo.uri,
-        type: photo.type,
-        name: photo.fileName || 'photo.jpg',
-      });
-      Alert.alert('Hotovo', 'Fotka byla nahrána.');
-    } catch (e) {
-      Alert.alert('Chyba', 'Nepodařilo se nahrát fotku.');
-    }
+    // Fotka se zařadí do fronty a nahraje hned, nebo po obnovení připojení
+    await queuePhoto(projectId, photo);
+    const pending = await flushOutbox();
+    Alert.alert('Hotovo', pending ? 'Fotka bude nahrána po připojení.' : 'Fotka byla nahrána.');
+    setPhoto(null);
     setUploading(false);
   };
 
@@ -1,30 +1,30 @@
 import React, { useState } from 'react';
 import { View, Text, TextInput, Button, Alert } from 'react-native';
-import { sendProgressReport } from '../utils/api';
-import { getData, saveData } from '../utils/storage';
+import { flushOutbox, queueProgressReport } from '../utils/sync';
 
 export default function ProgressReportScreen({ route, navigation }: any) {
   const { projectId } = route.params;
   const [note, setNote] = useState('');
+  const [percentage, setPercentage] = useState('');
   const [loading, setLoading] = useState(false);
 
   const handleSend = async () => {
-    if (!note) {
-      Alert.alert('Chyba', 'Vyplňte popis postupu.');
+    const percentageCompleted = parseInt(percentage, 10);
+    if (!note || isNaN(percentageCompleted) || percentageCompleted < 0 || percentageCompleted > 100) {
+      Alert.alert('Chyba', 'Vyplňte popis postupu a procento dokončení (0–100).');
       return;
     }
     setLoading(true);
-    try {
-      await sendProgressReport(projectId, note);
-      // Uložení offline (pro jednoduchost pouze lokálně, bez synchronizace)
-      const local = (await getData(`progress_${projectId}`)) || [];
-      await saveData(`progress_${projectId}`, [...local, { note, date: new Date().toISOString() }]);
-      Alert.alert('Hotovo', 'Hlášení bylo odesláno.');
-      navigation.goBack();
-    } catch (e) {
-      Alert.alert('Chyba', 'Nepodařilo se odeslat hlášení.');
-    }
+    // Hlášení se nejdřív uloží do fronty, takže se neztratí ani bez připojení
+    await queueProgressReport(projectId, {
+      date: new Date().toISOString().slice(0, 10),
+      percentage_completed: percentageCompleted,
+      notes: note,
+    });
+    const pending = await flushOutbox();
     setLoading(false);
+    Alert.alert('Hotovo', pending ? 'Hlášení bylo uloženo a odešle se po připojení.' : 'Hlášení bylo odesláno.');
+    navigation.goBack();
   };
 
   return (
@@ -37,6 +37,13 @@ export default function ProgressReportScreen({ route, navigation }: any) {
         onChangeText={setNote}
         style={{ borderWidth: 1, marginVertical: 12, padding: 8 }}
       />
+      <TextInput
+        placeholder="Dokončeno (%)"
+        value={percentage}
+        onChangeText={setPercentage}
+        keyboardType="numeric"
+        style={{ borderWidth: 1, marginBottom: 12, padding: 8 }}
+      />
       <Button title={loading ? 'Odesílám...' : 'Odeslat'} onPress={handleSend} disabled={loading} />
     </View>
   );
@@ -17,16 +17,18 @@ export const addProject = async (data: { name: string; description: string }) =>
   return res.data;
 };
 
-export const sendProgressReport = async (projectId: string, note: string) => {
-  const res = await axios.post(`${API_URL}/projects/${projectId}/progress/`, { notes: note });
-  return res.data;
-};
-
-export const uploadPhoto = async (projectId: string, photo: any) => {
+// Obsah fotky pro offline synchronizaci, vrací { content_hash, size, deduplicated }
+export const uploadSyncObject = async (photo: any) => {
   const formData = new FormData();
   formData.append('file', photo);
-  const res = await axios.post(`${API_URL}/projects/${projectId}/photos/`, formData, {
+  const res = await axios.post(`${API_URL}/sync/objects`, formData, {
     headers: { 'Content-Type': 'multipart/form-data' },
   });
   return res.data;
 };
+
+// Dávka hlášení postupu a fotek z fronty, vrací výsledek pro každou položku
+export const syncBatch = async (batch: { progress_logs: any[]; photos: any[] }) => {
+  const res = await axios.post(`${API_URL}/sync/batch`, batch);
+  return res.data;
+};
@@ -1,9 +1,11 @@
 import { getData, saveData } from './storage';
-import { getProjects } from './api';
+import { getProjects, syncBatch, uploadSyncObject } from './api';
 
 export const syncProjects = async () => {
   // Získání projektů z backendu a uložení do offline úložiště
   try {
+    // Nejdřív se odešlou záznamy čekající ve frontě, aby stažené projekty obsahovaly aktuální postup
+    await flushOutbox();
     const projects = await getProjects();
     await saveData('projects', projects);
     return projects;
@@ -13,3 +15,80 @@ export const syncProjects = async () => {
     return local || [];
   }
 };
+
+// --- Fronta offline záznamů (hlášení postupu a fotky) ---
+// Položky čekají v AsyncStorage a odesílají se najednou přes /sync/batch. Klíč položky
+// se generuje při zařazení, opakované odeslání po výpadku spojení proto nic nezduplikuje.
+const OUTBOX_KEY = 'sync_outbox';
+const BATCH_SIZE = 500;
+
+const newIdempotencyKey = () =>
+  `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}-${Math.random().toString(36).slice(2, 10)}`;
+
+const getOutbox = async () => (await getData(OUTBOX_KEY)) || { progress_logs: [], photos: [] };
+
+export const queueProgressReport = async (
+  projectId: string,
+  report: { date: string; percentage_completed: number; notes: string },
+) => {
+  const outbox = await getOutbox();
+  outbox.progress_logs.push({ ...report, project_id: Number(projectId), idempotency_key: newIdempotencyKey() });
+  await saveData(OUTBOX_KEY, outbox);
+};
+
+export const queuePhoto = async (projectId: string, photo: { uri: string; type?: string; fileName?: string }) => {
+  const outbox = await getOutbox();
+  outbox.photos.push({
+    project_id: Number(projectId),
+    idempotency_key: newIdempotencyKey(),
+    uri: photo.uri,
+    content_type: photo.type,
+    filename: photo.fileName || 'photo.jpg',
+  });
+  await saveData(OUTBOX_KEY, outbox);
+};
+
+export const pendingCount = async () => {
+  const outbox = await getOutbox();
+  return outbox.progress_logs.length + outbox.photos.length;
+};
+
+const done = (result: any) => result.status !== 'error';
+
+// Odešle frontu, vrací počet položek, které ve frontě zůstaly (např. bez spojení)
+export const flushOutbox = async () => {
+  const outbox = await getOutbox();
+  try {
+    // Obsah fotek se nahraje předem, hash se uloží, aby se po výpadku nahrával jen zbytek
+    for (const photo of outbox.photos) {
+      if (!photo.content_hash) {
+        const stored = await uploadSyncObject({ uri: photo.uri, type: photo.content_type, name: photo.filename });
+        photo.content_hash = stored.content_hash;
+        await saveData(OUTBOX_KEY, outbox);
+      }
+    }
+    while (outbox.progress_logs.length || outbox.photos.length) {
+      const progressLogs = outbox.progress_logs.slice(0, BATCH_SIZE);
+      const photos = outbox.photos.slice(0, BATCH_SIZE);
+      const result = await syncBatch({
+        progress_logs: progressLogs,
+        photos: photos.map(({ uri, ...photo }: any) => photo),
+      });
+      const rejected = [
+        ...progressLogs.filter((_: any, i: number) => !done(result.progress_logs[i])),
+        ...photos.filter((_: any, i: number) => !done(result.photos[i])),
+      ];
+      outbox.progress_logs = outbox.progress_logs.slice(BATCH_SIZE);
+      outbox.photos = outbox.photos.slice(BATCH_SIZE);
+      await saveData(OUTBOX_KEY, outbox);
+      if (rejected.length) {
+        // Odmítnuté položky (např. smazaný projekt) se nezkouší znovu, jen se ponechají stranou
+        const failed = (await getData(`${OUTBOX_KEY}_failed`)) || [];
+        await saveData(`${OUTBOX_KEY}_failed`, [...failed, ...rejected]);
+      }
+    }
+  } catch (e) {
+    // Bez spojení položky zůstávají ve frontě do příštího pokusu
+  }
+  return pendingCount();
+};